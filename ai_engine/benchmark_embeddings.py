@@ -0,0 +1,123 @@
+"""
+Recall and latency comparison of the embedding backends on the seeded
+threat signatures (seed_knowledge.THREATS).
+
+For every signature we generate variants with different IPs, ports and
+numbers (what real traffic looks like), embed signatures and variants with
+each backend and report:
+  - recall@1: the variant's nearest signature is the one it came from
+  - tier2 agreement: same "distance < 0.35" decision as the torch backend
+  - cosine to torch: how close the vectors are to the reference backend
+  - single-text latency (p50/p95) and batch throughput
+
+Usage (from ai_engine/):
+    python benchmark_embeddings.py --variants 20
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import time
+import numpy as np
+from embedding import Embedder
+from onnx_backend import OnnxEmbedder
+from seed_knowledge import THREATS
+
+TIER2_DISTANCE = 0.35
+
+def make_variants(text, count, rng):
+    def random_ip(_):
+        return ".".join(str(rng.randint(1, 254)) for _ in range(4))
+
+    def random_number(match):
+        return str(rng.randint(1, 10 ** len(match.group(0))))
+
+    variants = []
+    for _ in range(count):
+        variant = re.sub(r"\b\d{1,3}(?:\.\d{1,3}){3}\b", random_ip, text)
+        variant = re.sub(r"(?<![\w.])\d+(?![\w.])", random_number, variant)
+        variants.append(variant)
+    return variants
+
+def squared_l2(queries, signatures):
+    q = np.asarray(queries, dtype=np.float32)
+    s = np.asarray(signatures, dtype=np.float32)
+    q = q / np.linalg.norm(q, axis=1, keepdims=True)
+    s = s / np.linalg.norm(s, axis=1, keepdims=True)
+    return 2.0 - 2.0 * (q @ s.T)
+
+def benchmark(name, embedder, signatures, queries, labels, reference=None):
+    sig_vectors = embedder.embed_batch(signatures)
+    # Warm up (first ONNX / torch call allocates)
+    embedder.embed(queries[0])
+
+    single = []
+    for text in queries:
+        start = time.perf_counter()
+        embedder.embed(text)
+        single.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    query_vectors = embedder.embed_batch(queries)
+    batch_seconds = time.perf_counter() - start
+
+    distances = squared_l2(query_vectors, sig_vectors)
+    nearest = distances.argmin(axis=1)
+    tier2 = distances.min(axis=1) < TIER2_DISTANCE
+
+    result = {
+        "backend": name,
+        "recall@1": float(np.mean(nearest == np.asarray(labels))),
+        "p50_ms": statistics.median(single),
+        "p95_ms": float(np.percentile(single, 95)),
+        "batch_lines_per_s": len(queries) / batch_seconds,
+        "query_vectors": np.asarray(query_vectors, dtype=np.float32),
+        "tier2": tier2
+    }
+    if reference is not None:
+        ref = reference["query_vectors"]
+        cosine = np.sum(ref * result["query_vectors"], axis=1) / (
+            np.linalg.norm(ref, axis=1) * np.linalg.norm(result["query_vectors"], axis=1))
+        result["cosine_to_torch"] = float(np.mean(cosine))
+        result["tier2_agreement"] = float(np.mean(reference["tier2"] == tier2))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", type=int, default=20, help="variants generated per signature")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    signatures = [t["text"] for t in THREATS]
+    queries, labels = [], []
+    for label, text in enumerate(signatures):
+        for variant in make_variants(text, args.variants, rng):
+            queries.append(variant)
+            labels.append(label)
+
+    print(f"{len(signatures)} signatures, {len(queries)} variant queries\n")
+
+    torch_result = benchmark("torch", Embedder(args.model), signatures, queries, labels)
+    results = [torch_result]
+    for quantize in (False, True):
+        name = "onnx-int8" if quantize else "onnx-fp32"
+        results.append(benchmark(name, OnnxEmbedder(args.model, quantize=quantize), signatures, queries, labels, reference=torch_result))
+
+    model_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_models", args.model)
+    header = f"{'backend':<10} {'recall@1':>9} {'tier2 agr':>10} {'cos/torch':>10} {'p50 ms':>8} {'p95 ms':>8} {'batch l/s':>10}"
+    print("\n" + header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['backend']:<10} {r['recall@1']:>9.3f} {r.get('tier2_agreement', 1.0):>10.3f} "
+              f"{r.get('cosine_to_torch', 1.0):>10.4f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['batch_lines_per_s']:>10.0f}")
+
+    for filename in ("model.onnx", "model_int8.onnx"):
+        path = os.path.join(model_dir, filename)
+        if os.path.exists(path):
+            print(f"{filename}: {os.path.getsize(path) / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    main()
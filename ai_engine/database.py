@@ -1,14 +1,119 @@
 import chromadb
+import numpy as np
 import os
+import threading
 import time
 
+class InMemoryIndex:
+    """
+    Exact nearest-neighbour index over all threat signatures.
+    Keeps a normalized float32 matrix plus documents/metadata so a lookup
+    (single or batched) is one matrix multiply and a top-k.
+    Distances are squared L2 between unit vectors (2 - 2 * cosine), which is
+    what Chroma's default "l2" space returns for normalized embeddings, so
+    the existing thresholds keep their meaning.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (matrix, ids, documents, metadatas) swapped atomically on update
+        self._snapshot = (np.empty((0, 0), dtype=np.float32), [], [], [])
+
+    @staticmethod
+    def _normalize(vectors):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[None, :]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def __len__(self):
+        return len(self._snapshot[1])
+
+    def load(self, ids, embeddings, documents, metadatas):
+        matrix = self._normalize(embeddings) if len(ids) else np.empty((0, 0), dtype=np.float32)
+        with self._lock:
+            self._snapshot = (matrix, list(ids), list(documents), list(metadatas))
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        """
+        Adds or replaces signatures without rebuilding the whole matrix.
+        """
+        if not len(ids):
+            return
+        new_rows = self._normalize(embeddings)
+        with self._lock:
+            matrix, old_ids, old_docs, old_metas = self._snapshot
+            matrix = matrix.copy() if len(old_ids) else np.empty((0, new_rows.shape[1]), dtype=np.float32)
+            all_ids, all_docs, all_metas = list(old_ids), list(old_docs), list(old_metas)
+            positions = {doc_id: i for i, doc_id in enumerate(all_ids)}
+
+            appended = []
+            for row, doc_id, doc, meta in zip(new_rows, ids, documents, metadatas):
+                if doc_id in positions:
+                    i = positions[doc_id]
+                    matrix[i] = row
+                    all_docs[i], all_metas[i] = doc, meta
+                else:
+                    positions[doc_id] = len(all_ids)
+                    all_ids.append(doc_id)
+                    all_docs.append(doc)
+                    all_metas.append(meta)
+                    appended.append(row)
+            if appended:
+                matrix = np.vstack([matrix, np.stack(appended)])
+            self._snapshot = (matrix, all_ids, all_docs, all_metas)
+
+    def query(self, embeddings, n_results=1):
+        """
+        Returns, per query embedding, up to n_results matches sorted by distance.
+        """
+        matrix, _, documents, metadatas = self._snapshot
+        queries = self._normalize(embeddings)
+        if not documents:
+            return [[] for _ in range(len(queries))]
+
+        k = min(n_results, len(documents))
+        distances = 2.0 - 2.0 * (queries @ matrix.T)
+        if k < len(documents):
+            top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(len(documents)), (len(queries), k))
+
+        results = []
+        for row, candidates in zip(distances, top):
+            ordered = candidates[np.argsort(row[candidates])]
+            results.append([
+                {"document": documents[i], "metadata": metadatas[i], "distance": float(max(row[i], 0.0))}
+                for i in ordered
+            ])
+        return results
+
 class VectorDB:
-    def __init__(self, persist_directory=None):
+    def __init__(self, persist_directory=None, index_mode=None):
         if persist_directory is None:
             persist_directory = os.path.join(os.path.dirname(__file__), "chroma_db")
         self.client = chromadb.PersistentClient(path=persist_directory)
         self.collection = self.client.get_or_create_collection(name="threat_signatures")
 
+        # "chroma" queries the collection directly; "memory" serves queries
+        # from an InMemoryIndex kept in sync with the collection.
+        self.index_mode = (index_mode or os.getenv("VECTOR_INDEX_MODE", "chroma")).lower()
+        self.index = None
+        if self.index_mode == "memory":
+            self.index = InMemoryIndex()
+            self._sync_index()
+
+    def _sync_index(self, ids=None):
+        include = ["embeddings", "documents", "metadatas"]
+        data = self.collection.get(ids=ids, include=include) if ids else self.collection.get(include=include)
+        if ids:
+            self.index.upsert(data["ids"], data["embeddings"], data["documents"], data["metadatas"])
+        else:
+            self.index.load(data["ids"], data["embeddings"], data["documents"], data["metadatas"])
+            print(f"Loaded {len(self.index)} threat signatures into the in-memory index.")
+
     def add_threat_signature(self, text, metadata, embedding):
         """
         Adds a known threat signature to the database.
@@ -22,11 +127,18 @@ class VectorDB:
             embeddings=[embedding],
             ids=[unique_id]
         )
+        if self.index is not None:
+            # Re-read what Chroma actually stored (it ignores duplicate ids)
+            self._sync_index(ids=[unique_id])
 
     def query_log(self, log_embedding, n_results=1):
         """
         Finds the most similar threat signature.
         """
+        if self.index is not None:
+            matches = self.index.query([log_embedding], n_results=n_results)[0]
+            return matches[0] if matches else None
+
         results = self.collection.query(
             query_embeddings=[log_embedding],
             n_results=n_results
@@ -40,3 +152,31 @@ class VectorDB:
             "metadata": results['metadatas'][0][0],
             "distance": results['distances'][0][0]
         }
+
+    def query_logs(self, log_embeddings):
+        """
+        Finds the most similar threat signature for each embedding in one query.
+        Returns a list aligned with `log_embeddings` (None where nothing matched).
+        """
+        if not log_embeddings:
+            return []
+
+        if self.index is not None:
+            return [matches[0] if matches else None for matches in self.index.query(log_embeddings, n_results=1)]
+
+        results = self.collection.query(
+            query_embeddings=list(log_embeddings),
+            n_results=1
+        )
+
+        matches = []
+        for docs, metas, dists in zip(results['documents'], results['metadatas'], results['distances']):
+            if not docs:
+                matches.append(None)
+                continue
+            matches.append({
+                "document": docs[0],
+                "metadata": metas[0],
+                "distance": dists[0]
+            })
+        return matches
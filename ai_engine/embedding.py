@@ -1,8 +1,13 @@
 import os
-from sentence_transformers import SentenceTransformer
+import queue
+import threading
+import time
+from concurrent.futures import Future
 
 class Embedder:
     def __init__(self, model_name="all-MiniLM-L6-v2"):
+        # Imported here so the ONNX backend never pulls in torch
+        from sentence_transformers import SentenceTransformer
         print(f"Loading embedding model: {model_name}...")
         self.model = SentenceTransformer(model_name)
         print("Model loaded.")
@@ -14,6 +19,122 @@ class Embedder:
         # encode returns a numpy array, convert to list for storage
         return self.model.encode(text).tolist()
 
+    def embed_batch(self, texts, batch_size=64):
+        """
+        Converts a list of texts to vectors with a single encode call.
+        """
+        if not texts:
+            return []
+        return self.model.encode(list(texts), batch_size=batch_size).tolist()
+
+def create_embedder(model_name="all-MiniLM-L6-v2", backend=None):
+    """
+    Builds the embedding backend selected by EMBEDDING_BACKEND:
+    "torch" (SentenceTransformer, default) or "onnx" (onnxruntime on CPU,
+    int8-quantized unless EMBEDDING_QUANTIZE=none).
+    """
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "torch")).lower()
+    if backend == "onnx":
+        try:
+            from .onnx_backend import OnnxEmbedder
+        except ImportError:
+            # Fallback when imported as a script module (e.g. seed_knowledge.py)
+            from onnx_backend import OnnxEmbedder
+        return OnnxEmbedder(
+            model_name,
+            model_dir=os.getenv("EMBEDDING_ONNX_DIR"),
+            quantize=os.getenv("EMBEDDING_QUANTIZE", "int8").lower() == "int8"
+        )
+    return Embedder(model_name)
+
+class MicroBatchEmbedder:
+    """
+    Front end for Embedder that coalesces concurrent embed() calls.
+    Pending texts are collected for up to `max_batch_size` items or
+    `max_wait_ms` milliseconds, encoded with one model.encode call, and each
+    caller's future is resolved with its own vector.
+    """
+
+    def __init__(self, embedder, max_batch_size=32, max_wait_ms=5):
+        self.embedder = embedder
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending = queue.Queue()
+
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+
+        self._worker = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text) -> Future:
+        """
+        Queues a text for the next batch and returns a Future of its vector.
+        """
+        future = Future()
+        self._pending.put((text, future))
+        return future
+
+    def embed(self, text):
+        return self.submit(text).result()
+
+    def embed_batch(self, texts, batch_size=64):
+        # Callers that already have a batch skip the coalescing window
+        return self.embedder.embed_batch(texts, batch_size=batch_size)
+
+    def _collect(self):
+        batch = [self._pending.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._pending.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [(text, future) for text, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                vectors = list(self.embedder.embed_batch([text for text, _ in batch], batch_size=len(batch)))
+                if len(vectors) != len(batch):
+                    # Never leave a caller waiting on a future that zip() skipped
+                    raise RuntimeError(f"Embedder returned {len(vectors)} vectors for {len(batch)} texts")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size_seen": self.max_batch_seen,
+            "pending": self._pending.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000
+        }
+
 if __name__ == "__main__":
     # Test
     emb = Embedder()
@@ -1,24 +1,62 @@
-from .embedding import Embedder
+import os
+import time
+from .embedding import create_embedder, MicroBatchEmbedder
 from .database import VectorDB
+from .metrics import StageStats
 
 class AIEngine:
     def __init__(self):
-        self.embedder = Embedder()
+        embedder = create_embedder()
+        if os.getenv("EMBED_MICRO_BATCH", "true").lower() == "true":
+            # Coalesce concurrent single-log embeds into one encode call
+            embedder = MicroBatchEmbedder(
+                embedder,
+                max_batch_size=int(os.getenv("EMBED_MAX_BATCH", "32")),
+                max_wait_ms=float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+            )
+        self.embedder = embedder
         self.db = VectorDB()
-        
-    def analyze_log(self, log_text):
+        self.timings = StageStats()
+
+    def analyze_log(self, log_text, vector=None):
         """
         Retrieves context for a log entry using RAG.
         Returns the closest match from the VectorDB (or None).
+        `vector` skips the embedding step when the caller already has it.
         """
         # 1. Embed the log
-        vector = self.embedder.embed(log_text)
+        if vector is None:
+            start = time.perf_counter()
+            vector = self.embedder.embed(log_text)
+            self.timings.record("embed", (time.perf_counter() - start) * 1000)
         
         # 2. Query the DB
+        start = time.perf_counter()
         result = self.db.query_log(vector)
+        self.timings.record("search", (time.perf_counter() - start) * 1000)
         
         return result
 
+    def analyze_logs(self, log_texts):
+        """
+        Batched variant of analyze_log.
+        Identical messages are embedded once; returns one result per input text.
+        """
+        unique_texts = list(dict.fromkeys(log_texts))
+        if not unique_texts:
+            return []
+
+        start = time.perf_counter()
+        vectors = self.embedder.embed_batch(unique_texts)
+        embedded = time.perf_counter()
+        self.timings.record("embed_batch", (embedded - start) * 1000)
+
+        matches = self.db.query_logs(vectors)
+        self.timings.record("search_batch", (time.perf_counter() - embedded) * 1000)
+
+        by_text = dict(zip(unique_texts, matches))
+        return [by_text[text] for text in log_texts]
+
     def learn_log(self, text, is_threat, severity="Medium", remediation="None"):
         """
         Learns from a new log entry by adding it to the vector DB.
@@ -0,0 +1,116 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import StageStats
+
+class AsyncAIEngine:
+    """
+    Async facade for AIEngine.
+    Embedding and vector search are CPU-bound/blocking, so every call runs on
+    a dedicated, bounded thread pool instead of the event loop. Timings are
+    split into queue wait (submitted -> picked up by a pool thread) and
+    compute, per operation.
+
+    With a MicroBatchEmbedder, single-log calls wait for their embedding on
+    the event loop rather than in a pool thread, so any number of concurrent
+    callers can share one encode; only the vector search uses the pool.
+    """
+
+    def __init__(self, engine, max_workers=4, miner=None):
+        self.engine = engine
+        # Optional TemplateMiner: verdicts are reused across messages that
+        # only differ in variable fields (IPs, ports, PIDs, usernames...)
+        self.miner = miner
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-engine")
+        self.timings = StageStats()
+        self.in_flight = 0
+
+    async def _run(self, op, fn, *args, **kwargs):
+        submitted = time.perf_counter()
+
+        def call():
+            started = time.perf_counter()
+            self.timings.record(f"{op}.queue_wait", (started - submitted) * 1000)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.timings.record(f"{op}.compute", (time.perf_counter() - started) * 1000)
+
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        finally:
+            self.in_flight -= 1
+
+    async def _analyze_one(self, log_text):
+        submit = getattr(self.engine.embedder, "submit", None)
+        if submit is None:
+            return await self._run("analyze_log", self.engine.analyze_log, log_text)
+
+        started = time.perf_counter()
+        vector = await asyncio.wrap_future(submit(log_text))
+        self.timings.record("analyze_log.embed", (time.perf_counter() - started) * 1000)
+        return await self._run("analyze_log", self.engine.analyze_log, log_text, vector=vector)
+
+    async def analyze_log(self, log_text):
+        if not self.miner:
+            return await self._analyze_one(log_text)
+
+        match = self.miner.add(log_text)
+        found, verdict = self.miner.get_verdict(match)
+        if found:
+            return verdict
+        verdict = await self._analyze_one(log_text)
+        self.miner.set_verdict(match, verdict)
+        return verdict
+
+    async def analyze_logs(self, log_texts):
+        if not self.miner:
+            return await self._run("analyze_logs", self.engine.analyze_logs, log_texts)
+
+        results = [None] * len(log_texts)
+        pending = {} # index -> template match, for messages without a reusable verdict
+        for index, text in enumerate(log_texts):
+            match = self.miner.add(text)
+            found, verdict = self.miner.get_verdict(match)
+            if found:
+                results[index] = verdict
+            else:
+                pending[index] = match
+
+        if pending:
+            indexes = list(pending)
+            verdicts = await self._run("analyze_logs", self.engine.analyze_logs, [log_texts[i] for i in indexes])
+            for index, verdict in zip(indexes, verdicts):
+                self.miner.set_verdict(pending[index], verdict)
+                results[index] = verdict
+        return results
+
+    async def learn_log(self, **kwargs):
+        result = await self._run("learn_log", self.engine.learn_log, **kwargs)
+        if self.miner:
+            # The knowledge base changed, so cached verdicts may be stale
+            self.miner.clear_verdicts()
+        return result
+
+    def stats(self):
+        stages = self.timings.snapshot()
+        # Engine-internal stages (embed / search) recorded inside the pool threads
+        stages.update(getattr(self.engine, "timings", StageStats()).snapshot())
+        stats = {
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "stages": stages
+        }
+        if self.miner:
+            miner_stats = self.miner.stats(limit=0)
+            miner_stats.pop("top")
+            stats["templates"] = miner_stats
+        embedder_stats = getattr(self.engine.embedder, "stats", None)
+        if callable(embedder_stats):
+            stats["embedder"] = embedder_stats()
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,30 @@
+import threading
+
+class StageStats:
+    """
+    Thread-safe count / total / max timings (ms) per named pipeline stage.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, stage, elapsed_ms):
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["last_ms"] = elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                stage: {
+                    "count": e["count"],
+                    "avg_ms": round(e["total_ms"] / e["count"], 3) if e["count"] else 0.0,
+                    "max_ms": round(e["max_ms"], 3),
+                    "last_ms": round(e["last_ms"], 3)
+                }
+                for stage, e in self._stages.items()
+            }
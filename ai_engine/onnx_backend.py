@@ -0,0 +1,167 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(__file__), "onnx_models")
+
+def _hub_id(model_name):
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+def export_onnx(model_name="all-MiniLM-L6-v2", output_dir=None, quantize=True):
+    """
+    Exports the transformer behind a SentenceTransformer model to ONNX
+    (model.onnx) and optionally a dynamically int8-quantized copy
+    (model_int8.onnx), next to its fast tokenizer.json.
+    Needs torch + transformers (+ onnx for quantization) once, at export time.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    output_dir = output_dir or os.path.join(DEFAULT_MODEL_DIR, model_name)
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Exporting {model_name} to ONNX in {output_dir}...")
+    tokenizer = AutoTokenizer.from_pretrained(_hub_id(model_name))
+    model = AutoModel.from_pretrained(_hub_id(model_name)).eval()
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            dynamo=False
+        )
+    tokenizer.save_pretrained(output_dir)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(fp32_path, os.path.join(output_dir, "model_int8.onnx"), weight_type=QuantType.QInt8)
+    print("Export complete.")
+    return output_dir
+
+class CachedTokenizer:
+    """
+    WordPiece tokenizer fast path for log lines.
+    BERT normalization and pre-tokenization never cross whitespace, so a
+    line's ids are the concatenation of its words' ids. Words are cached
+    (LRU), so the prefixes log lines share ("sshd[..]: Failed password for")
+    are tokenized once; misses across a batch go to one encode_batch call.
+    """
+
+    def __init__(self, tokenizer, max_length=256, cache_size=50000):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.cache_size = cache_size
+        self.cls_id = tokenizer.token_to_id("[CLS]")
+        self.sep_id = tokenizer.token_to_id("[SEP]")
+        self._words = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode_batch(self, texts):
+        """
+        Returns a list of id lists ([CLS] ... [SEP], truncated to max_length).
+        """
+        with self._lock:
+            return self._encode_batch(texts)
+
+    def _encode_batch(self, texts):
+        split = [text.split() for text in texts]
+
+        known = {}
+        missing = []
+        for words in split:
+            for word in words:
+                if word in known:
+                    continue
+                cached = self._words.get(word)
+                if cached is not None:
+                    self._words.move_to_end(word)
+                    known[word] = cached
+                    self.hits += 1
+                else:
+                    known[word] = None
+                    missing.append(word)
+        self.misses += len(missing)
+
+        if missing:
+            encodings = self.tokenizer.encode_batch(missing, add_special_tokens=False)
+            for word, encoding in zip(missing, encodings):
+                known[word] = encoding.ids
+                self._words[word] = encoding.ids
+            while len(self._words) > self.cache_size:
+                self._words.popitem(last=False)
+
+        budget = self.max_length - 2
+        batch = []
+        for words in split:
+            ids = []
+            for word in words:
+                ids.extend(known[word])
+                if len(ids) >= budget:
+                    break
+            batch.append([self.cls_id] + ids[:budget] + [self.sep_id])
+        return batch
+
+class OnnxEmbedder:
+    """
+    Drop-in replacement for Embedder that runs the exported (optionally int8)
+    ONNX graph on onnxruntime's CPU provider, with mean pooling and L2
+    normalization matching the SentenceTransformer pipeline.
+    """
+
+    def __init__(self, model_name="all-MiniLM-L6-v2", model_dir=None, quantize=True, max_length=256, threads=None):
+        model_dir = model_dir or os.path.join(DEFAULT_MODEL_DIR, model_name)
+        model_path = os.path.join(model_dir, "model_int8.onnx" if quantize else "model.onnx")
+        if not os.path.exists(model_path):
+            export_onnx(model_name, model_dir, quantize=quantize)
+
+        print(f"Loading ONNX embedding model: {model_path}...")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = int(threads if threads is not None else os.getenv("ONNX_THREADS", "0"))
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = CachedTokenizer(Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json")), max_length=max_length)
+        print("Model loaded.")
+
+    def _encode(self, texts):
+        ids = self.tokenizer.encode_batch(texts)
+        width = max(len(row) for row in ids)
+        input_ids = np.zeros((len(ids), width), dtype=np.int64)
+        attention = np.zeros((len(ids), width), dtype=np.int64)
+        for i, row in enumerate(ids):
+            input_ids[i, :len(row)] = row
+            attention[i, :len(row)] = 1
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real tokens, then L2 normalize
+        mask = attention[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed(self, text):
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts, batch_size=64):
+        if not texts:
+            return []
+        texts = list(texts)
+        vectors = [self._encode(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        return np.concatenate(vectors).tolist()
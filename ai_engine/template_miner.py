@@ -0,0 +1,227 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+WILDCARD = "<*>"
+
+# Variable fields masked before clustering (order matters: UUID/IP before NUM)
+MASKS = [
+    ("<UUID>", re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b")),
+    ("<IP>", re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}\b")),
+    ("<HEX>", re.compile(r"\b0x[0-9a-fA-F]+\b")),
+    ("<NUM>", re.compile(r"\b\d+(?:\.\d+)?\b")),
+]
+
+def mask_token(token):
+    for name, pattern in MASKS:
+        token = pattern.sub(name, token)
+    return token
+
+def _is_variable(token):
+    return token == WILDCARD or any(name in token for name, _ in MASKS)
+
+class LogTemplate:
+    """
+    One cluster of the parse tree: a template plus its statistics.
+    Verdicts are cached per template *version* (a snapshot of the tokens
+    taken in TemplateMiner.add when the message matched), so a template that
+    later generalizes (e.g. "Failed password" and "Accepted password" merging
+    into "<*> password") never hands one message's verdict to the other.
+    """
+
+    def __init__(self, template_id, tokens):
+        self.id = template_id
+        self.tokens = list(tokens)
+        self.count = 0
+        self.first_seen = time.time()
+        self.last_seen = self.first_seen
+        self.verdict_hits = 0
+        self.verdict_misses = 0
+        self.verdicts = OrderedDict() # tuple(snapshot tokens) -> analysis
+
+    @property
+    def template(self):
+        return " ".join(self.tokens)
+
+    def similarity(self, tokens):
+        """
+        Drain sequence similarity: share of positions with equal constant tokens.
+        Returns (similarity, wildcard count).
+        """
+        same = 0
+        wildcards = 0
+        for mine, theirs in zip(self.tokens, tokens):
+            if mine == WILDCARD:
+                wildcards += 1
+            elif mine == theirs:
+                same += 1
+        return same / len(tokens), wildcards
+
+    def merge(self, tokens):
+        self.tokens = [mine if mine == theirs else WILDCARD for mine, theirs in zip(self.tokens, tokens)]
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "template": self.template,
+            "count": self.count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "verdict_versions": len(self.verdicts),
+            "verdict_hits": self.verdict_hits,
+            "verdict_misses": self.verdict_misses
+        }
+
+class TemplateMatch:
+    def __init__(self, template, tokens, params, version):
+        self.template = template
+        self.tokens = tokens # masked tokens of the message
+        self.params = params # raw values at variable positions
+        # The template's tokens right after this message joined it; the
+        # template itself may generalize further before a verdict is stored
+        self.version = version
+
+    @property
+    def template_id(self):
+        return self.template.id
+
+class TemplateMiner:
+    """
+    Streaming Drain-style template miner.
+    Messages are masked (IPs, numbers, hex, UUIDs), routed through a fixed
+    depth parse tree (token count, then the first `depth - 2` tokens) and
+    assigned to the most similar template in the leaf, or a new one.
+    """
+
+    def __init__(self, depth=4, sim_threshold=0.5, max_children=100, max_templates=5000, max_verdicts=8):
+        self.depth = max(depth, 3)
+        self.sim_threshold = sim_threshold
+        self.max_children = max_children
+        self.max_templates = max_templates
+        self.max_verdicts = max_verdicts
+
+        self._root = {}
+        self._templates = OrderedDict() # id -> LogTemplate, least recently seen first
+        self._leaf_of = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def _leaf(self, tokens, create):
+        node = self._root.setdefault(len(tokens), {}) if create else self._root.get(len(tokens))
+        for token in tokens[:self.depth - 2]:
+            if node is None:
+                return None
+            children = node.setdefault("children", {})
+            key = WILDCARD if _is_variable(token) or any(c.isdigit() for c in token) else token
+            if key not in children:
+                if not create:
+                    key = WILDCARD
+                elif len(children) >= self.max_children:
+                    key = WILDCARD
+            if create:
+                children.setdefault(key, {})
+            node = children.get(key)
+        if node is None:
+            return None
+        return node.setdefault("templates", []) if create else node.get("templates")
+
+    def _evict(self):
+        template_id, _ = self._templates.popitem(last=False)
+        leaf = self._leaf_of.pop(template_id)
+        leaf.remove(template_id)
+
+    def add(self, message):
+        """
+        Assigns a message to a template, updating the template if needed.
+        Returns a TemplateMatch (template, masked tokens, parameters).
+        """
+        raw = message.split()
+        tokens = [mask_token(t) for t in raw]
+        if not tokens:
+            tokens = raw = [""]
+
+        with self._lock:
+            best = None
+            best_key = (-1.0, -1)
+            leaf = self._leaf(tokens, create=False) or []
+            for template_id in leaf:
+                candidate = self._templates[template_id]
+                sim, wildcards = candidate.similarity(tokens)
+                if (sim, wildcards) > best_key:
+                    best, best_key = candidate, (sim, wildcards)
+
+            if best is not None and best_key[0] >= self.sim_threshold:
+                best.merge(tokens)
+            else:
+                best = LogTemplate(self._next_id, tokens)
+                self._next_id += 1
+                leaf = self._leaf(tokens, create=True)
+                leaf.append(best.id)
+                self._leaf_of[best.id] = leaf
+                self._templates[best.id] = best
+                if len(self._templates) > self.max_templates:
+                    self._evict()
+
+            best.count += 1
+            best.last_seen = time.time()
+            self._templates.move_to_end(best.id)
+
+            params = [r for r, t in zip(raw, best.tokens) if _is_variable(t)]
+            return TemplateMatch(best, tokens, params, tuple(best.tokens))
+
+    @staticmethod
+    def _covers(snapshot, tokens):
+        return all(s == WILDCARD or s == t for s, t in zip(snapshot, tokens))
+
+    def get_verdict(self, match):
+        """
+        Returns (True, verdict) if a cached verdict applies to this message.
+        The most specific covering template version wins.
+        """
+        with self._lock:
+            template = match.template
+            best = None
+            best_constants = -1
+            for snapshot, verdict in template.verdicts.items():
+                if self._covers(snapshot, match.tokens):
+                    constants = sum(1 for s in snapshot if s != WILDCARD)
+                    if constants > best_constants:
+                        best, best_constants = (snapshot, verdict), constants
+            if best is None:
+                template.verdict_misses += 1
+                return False, None
+            template.verdicts.move_to_end(best[0])
+            template.verdict_hits += 1
+            return True, best[1]
+
+    def set_verdict(self, match, verdict):
+        with self._lock:
+            template = match.template
+            template.verdicts[match.version] = verdict
+            if len(template.verdicts) > self.max_verdicts:
+                template.verdicts.popitem(last=False)
+
+    def clear_verdicts(self):
+        """
+        Drops every cached verdict (e.g. after the knowledge base changed).
+        """
+        with self._lock:
+            for template in self._templates.values():
+                template.verdicts.clear()
+
+    def get(self, template_id):
+        with self._lock:
+            template = self._templates.get(template_id)
+            return template.to_dict() if template else None
+
+    def stats(self, limit=50):
+        with self._lock:
+            top = sorted(self._templates.values(), key=lambda t: t.count, reverse=True)[:limit]
+            return {
+                "templates": len(self._templates),
+                "messages": sum(t.count for t in self._templates.values()),
+                "verdict_hits": sum(t.verdict_hits for t in self._templates.values()),
+                "verdict_misses": sum(t.verdict_misses for t in self._templates.values()),
+                "top": [t.to_dict() for t in top]
+            }
@@ -6,6 +6,9 @@ import subprocess
 
 # Configuration
 API_URL = os.getenv("API_URL", "http://localhost:8000/ingest/logs")
+# Optional: stream every line over one long-lived chunked request instead
+# e.g. http://localhost:8000/ingest/stream
+STREAM_URL = os.getenv("STREAM_URL")
 
 # Determine log file based on OS
 if os.path.exists("/var/log/syslog"):
@@ -29,11 +32,7 @@ def follow(thefile):
             continue
         yield line
 
-def send_log(content):
-    # Basic filtering to reduce noise from macOS system logs
-    if OS_TYPE == "macos" and "last message repeated" in content:
-        return
-
+def build_payload(content):
     payload = {
         "source": f"{OS_TYPE}-{HOSTNAME}",
         "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
@@ -47,14 +46,44 @@ def send_log(content):
         payload["type"] = "ERROR"
     if "warning" in content.lower():
         payload["type"] = "WARNING"
+    return payload
 
+def send_log(content):
+    # Basic filtering to reduce noise from macOS system logs
+    if OS_TYPE == "macos" and "last message repeated" in content:
+        return
+
+    payload = build_payload(content)
     try:
         response = requests.post(API_URL, json=payload)
-        if response.status_code != 200:
+        if response.status_code not in (200, 202):
             print(f"Failed to send log: {response.text}")
     except Exception as e:
         print(f"Error sending log: {e}")
 
+def stream_logs(lines):
+    """
+    Sends lines as NDJSON over a single chunked POST to STREAM_URL.
+    Reconnects (resuming from the current position in the file) on errors
+    and when the hub ends the stream, e.g. on a graceful restart.
+    """
+    def body():
+        for line in lines:
+            if OS_TYPE == "macos" and "last message repeated" in line:
+                continue
+            yield (json.dumps(build_payload(line)) + "\n").encode()
+
+    while True:
+        try:
+            with requests.post(STREAM_URL, data=body(), stream=True) as response:
+                for ack in response.iter_lines():
+                    print(f"Hub ack: {ack.decode()}")
+            print("Hub closed the stream, reconnecting in 1s...")
+            time.sleep(1)
+        except Exception as e:
+            print(f"Stream error: {e}, reconnecting in 5s...")
+            time.sleep(5)
+
 def main():
     print(f"Starting Log Collector on {HOSTNAME} ({OS_TYPE})...")
     print(f"Monitoring {LOG_FILE}")
@@ -67,8 +96,11 @@ def main():
 
     try:
         with open(LOG_FILE, "r") as f:
-            for line in follow(f):
-                send_log(line)
+            if STREAM_URL:
+                stream_logs(follow(f))
+            else:
+                for line in follow(f):
+                    send_log(line)
     except KeyboardInterrupt:
         print("Stopping collector...")
     except Exception as e:
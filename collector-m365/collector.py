@@ -40,7 +40,7 @@ def send_data(content):
     }
     try:
         response = requests.post(API_URL, json=payload)
-        if response.status_code != 200:
+        if response.status_code not in (200, 202):
             print(f"Failed to send data: {response.text}")
     except Exception as e:
         print(f"Error sending data: {e}")
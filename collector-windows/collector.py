@@ -46,7 +46,7 @@ def send_log(content):
     }
     try:
         response = requests.post(API_URL, json=payload)
-        if response.status_code != 200:
+        if response.status_code not in (200, 202):
             print(f"Failed to send log: {response.text}")
     except Exception as e:
         print(f"Error sending log: {e}")
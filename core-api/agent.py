@@ -1,22 +1,29 @@
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import httpx
 import os
 import json
 import hashlib
 import random
-from database import get_db
+from database import get_async_db
 from models import Log, Notification, SystemConfig
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from cvss_calculator import calculate_severity, get_severity_description
+from ai_provider import get_ai_engine
+from analysis_cache import AnalysisCache, normalize_message
+from live_tail import broker
 
 router = APIRouter()
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
 
-# Simple in-memory cache for analysis results
-analysis_cache = {}
+# Bounded, TTL-aware cache for analysis results
+analysis_cache = AnalysisCache(
+    max_entries=int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "10000")),
+    ttl_seconds=int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "3600"))
+)
 
 class AnalysisRequest(BaseModel):
     log_message: str
@@ -24,23 +31,14 @@ class AnalysisRequest(BaseModel):
     context: str = ""
 
 def get_cache_key(log_message: str, source: str) -> str:
-    """Generate cache key from log message and source"""
-    return hashlib.md5(f"{source}:{log_message}".encode()).hexdigest()
-
-
-
-
-# Add parent directory to path to import ai_engine
-import sys
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
-try:
-    from ai_engine.engine import AIEngine
-    print("Initializing AI Engine in Agent...")
-    ai_engine = AIEngine()
-except Exception as e:
-    print(f"Failed to initialize AI Engine in Agent: {e}")
-    ai_engine = None
+    """
+    Generate cache key from the normalized log message and source.
+    IPs/ports/timestamps are masked, but the reputation class of the IP is
+    kept because it changes the prompt (and therefore the verdict).
+    """
+    ip, _ = _extract_entities(log_message)
+    reputation = _check_ip_reputation(ip)["status"] if ip else "-"
+    return hashlib.md5(f"{source}:{reputation}:{normalize_message(log_message)}".encode()).hexdigest()
 
 # Import Playbooks
 try:
@@ -57,17 +55,28 @@ class LearnRequest(BaseModel):
 
 @router.post("/learn")
 async def learn_from_log(request: LearnRequest):
+    ai_engine = await get_ai_engine()
     if not ai_engine:
         return {"status": "error", "message": "AI Engine not available"}
     
-    result = ai_engine.learn_log(
+    result = await ai_engine.learn_log(
         text=request.log_message,
         is_threat=request.is_threat,
         severity=request.severity,
         remediation=request.remediation
     )
+    # The knowledge base changed, so cached verdicts may be stale
+    analysis_cache.invalidate()
     return result
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return analysis_cache.stats()
+
+@router.delete("/cache")
+async def clear_cache():
+    return {"status": "cleared", "removed": analysis_cache.invalidate()}
+
 async def query_ollama(prompt: str, model: str = "llama3.2") -> dict:
     """
     Queries the Ollama LLM for analysis.
@@ -95,19 +104,20 @@ async def query_ollama(prompt: str, model: str = "llama3.2") -> dict:
 
 import re
 
-def _get_user_context(username: str, db: Session = None) -> dict:
+async def _has_graph_api_key(db: AsyncSession) -> bool:
+    try:
+        config = (await db.execute(select(SystemConfig).where(SystemConfig.key == "GRAPH_API_KEY"))).scalar_one_or_none()
+        return bool(config and config.value)
+    except Exception as e:
+        print(f"Failed to read GRAPH_API_KEY config: {e}")
+        return False
+
+def _get_user_context(username: str, has_api_key: bool = False) -> dict:
     """
     Helper to simulate retrieving User Context from Graph API.
     """
     is_admin = "admin" in username.lower() or "root" in username.lower()
     
-    # Check for Graph API Key
-    has_api_key = False
-    if db:
-        config = db.query(SystemConfig).filter(SystemConfig.key == "GRAPH_API_KEY").first()
-        if config and config.value:
-            has_api_key = True
-            
     # Simulate richer context if API key is present
     job_title = "Administrator" if is_admin else "Employee"
     if has_api_key and "doe" in username:
@@ -153,11 +163,12 @@ def _extract_entities(log_message: str):
     return ip, user
 
 @router.post("/analyze")
-async def analyze_security_event(request: AnalysisRequest, db: Session = Depends(get_db)):
+async def analyze_security_event(request: AnalysisRequest, db: AsyncSession = Depends(get_async_db)):
     # Tier 1: Memory (Cache) - Check cache first for faster response
     cache_key = get_cache_key(request.log_message, request.source)
-    if cache_key in analysis_cache:
-        return analysis_cache[cache_key]
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
     # Calculate severity using CVSS (fallback/initial baseline)
     log_type = "INFO"
@@ -179,10 +190,11 @@ async def analyze_security_event(request: AnalysisRequest, db: Session = Depends
     }
 
     # Tier 2 & 3: AI Analysis (VectorDB + LLM)
+    ai_engine = await get_ai_engine()
     if ai_engine:
         try:
             # 1. Retrieve Context (Vector Search)
-            retrieval = ai_engine.analyze_log(request.log_message)
+            retrieval = await ai_engine.analyze_log(request.log_message)
             context_str = "No similar past incidents found."
             
             # Tier 2: Knowledge Base (High Confidence Match)
@@ -202,7 +214,7 @@ async def analyze_security_event(request: AnalysisRequest, db: Session = Depends
                     "remediation": playbook['remediation'],
                     "title": playbook['title']
                 }
-                analysis_cache[cache_key] = final_analysis
+                analysis_cache.set(cache_key, final_analysis)
                 return final_analysis
 
             # Tier 3: Expert Analysis (Generative AI)
@@ -216,7 +228,7 @@ async def analyze_security_event(request: AnalysisRequest, db: Session = Depends
             entity_context = ""
             
             if user:
-                u_ctx = _get_user_context(user, db)
+                u_ctx = _get_user_context(user, await _has_graph_api_key(db))
                 entity_context += f"- User '{user}': Role={u_ctx['jobTitle']}, IsAdmin={u_ctx['is_admin']}, RiskLevel={u_ctx['riskLevel']}\n"
                 
             if ip:
@@ -330,32 +342,35 @@ async def analyze_security_event(request: AnalysisRequest, db: Session = Depends
                 timestamp=datetime.utcnow()
             )
             db.add(note)
-            db.commit()
+            await db.commit()
+            broker.publish_notification({
+                "id": note.id, "type": note.type, "message": note.message,
+                "timestamp": note.timestamp, "is_read": False
+            })
             print(f"Created Notification for {final_analysis.get('severity')} threat.")
         except Exception as e:
             print(f"Failed to create notification: {e}")
 
-    analysis_cache[cache_key] = final_analysis
+    analysis_cache.set(cache_key, final_analysis)
     return final_analysis
 
 @router.get("/users/risk")
-def get_user_risk_profile(db: Session = Depends(get_db)):
+async def get_user_risk_profile(db: AsyncSession = Depends(get_async_db)):
     """
     Analyzes logs to build a risk profile for users.
     Implements 'Impossible Travel' and 'Data Exfiltration' detection via Graph-like queries.
     """
-    # Look back 24 hours
-    since = datetime.utcnow() - timedelta(hours=24)
-    logs = db.query(Log).filter(Log.timestamp >= since).all()
+    # Look back 24 hours (a bare range on timestamp keeps partition pruning)
+    since = datetime.now(timezone.utc) - timedelta(hours=24)
+    # Only the columns we need, streamed so a busy day is not loaded at once
+    logs = await db.stream(select(Log.message, Log.user_name).where(Log.timestamp >= since))
     
     user_risk = {}
     
-    for log in logs:
+    async for log in logs:
         # Extract user (naive extraction for MVP)
-        user = None
-        if log.raw_content and "user" in log.raw_content:
-            user = log.raw_content["user"]
-        elif "@" in log.message: # Simple regex-like email extraction
+        user = log.user_name # promoted from raw_content["user"] at ingest
+        if not user and "@" in log.message: # Simple regex-like email extraction
             parts = log.message.split()
             for p in parts:
                 if "@" in p and "." in p:
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+
+# Add parent directory to path to import ai_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+logger = logging.getLogger("ai-provider")
+
+# Process-wide AI engine shared by every router.
+# Loading MiniLM + the Chroma client is slow and memory hungry, so it happens
+# once, on first use or on an explicit warmup, never at import time.
+_engine = None
+_state = "cold" # cold, loading, ready, failed
+_error = None
+_load_seconds = None
+_lock = threading.Lock()
+
+def _load():
+    global _engine, _state, _error, _load_seconds
+    with _lock:
+        if _state == "ready":
+            return _engine
+        _state = "loading"
+        start = time.perf_counter()
+        try:
+            from ai_engine.engine import AIEngine
+            from ai_engine.executor import AsyncAIEngine
+            from ai_engine.template_miner import TemplateMiner
+            logger.info("Loading shared AI Engine...")
+            miner = None
+            if os.getenv("TEMPLATE_MINING", "true").lower() == "true":
+                miner = TemplateMiner(
+                    depth=int(os.getenv("TEMPLATE_DEPTH", "4")),
+                    sim_threshold=float(os.getenv("TEMPLATE_SIM_THRESHOLD", "0.5")),
+                    max_templates=int(os.getenv("TEMPLATE_MAX", "5000"))
+                )
+            _engine = AsyncAIEngine(
+                AIEngine(),
+                max_workers=int(os.getenv("AI_ENGINE_WORKERS", "4")),
+                miner=miner
+            )
+            _state = "ready"
+            _error = None
+            logger.info(f"AI Engine ready in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            _engine = None
+            _state = "failed"
+            _error = str(e)
+            logger.error(f"Failed to initialize AI Engine: {e}")
+        finally:
+            _load_seconds = round(time.perf_counter() - start, 3)
+        return _engine
+
+async def get_ai_engine():
+    """
+    Returns the shared AsyncAIEngine, loading it off the event loop on first
+    use. Returns None if the engine failed to load (see warmup() to retry).
+    """
+    if _state == "ready":
+        return _engine
+    if _state == "failed":
+        return None
+    return await asyncio.to_thread(_load)
+
+async def warmup():
+    """
+    Loads the engine now (retrying a previous failure).
+    """
+    global _state
+    if _state == "failed":
+        _state = "cold"
+    await get_ai_engine()
+    return status()
+
+def peek_ai_engine():
+    """
+    Returns the engine if it is already loaded, without triggering a load.
+    """
+    return _engine if _state == "ready" else None
+
+def status() -> dict:
+    return {
+        "state": _state,
+        "ready": _state == "ready",
+        "error": _error,
+        "load_seconds": _load_seconds
+    }
@@ -0,0 +1,477 @@
+"""
+Cold tier for old logs: zstd-compressed Parquet segments on local disk.
+
+Logs older than LOG_ARCHIVE_AFTER_DAYS are exported one UTC day per segment
+(sorted by timestamp) and then removed from the database (the day's partition
+is dropped on Postgres). `index.json` records each segment's min/max
+timestamp, max id and sources, so reads only open segments that can match.
+The server and the CLI (or partitions.py maintain) may archive at the same
+time: segment names are unique per write, the manifest is re-read under a
+file lock before every read and update, and a run holds a writer lock so
+two processes never archive the same day twice.
+
+GET /ingest/logs and /ingest/search read through to the archive for old
+time ranges (see log_store.page_logs and search.search_logs).
+
+Usage:
+    python archive.py run      # archive everything past the cutoff now
+    python archive.py stats
+"""
+import fcntl
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import select, delete, func
+from models import Log
+from log_fields import PROMOTED_FIELDS
+
+logger = logging.getLogger("archive")
+
+ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive"))
+ARCHIVE_AFTER_DAYS = int(os.getenv("LOG_ARCHIVE_AFTER_DAYS", "0")) # 0 disables archiving
+ARCHIVE_RETENTION_DAYS = int(os.getenv("LOG_ARCHIVE_RETENTION_DAYS", "0")) # 0 keeps segments forever
+ARCHIVE_BATCH_ROWS = int(os.getenv("LOG_ARCHIVE_BATCH_ROWS", "50000"))
+DELETE_BATCH_IDS = 1000 # ids per DELETE ... WHERE id IN (...)
+ZSTD_LEVEL = int(os.getenv("LOG_ARCHIVE_ZSTD_LEVEL", "9"))
+
+TIMESTAMP = pa.timestamp("us", tz="UTC")
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("source", pa.string()),
+    ("type", pa.string()),
+    ("message", pa.string()),
+    ("timestamp", TIMESTAMP),
+    ("received_at", TIMESTAMP),
+    ("raw_content", pa.string()), # JSON text
+    ("is_threat", pa.bool_()),
+    ("threat_confidence", pa.string()),
+    ("threat_signature", pa.string()),
+    ("remediation", pa.string()),
+    ("occurrences", pa.int64()),
+    ("first_seen", TIMESTAMP),
+    ("last_seen", TIMESTAMP),
+] + [(column, pa.string()) for column in PROMOTED_FIELDS.values()])
+
+COLUMNS = SCHEMA.names
+
+def _utc(value):
+    if value is None:
+        return None
+    return value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def _day_start(value: datetime) -> datetime:
+    return _utc(value).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def row_key(row):
+    """
+    (timestamp, id) sort key for ORM rows and archived dicts alike.
+    """
+    if isinstance(row, dict):
+        return _utc(row["timestamp"]), row["id"]
+    return _utc(row.timestamp), row.id
+
+class LogArchive:
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "index.json")
+        self._lock = threading.Lock()
+        self._segments = []
+        self._signature = None
+
+    @contextmanager
+    def _flock(self, name: str, mode: int):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), "a") as f:
+            fcntl.flock(f, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def writer(self):
+        """
+        Held for a whole archiving run, across processes.
+        """
+        with self._flock("archive.lock", fcntl.LOCK_EX):
+            yield
+
+    def _manifest_signature(self):
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        # index.json is always replaced, never rewritten in place
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _current(self) -> list:
+        """
+        The manifest as on disk, re-read (under a shared lock) only when
+        another writer has replaced it.
+        """
+        if self._manifest_signature() == self._signature:
+            return self._segments
+        with self._lock, self._flock("index.lock", fcntl.LOCK_SH):
+            self._segments, self._signature = self._load_manifest(), self._manifest_signature()
+            return self._segments
+
+    @contextmanager
+    def _update(self):
+        """
+        Yields the freshly loaded segment list under the exclusive manifest
+        lock; the list is saved if the caller changed it.
+        """
+        with self._lock, self._flock("index.lock", fcntl.LOCK_EX):
+            segments = self._load_manifest()
+            before = list(segments)
+            yield segments
+            if segments != before:
+                self._save_manifest(segments)
+            self._segments, self._signature = segments, self._manifest_signature()
+
+    def _load_manifest(self) -> list:
+        if not os.path.exists(self.manifest_path):
+            return []
+        with open(self.manifest_path) as f:
+            segments = json.load(f)["segments"]
+        for segment in segments:
+            segment["min_ts"] = datetime.fromisoformat(segment["min_ts"])
+            segment["max_ts"] = datetime.fromisoformat(segment["max_ts"])
+        return segments
+
+    def _save_manifest(self, segments):
+        os.makedirs(self.directory, exist_ok=True)
+        data = {"segments": [
+            {**s, "min_ts": s["min_ts"].isoformat(), "max_ts": s["max_ts"].isoformat()} for s in segments
+        ]}
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    @property
+    def newest(self):
+        segments = self._current()
+        return max((s["max_ts"] for s in segments), default=None)
+
+    def segments(self, since: datetime = None, until: datetime = None, source: str = None) -> list:
+        """
+        Segments that can hold rows in [since, until) for `source`, newest first.
+        """
+        since, until = _utc(since), _utc(until)
+        matching = [
+            s for s in self._current()
+            if (since is None or s["max_ts"] >= since)
+            and (until is None or s["min_ts"] < until)
+            and (source is None or source in s["sources"])
+        ]
+        return sorted(matching, key=lambda s: s["max_ts"], reverse=True)
+
+    def archived_max_id(self, day: datetime) -> int:
+        day = _day_start(day)
+        return max((s["max_id"] for s in self._current() if s["day"] == f"{day:%Y%m%d}"), default=0)
+
+    def archived_ids(self, day: datetime) -> set:
+        """
+        Ids of every row archived for `day`, read from the segments' id column.
+        """
+        day = _day_start(day)
+        ids = set()
+        for segment in self._current():
+            if segment["day"] == f"{day:%Y%m%d}":
+                table = pq.read_table(os.path.join(self.directory, segment["file"]), columns=["id"])
+                ids.update(table.column("id").to_pylist())
+        return ids
+
+    # --- Writing ---
+
+    def write_segment(self, day: datetime, batches) -> dict:
+        """
+        Writes an iterable of row-dict batches (timestamp-ordered) as one
+        segment for `day` and records it in the manifest. Returns the
+        segment entry, or None if there were no rows.
+        """
+        day = _day_start(day)
+        # Unique per write, so concurrent archivers never share a file or its .tmp
+        filename = f"logs-{day:%Y%m%d}-{uuid.uuid4().hex[:12]}.parquet"
+        path = os.path.join(self.directory, filename)
+        os.makedirs(self.directory, exist_ok=True)
+
+        writer = None
+        meta = {"file": filename, "day": f"{day:%Y%m%d}", "rows": 0, "max_id": 0, "sources": set(),
+                "min_ts": None, "max_ts": None}
+        try:
+            for rows in batches:
+                if not rows:
+                    continue
+                table = pa.Table.from_pylist([self._to_record(r) for r in rows], schema=SCHEMA)
+                if writer is None:
+                    writer = pq.ParquetWriter(path + ".tmp", SCHEMA, compression="zstd", compression_level=ZSTD_LEVEL)
+                writer.write_table(table)
+                meta["rows"] += len(rows)
+                meta["max_id"] = max(meta["max_id"], max(r["id"] for r in rows))
+                meta["sources"].update(r["source"] for r in rows if r["source"] is not None)
+                first, last = _utc(rows[0]["timestamp"]), _utc(rows[-1]["timestamp"])
+                meta["min_ts"] = first if meta["min_ts"] is None else min(meta["min_ts"], first)
+                meta["max_ts"] = last if meta["max_ts"] is None else max(meta["max_ts"], last)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            return None
+
+        os.replace(path + ".tmp", path)
+        meta["sources"] = sorted(meta["sources"])
+        with self._update() as segments:
+            segments.append(meta)
+        return meta
+
+    @staticmethod
+    def _to_record(row: dict) -> dict:
+        record = {column: row.get(column) for column in COLUMNS}
+        record["timestamp"] = _utc(record["timestamp"])
+        record["received_at"] = _utc(record["received_at"])
+        record["first_seen"] = _utc(record["first_seen"])
+        record["last_seen"] = _utc(record["last_seen"])
+        if record["raw_content"] is not None and not isinstance(record["raw_content"], str):
+            record["raw_content"] = json.dumps(record["raw_content"])
+        return record
+
+    def drop_expired(self, retention_days: int = ARCHIVE_RETENTION_DAYS, now: datetime = None) -> list:
+        if retention_days <= 0:
+            return []
+        cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=retention_days)
+        with self._update() as segments:
+            expired = [s for s in segments if s["max_ts"] < cutoff]
+            segments[:] = [s for s in segments if s["max_ts"] >= cutoff]
+        for segment in expired:
+            try:
+                os.remove(os.path.join(self.directory, segment["file"]))
+            except FileNotFoundError:
+                pass
+        return [s["file"] for s in expired]
+
+    # --- Reading ---
+
+    def _read(self, segment, since=None, until=None, before=None, source=None, log_type=None,
+              is_threat=None, fields=None, contains=None) -> pa.Table:
+        expr = None
+
+        def add(condition):
+            nonlocal expr
+            expr = condition if expr is None else expr & condition
+
+        ts = pc.field("timestamp")
+        if since is not None:
+            add(ts >= pa.scalar(_utc(since), type=TIMESTAMP))
+        if until is not None:
+            add(ts < pa.scalar(_utc(until), type=TIMESTAMP))
+        if before is not None:
+            before_ts = pa.scalar(_utc(before[0]), type=TIMESTAMP)
+            add((ts < before_ts) | ((ts == before_ts) & (pc.field("id") < before[1])))
+        if source is not None:
+            add(pc.field("source") == source)
+        if log_type is not None:
+            add(pc.field("type") == log_type)
+        if is_threat is not None:
+            add(pc.field("is_threat") == is_threat)
+        for key, value in (fields or {}).items():
+            if key in PROMOTED_FIELDS:
+                add(pc.field(PROMOTED_FIELDS[key]) == value)
+        for needle in contains or []:
+            # Cheap superset filter; exact term matching happens in Python
+            add(pc.match_substring(pc.utf8_lower(pc.field("message")), needle.lower()))
+
+        return pq.read_table(os.path.join(self.directory, segment["file"]), filters=expr)
+
+    @staticmethod
+    def _raw_fields_match(row: dict, fields: dict) -> bool:
+        raw = {k: v for k, v in (fields or {}).items() if k not in PROMOTED_FIELDS}
+        if not raw:
+            return True
+        try:
+            content = json.loads(row["raw_content"] or "{}")
+        except ValueError:
+            return False
+        return all(str(content.get(key)).lower() == value.lower() if isinstance(content.get(key), bool)
+                   else str(content.get(key)) == value for key, value in raw.items())
+
+    @staticmethod
+    def _to_row(record: dict) -> dict:
+        if record.get("raw_content") is not None:
+            try:
+                record["raw_content"] = json.loads(record["raw_content"])
+            except ValueError:
+                pass
+        # Segments written before folding have no occurrence columns
+        record.setdefault("occurrences", 1)
+        record["archived"] = True
+        return record
+
+    def query(self, limit: int, before=None, source=None, log_type=None, is_threat=None,
+              since=None, until=None, fields=None, match=None) -> list:
+        """
+        Up to `limit` archived rows newest first on (timestamp, id), strictly
+        after the `before` keyset position. `match` is an optional
+        (needles, predicate) pair used by search.
+        Segments are visited newest first and the scan stops once no
+        remaining segment can beat the rows already collected.
+        """
+        upper = until
+        if before is not None and (upper is None or _utc(before[0]) < _utc(upper)):
+            upper = before[0] + timedelta(microseconds=1)
+        needles, predicate = match or (None, None)
+
+        collected = []
+        for segment in self.segments(since, upper, source):
+            if len(collected) >= limit and segment["max_ts"] < row_key(collected[limit - 1])[0]:
+                break
+            table = self._read(segment, since, until, before, source, log_type, is_threat, fields, needles)
+            for record in table.to_pylist():
+                if not self._raw_fields_match(record, fields):
+                    continue
+                if predicate is not None and not predicate(record["message"] or ""):
+                    continue
+                collected.append(self._to_row(record))
+            collected.sort(key=row_key, reverse=True)
+            del collected[limit:]
+        return collected
+
+    def stats(self) -> dict:
+        segments = self._current()
+        size = 0
+        for s in segments:
+            try:
+                size += os.path.getsize(os.path.join(self.directory, s["file"]))
+            except OSError:
+                pass
+        return {
+            "directory": self.directory,
+            "segments": len(segments),
+            "rows": sum(s["rows"] for s in segments),
+            "bytes": size,
+            "oldest": min((s["min_ts"] for s in segments), default=None),
+            "newest": self.newest,
+            "archive_after_days": ARCHIVE_AFTER_DAYS
+        }
+
+log_archive = LogArchive()
+
+def _day_rows(db, day_start: datetime, day_end: datetime, archived_ids: set):
+    """
+    Yields the day's not-yet-archived rows in timestamp order, in batches,
+    adding each yielded id to `archived_ids`.
+    """
+    columns = [getattr(Log, c) for c in COLUMNS]
+    stmt = select(*columns)\
+        .where(Log.timestamp >= day_start, Log.timestamp < day_end)\
+        .order_by(Log.timestamp, Log.id)\
+        .execution_options(yield_per=ARCHIVE_BATCH_ROWS)
+    for partition in db.execute(stmt).partitions():
+        # Ids commit out of order, so "already archived" is a set, not an id bound
+        rows = [dict(zip(COLUMNS, row)) for row in partition]
+        rows = [row for row in rows if row["id"] not in archived_ids]
+        archived_ids.update(row["id"] for row in rows)
+        yield rows
+
+def _delete_archived(db, day_start: datetime, day_end: datetime, archived_ids: set):
+    ids = sorted(archived_ids)
+    for i in range(0, len(ids), DELETE_BATCH_IDS):
+        db.execute(delete(Log).where(Log.timestamp >= day_start, Log.timestamp < day_end,
+                                     Log.id.in_(ids[i:i + DELETE_BATCH_IDS])))
+    db.commit()
+
+def archive_old_logs(archive: LogArchive = None, after_days: int = ARCHIVE_AFTER_DAYS, now: datetime = None) -> list:
+    """
+    Moves every full UTC day older than `after_days` from the database to
+    the archive. Rows are only removed from the database after their
+    segment and the manifest are on disk, and only by id: a row committed
+    after the export (ids are not assigned in commit order) stays for the
+    next run. Rows whose id is already in one of the day's segments are
+    removed without being exported again.
+    """
+    if after_days <= 0:
+        return []
+    from database import SessionLocal
+    import partitions
+
+    archive = archive or log_archive
+    cutoff = _day_start((now or datetime.now(timezone.utc)) - timedelta(days=after_days))
+    archived = []
+
+    db = SessionLocal()
+    try:
+        # Another process archiving concurrently would otherwise export the same rows
+        with archive.writer():
+            oldest = db.execute(select(func.min(Log.timestamp)).where(Log.timestamp < cutoff)).scalar()
+            day = _day_start(oldest) if oldest is not None else cutoff
+            while day < cutoff:
+                day_end = day + timedelta(days=1)
+                has_rows = db.execute(select(Log.id).where(Log.timestamp >= day, Log.timestamp < day_end).limit(1)).first()
+                if has_rows:
+                    archived_ids = archive.archived_ids(day)
+                    segment = archive.write_segment(day, _day_rows(db, day, day_end, archived_ids))
+                    if segment:
+                        logger.info(f"Archived {segment['rows']} logs to {segment['file']}")
+                        archived.append(segment)
+                    db.rollback() # end the read transaction before removing rows
+                    if not partitions.drop_partition_if_within(day, day_end, len(archived_ids)):
+                        _delete_archived(db, day, day_end, archived_ids)
+                day = day_end
+    finally:
+        db.close()
+
+    archive.drop_expired()
+    return archived
+
+# Search support (mirrors search.parse_query terms)
+_WORD = re.compile(r"[\w.\-@]+")
+
+def message_matcher(terms: list):
+    """
+    Returns (needles, predicate) matching search terms against raw messages:
+    words and prefixes on word boundaries, phrases as normalized substrings.
+    """
+    needles = [value for _, value in terms]
+
+    def predicate(message: str) -> bool:
+        lowered = message.lower()
+        words = set()
+        for word in _WORD.findall(lowered):
+            # "password." / "user@host" also count as "password" / "user", "host"
+            words.add(word)
+            words.update(part for part in re.split(r"[.\-@]", word) if part)
+        normalized = " ".join(lowered.split())
+        for kind, value in terms:
+            value = value.lower()
+            if kind == "prefix":
+                if not any(w.startswith(value) for w in words):
+                    return False
+            elif kind == "phrase" or not _WORD.fullmatch(value):
+                if value not in normalized:
+                    return False
+            elif value not in words:
+                return False
+        return True
+
+    return needles, predicate
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "run":
+        if ARCHIVE_AFTER_DAYS <= 0:
+            print("Set LOG_ARCHIVE_AFTER_DAYS to enable archiving.")
+        else:
+            print(f"Archived {len(archive_old_logs())} segments.")
+    print(log_archive.stats())
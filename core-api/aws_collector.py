@@ -66,5 +66,6 @@ class AWSCollector:
                 await asyncio.sleep(5) # Poll interval
                 
             except Exception as e:
+                # The collector supervisor restarts the run with backoff
                 print(f"AWS Collection Error: {e}")
-                await asyncio.sleep(10)
+                raise
@@ -0,0 +1,186 @@
+"""
+Supervised runtime for the collectors started from the Sources API.
+
+One asyncio task per LogSource. A run that fails (or whose stream ends) is
+restarted after a jittered exponential backoff; the backoff resets once a
+run has stayed up for COLLECTOR_STABLE_SECONDS. A source that no longer
+exists, or whose filter patterns the remote host rejects, is not retried.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+from log_tail import FilterError
+
+logger = logging.getLogger("collector-supervisor")
+
+COLLECTOR_BACKOFF_SECONDS = float(os.getenv("COLLECTOR_BACKOFF_SECONDS", "1"))
+COLLECTOR_MAX_BACKOFF_SECONDS = float(os.getenv("COLLECTOR_MAX_BACKOFF_SECONDS", "300"))
+COLLECTOR_STABLE_SECONDS = float(os.getenv("COLLECTOR_STABLE_SECONDS", "60"))
+
+class SupervisedCollector:
+    def __init__(self, source_id: int):
+        self.source_id = source_id
+        self.name = None
+        self.state = "starting" # starting, running, backoff, stopped, failed
+        self.task = None
+        self.sink = None
+        self.restarts = 0
+        self.failures = 0 # consecutive
+        self.last_error = None
+        self.last_error_at = None
+        self.started_at = None
+        self.retry_at = None
+        self.recording = None # last on_state call in flight
+
+    def status(self) -> dict:
+        sink = self.sink.stats() if self.sink is not None else {}
+        return {
+            "source_id": self.source_id,
+            "name": self.name,
+            "state": self.state,
+            "restarts": self.restarts,
+            "consecutive_failures": self.failures,
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+            "started_at": self.started_at,
+            "retry_in_seconds": round(max(self.retry_at - time.monotonic(), 0), 1) if self.retry_at else None,
+            "lines": sink.get("sent", 0),
+            "lines_per_sec": sink.get("lines_per_sec", 0.0)
+        }
+
+class CollectorSupervisor:
+    def __init__(self, run=None, backoff=COLLECTOR_BACKOFF_SECONDS, max_backoff=COLLECTOR_MAX_BACKOFF_SECONDS,
+                 stable_seconds=COLLECTOR_STABLE_SECONDS, on_state=None):
+        # run(source_id, on_start) collects until the stream ends or fails;
+        # defaults to ssh_collector.run_collection
+        self.run = run
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stable_seconds = stable_seconds
+        # on_state(source_id, state) mirrors the state elsewhere (LogSource.status);
+        # it is blocking and runs in a worker thread, one call at a time per source
+        self.on_state = on_state
+        self._collectors = {}
+
+    def _delay(self, failures: int) -> float:
+        delay = min(self.backoff * (2 ** (failures - 1)), self.max_backoff)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _set_state(self, entry: SupervisedCollector, state: str):
+        entry.state = state
+        if self.on_state:
+            entry.recording = asyncio.create_task(self._record_state(entry.source_id, state, entry.recording))
+
+    async def _record_state(self, source_id: int, state: str, previous):
+        # Chained so a slow write can never land after a newer state
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            await asyncio.to_thread(self.on_state, source_id, state)
+        except Exception as e:
+            logger.error(f"Failed to record state of source {source_id}: {e}")
+
+    async def _supervise(self, entry: SupervisedCollector):
+        run = self.run
+        if run is None:
+            from ssh_collector import run_collection as run
+
+        def on_start(source, sink):
+            entry.name = source.name
+            entry.sink = sink
+            self._set_state(entry, "running")
+
+        while True:
+            started = time.monotonic()
+            entry.started_at = datetime.now(timezone.utc)
+            entry.retry_at = None
+            try:
+                await run(entry.source_id, on_start)
+                error = "Collector stream ended"
+            except asyncio.CancelledError:
+                raise
+            except (LookupError, FilterError) as e:
+                entry.last_error, entry.last_error_at = str(e), datetime.now(timezone.utc)
+                self._set_state(entry, "failed")
+                logger.error(f"Collector for source {entry.source_id} not restarted: {e}")
+                return
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+
+            if time.monotonic() - started >= self.stable_seconds:
+                entry.failures = 0
+            entry.failures += 1
+            entry.restarts += 1
+            entry.last_error, entry.last_error_at = error, datetime.now(timezone.utc)
+            delay = self._delay(entry.failures)
+            entry.retry_at = time.monotonic() + delay
+            self._set_state(entry, "backoff")
+            logger.warning(f"Collector {entry.name or entry.source_id} failed ({error}); restarting in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def is_running(self, source_id: int) -> bool:
+        entry = self._collectors.get(source_id)
+        return entry is not None and entry.task is not None and not entry.task.done()
+
+    def start(self, source_id: int) -> bool:
+        """
+        Starts supervising a source; False if it is already running.
+        """
+        if self.is_running(source_id):
+            return False
+        entry = SupervisedCollector(source_id)
+        previous = self._collectors.get(source_id)
+        if previous is not None:
+            entry.name = previous.name
+            entry.recording = previous.recording
+        self._collectors[source_id] = entry
+        self._set_state(entry, "starting")
+        entry.task = asyncio.create_task(self._supervise(entry))
+        return True
+
+    async def stop(self, source_id: int) -> bool:
+        """
+        Cancels a source's collector; False if it was not running.
+        """
+        entry = self._collectors.get(source_id)
+        if entry is None or entry.task is None or entry.task.done():
+            return False
+        entry.task.cancel()
+        await asyncio.gather(entry.task, return_exceptions=True)
+        entry.retry_at = None
+        self._set_state(entry, "stopped")
+        if entry.recording is not None:
+            # The API and shutdown expect the stored status to be current
+            await entry.recording
+        return True
+
+    async def restart(self, source_id: int):
+        await self.stop(source_id)
+        self.start(source_id)
+
+    async def stop_all(self):
+        await asyncio.gather(*(self.stop(source_id) for source_id in list(self._collectors)))
+
+    def status(self, source_id: int = None):
+        if source_id is not None:
+            entry = self._collectors.get(source_id)
+            return entry.status() if entry else None
+        return [entry.status() for entry in self._collectors.values()]
+
+def _record_source_status(source_id: int, state: str):
+    from database import SessionLocal
+    from models import LogSource
+    status = {"running": "online", "backoff": "error", "failed": "error", "stopped": "offline"}.get(state)
+    if status is None:
+        return
+    db = SessionLocal()
+    try:
+        db.query(LogSource).filter(LogSource.id == source_id).update({"status": status})
+        db.commit()
+    finally:
+        db.close()
+
+supervisor = CollectorSupervisor(on_state=_record_source_status)
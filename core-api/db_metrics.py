@@ -0,0 +1,133 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from sqlalchemy import event
+
+logger = logging.getLogger("db")
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+
+class DBMetrics:
+    """
+    Pool checkout/wait counters and query timings for one engine,
+    collected through SQLAlchemy pool and cursor events.
+    """
+
+    def __init__(self, name, slow_query_ms=SLOW_QUERY_MS, keep_slow=50):
+        self.name = name
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._slow = deque(maxlen=keep_slow)
+        self._pool = None
+
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.wait_count = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.queries = 0
+        self.query_ms_total = 0.0
+        self.query_ms_max = 0.0
+        self.slow_queries = 0
+
+    def record_wait(self, ms):
+        with self._lock:
+            self.wait_count += 1
+            self.wait_ms_total += ms
+            self.wait_ms_max = max(self.wait_ms_max, ms)
+
+    def record_query(self, statement, ms):
+        with self._lock:
+            self.queries += 1
+            self.query_ms_total += ms
+            self.query_ms_max = max(self.query_ms_max, ms)
+            if ms < self.slow_query_ms:
+                return
+            self.slow_queries += 1
+            self._slow.append({"ms": round(ms, 2), "statement": " ".join(statement.split())[:500], "at": time.time()})
+        logger.warning(f"Slow query on {self.name} ({ms:.0f}ms): {statement[:200]}")
+
+    def attach(self, engine):
+        """
+        Hooks the metrics into a (sync) Engine; for an AsyncEngine pass
+        `async_engine.sync_engine`.
+        """
+        self._pool = engine.pool
+
+        @event.listens_for(engine.pool, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            with self._lock:
+                self.connects += 1
+
+        @event.listens_for(engine.pool, "checkout")
+        def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+            with self._lock:
+                self.checkouts += 1
+
+        @event.listens_for(engine.pool, "checkin")
+        def _on_checkin(dbapi_connection, connection_record):
+            with self._lock:
+                self.checkins += 1
+
+        # The start time lives on the execution context: after_cursor_execute
+        # does not fire when a statement raises, so a per-connection stack
+        # would be left holding the failed statement's start
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context._query_start = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, "_query_start", None)
+            if started is not None:
+                self.record_query(statement, (time.perf_counter() - started) * 1000)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "pool_wait_ms": {
+                    "count": self.wait_count,
+                    "avg": round(self.wait_ms_total / self.wait_count, 3) if self.wait_count else 0.0,
+                    "max": round(self.wait_ms_max, 3)
+                },
+                "queries": self.queries,
+                "query_ms": {
+                    "avg": round(self.query_ms_total / self.queries, 3) if self.queries else 0.0,
+                    "max": round(self.query_ms_max, 3)
+                },
+                "slow_query_ms": self.slow_query_ms,
+                "slow_queries": self.slow_queries,
+                "recent_slow": list(self._slow)
+            }
+        pool = self._pool
+        if pool is not None and hasattr(pool, "checkedout"):
+            stats["pool"] = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "idle": pool.checkedin()
+            }
+        return stats
+
+def timed_pool(pool_class, metrics):
+    """
+    Subclasses a QueuePool so the time spent waiting for a connection
+    (including opening one) is recorded on the engine's DBMetrics.
+    """
+    class TimedPool(pool_class):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                metrics.record_wait((time.perf_counter() - start) * 1000)
+
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
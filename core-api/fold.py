@@ -0,0 +1,238 @@
+"""
+Ingest-time folding of repeated log lines.
+
+Noisy sources (health checks, "Failed password" floods, cron) repeat the
+same line thousands of times. With folding enabled for a source, lines with
+the same source, type and message template arriving within the source's
+window are coalesced into one Log row carrying `occurrences`, `first_seen`
+and `last_seen`. Only that one row is triaged by the AI engine.
+
+Config:
+    FOLD_WINDOW_SECONDS=0          default window (0 = folding off)
+    FOLD_WINDOWS=nginx=30,cron=300 per-source overrides
+    FOLD_MODE=template             "template" (masked IPs/ports/ids) or "exact"
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import timezone
+from sqlalchemy import inspect, text
+from analysis_cache import normalize_message
+from ingest_queue import flush_with_retries
+
+logger = logging.getLogger("ingest-fold")
+
+def parse_windows(value: str) -> dict:
+    """
+    Parses "source=seconds,source=seconds" (raises ValueError if malformed).
+    """
+    windows = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        source, sep, seconds = item.rpartition("=")
+        if not sep or not source.strip():
+            raise ValueError(f"Invalid fold window '{item}', expected source=seconds")
+        windows[source.strip()] = float(seconds)
+    return windows
+
+def _utc(moment):
+    # Collectors send naive UTC, other clients "Z"; one group may mix both
+    if moment is None:
+        return None
+    return moment.astimezone(timezone.utc) if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+class LogFolder:
+    """
+    Holds one open group per (source, type, template) until the source's
+    window has passed since the group's first line, then hands the folded
+    rows to `emit` (a coroutine function, e.g. triage + insert).
+    Rows from sources without a window pass straight through `add`.
+
+    Expired groups are retried like a write-behind batch (`retries` more
+    attempts with a doubling delay) before they are counted in `failed`
+    and discarded.
+    """
+
+    def __init__(self, emit, default_window=0.0, windows=None, mode="template", max_groups=10000, tick=0.5,
+                 retries=2, retry_delay=0.5):
+        self.emit = emit
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.default_window = default_window
+        self.windows = windows or {}
+        self.mode = mode
+        self.max_groups = max_groups
+        self.tick = tick
+
+        self._groups = OrderedDict() # key -> {"row", "deadline"}
+        self._task = None
+
+        self.folded = 0
+        self.emitted = 0
+        self.passed_through = 0
+        self.forced = 0
+        self.failed = 0
+        self.retried = 0
+
+    def window_for(self, source) -> float:
+        return self.windows.get(source, self.default_window)
+
+    @property
+    def enabled(self) -> bool:
+        return self.default_window > 0 or any(w > 0 for w in self.windows.values())
+
+    def key(self, row: dict) -> tuple:
+        message = row.get("message") or ""
+        if self.mode == "template":
+            message = normalize_message(message)
+        return (row.get("source"), row.get("type"), message)
+
+    @staticmethod
+    def merge(group: dict, row: dict):
+        """
+        Adds `row` to a folded row in place; the first line's message and
+        content are kept.
+        """
+        moment = _utc(row.get("timestamp"))
+        group["occurrences"] += row.get("occurrences") or 1
+        if moment is not None:
+            group["first_seen"] = min(group["first_seen"], _utc(row.get("first_seen")) or moment)
+            group["last_seen"] = max(group["last_seen"], _utc(row.get("last_seen")) or moment)
+            group["timestamp"] = group["first_seen"]
+
+    @staticmethod
+    def start_group(row: dict) -> dict:
+        group = dict(row)
+        group["occurrences"] = row.get("occurrences") or 1
+        moment = _utc(row.get("timestamp"))
+        if moment is not None:
+            group["timestamp"] = moment
+        group["first_seen"] = _utc(row.get("first_seen")) or moment
+        group["last_seen"] = _utc(row.get("last_seen")) or moment
+        return group
+
+    def fold_batch(self, rows: list) -> tuple:
+        """
+        Folds one batch on its own (no window): returns (folded_rows, index)
+        where index[i] is the position of rows[i]'s group in folded_rows.
+        Rows from sources without a window are never folded.
+        """
+        folded, index, positions = [], [], {}
+        for row in rows:
+            if self.window_for(row.get("source")) <= 0:
+                index.append(len(folded))
+                folded.append(row)
+                continue
+            key = self.key(row)
+            if key in positions:
+                self.merge(folded[positions[key]], row)
+                self.folded += 1
+            else:
+                positions[key] = len(folded)
+                folded.append(self.start_group(row))
+            index.append(positions[key])
+        return folded, index
+
+    def add(self, rows: list) -> list:
+        """
+        Takes rows into their open groups. Returns the rows to write now:
+        rows from unfolded sources, plus the oldest groups if more than
+        `max_groups` are open.
+        """
+        now = time.monotonic()
+        ready = []
+        for row in rows:
+            window = self.window_for(row.get("source"))
+            if window <= 0:
+                ready.append(row)
+                self.passed_through += 1
+                continue
+            key = self.key(row)
+            entry = self._groups.get(key)
+            if entry is None:
+                self._groups[key] = {"row": self.start_group(row), "deadline": now + window}
+            else:
+                self.merge(entry["row"], row)
+                self.folded += 1
+
+        while len(self._groups) > self.max_groups:
+            _, entry = self._groups.popitem(last=False)
+            ready.append(entry["row"])
+            self.forced += 1
+            self.emitted += 1
+        return ready
+
+    def expire(self, now: float = None) -> list:
+        """
+        Removes and returns the groups whose window has closed.
+        """
+        now = time.monotonic() if now is None else now
+        closed = [key for key, entry in self._groups.items() if entry["deadline"] <= now]
+        rows = [self._groups.pop(key)["row"] for key in closed]
+        self.emitted += len(rows)
+        return rows
+
+    async def _emit(self, rows: list):
+        if not rows:
+            return
+        try:
+            await flush_with_retries(self.emit, rows, self.retries, self.retry_delay, on_retry=self._count_retry)
+        except Exception as e:
+            self.failed += len(rows)
+            logger.error(f"Failed to write {len(rows)} folded logs, discarding them: {e}")
+
+    def _count_retry(self):
+        self.retried += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            await self._emit(self.expire())
+
+    async def start(self):
+        if self._task is None and self.enabled:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Log folding started (default window {self.default_window}s, {len(self.windows)} source overrides, mode {self.mode})")
+
+    async def stop(self):
+        """
+        Stops the expiry task and writes every open group.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._emit(self.expire(now=float("inf")))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "mode": self.mode,
+            "default_window_seconds": self.default_window,
+            "windows": self.windows,
+            "open_groups": len(self._groups),
+            "open_lines": sum(entry["row"]["occurrences"] for entry in self._groups.values()),
+            "folded": self.folded,
+            "emitted": self.emitted,
+            "passed_through": self.passed_through,
+            "forced": self.forced,
+            "failed": self.failed,
+            "retried": self.retried
+        }
+
+def ensure_fold_columns(engine):
+    """
+    Adds the folding columns to an existing logs table.
+    """
+    with engine.begin() as conn:
+        columns = {c["name"] for c in inspect(conn).get_columns("logs")}
+        timestamp = "TIMESTAMP WITH TIME ZONE" if engine.dialect.name == "postgresql" else "DATETIME"
+        for column, ddl in (("occurrences", "INTEGER NOT NULL DEFAULT 1"),
+                            ("first_seen", timestamp),
+                            ("last_seen", timestamp)):
+            if column not in columns:
+                print(f"Adding logs.{column}...")
+                conn.execute(text(f"ALTER TABLE logs ADD COLUMN {column} {ddl}"))
@@ -0,0 +1,253 @@
+"""
+Batched HTTP forwarding for collectors.
+
+Each collector gets one BatchForwarder: a pooled keep-alive httpx client
+and a buffer that is flushed to POST /ingest/logs/batch when it reaches
+FORWARD_BATCH_SIZE lines or FORWARD_FLUSH_MS has passed. Failed batches
+are retried with exponential backoff; a full buffer makes `send` wait, so
+a stalled API slows the collector instead of growing memory. When the API
+rejects a batch (4xx), only the offending records are dropped: the ones
+named in a 422 response, or else whatever bisecting the batch isolates.
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+from collections import deque
+
+logger = logging.getLogger("forwarder")
+
+# Collectors running inside core-api only forward over HTTP when this is set
+# (see local_ingest.py); otherwise it is the default target.
+INGEST_URL = os.getenv("INGEST_URL")
+FORWARD_BATCH_SIZE = int(os.getenv("FORWARD_BATCH_SIZE", "500"))
+FORWARD_FLUSH_MS = int(os.getenv("FORWARD_FLUSH_MS", "500"))
+FORWARD_MAX_BUFFER = int(os.getenv("FORWARD_MAX_BUFFER", "5000"))
+FORWARD_MAX_RETRIES = int(os.getenv("FORWARD_MAX_RETRIES", "5"))
+FORWARD_BACKOFF_MS = int(os.getenv("FORWARD_BACKOFF_MS", "250"))
+FORWARD_MAX_BACKOFF_MS = int(os.getenv("FORWARD_MAX_BACKOFF_MS", "10000"))
+
+# Window for the lines/sec figure
+RATE_WINDOW_SECONDS = 60
+
+class RateWindow:
+    """
+    Lines handled over the last RATE_WINDOW_SECONDS.
+    """
+
+    def __init__(self, seconds=RATE_WINDOW_SECONDS):
+        self.seconds = seconds
+        self._events = deque() # (at, lines)
+
+    def add(self, lines: int, now: float = None):
+        now = time.monotonic() if now is None else now
+        self._events.append((now, lines))
+        while self._events and self._events[0][0] < now - self.seconds:
+            self._events.popleft()
+
+    def per_second(self) -> float:
+        cutoff = time.monotonic() - self.seconds
+        return round(sum(n for at, n in self._events if at >= cutoff) / self.seconds, 2)
+
+class BatchForwarder:
+    def __init__(self, source: str, url: str = None, batch_size: int = FORWARD_BATCH_SIZE,
+                 flush_interval: float = FORWARD_FLUSH_MS / 1000, max_buffer: int = FORWARD_MAX_BUFFER,
+                 max_retries: int = FORWARD_MAX_RETRIES, backoff: float = FORWARD_BACKOFF_MS / 1000,
+                 max_backoff: float = FORWARD_MAX_BACKOFF_MS / 1000, client=None):
+        self.source = source
+        self.url = url or INGEST_URL or "http://localhost:8000"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max(max_buffer, batch_size)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._client = client
+        self._owns_client = client is None
+        self._buffer = deque() # (enqueued_at, record)
+        self._wake = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task = None
+        self._closing = False
+        self._rate = RateWindow()
+
+        self.received = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.batches = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.last_error = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        if self.running:
+            return
+        if self._client is None:
+            import httpx
+            # One kept-alive connection is enough: batches are sent one at a time
+            self._client = httpx.AsyncClient(
+                base_url=self.url,
+                timeout=httpx.Timeout(10.0, connect=5.0),
+                limits=httpx.Limits(max_connections=2, max_keepalive_connections=1)
+            )
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """
+        Sends whatever is buffered, then releases the connection.
+        """
+        if self._task is not None:
+            self._closing = True
+            self._wake.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def send(self, record: dict):
+        """
+        Buffers one log record (a LogEntry-shaped dict), waiting while the
+        buffer is full.
+        """
+        while len(self._buffer) >= self.max_buffer:
+            self._space.clear()
+            await self._space.wait()
+        self._buffer.append((time.monotonic(), record))
+        self.received += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            if len(self._buffer) < self.batch_size and not self._closing:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            if not self._buffer:
+                if self._closing:
+                    return
+                continue
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            self._space.set()
+            await self._post(batch)
+
+    def _delay(self, attempt: int) -> float:
+        delay = min(self.backoff * (2 ** attempt), self.max_backoff)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _post(self, batch: list):
+        parts = [batch]
+        while parts:
+            part = parts.pop(0)
+            rejected = await self._post_part(part)
+            if rejected is None:
+                continue
+            bad = self._rejected_indices(rejected, len(part))
+            if bad:
+                self._drop([entry for i, entry in enumerate(part) if i in bad], rejected)
+                rest = [entry for i, entry in enumerate(part) if i not in bad]
+                if rest:
+                    parts.insert(0, rest)
+            elif len(part) > 1:
+                # No usable detail: split until the bad records are on their own
+                middle = len(part) // 2
+                parts[:0] = [part[:middle], part[middle:]]
+            else:
+                self._drop(part, rejected)
+
+    async def _post_part(self, batch: list):
+        """
+        Sends one batch, retrying transient failures. Returns the response if
+        the API rejected the data itself (4xx other than 429), else None.
+        """
+        records = [record for _, record in batch]
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+                await asyncio.sleep(self._delay(attempt - 1))
+            try:
+                response = await self._client.post("/ingest/logs/batch", json=records)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                continue
+
+            if response.status_code < 300:
+                self._record_sent(batch)
+                return None
+            self.last_error = f"HTTP {response.status_code}"
+            if response.status_code < 500 and response.status_code != 429:
+                # Retrying the same records will not help
+                return response
+
+        self.failed += len(records)
+        logger.error(f"Dropped {len(records)} logs from {self.source} after {attempt + 1} attempts: {self.last_error}")
+        return None
+
+    @staticmethod
+    def _rejected_indices(response, size: int) -> set:
+        """
+        Positions of the records a 422 names: request validation errors
+        (loc ["body", i, ...]) or "... in log i" from the batch endpoint.
+        """
+        if response.status_code != 422:
+            return set()
+        try:
+            detail = response.json().get("detail")
+        except Exception:
+            return set()
+        if isinstance(detail, list):
+            indices = {error["loc"][1] for error in detail
+                       if isinstance(error, dict) and len(error.get("loc", ())) > 1 and error["loc"][0] == "body"}
+        else:
+            indices = {int(i) for i in re.findall(r"in log (\d+)", str(detail))}
+        return {i for i in indices if isinstance(i, int) and 0 <= i < size}
+
+    def _drop(self, batch: list, response):
+        self.failed += len(batch)
+        logger.error(f"Dropped {len(batch)} logs from {self.source} rejected by the API: HTTP {response.status_code}")
+
+    def _record_sent(self, batch: list):
+        now = time.monotonic()
+        lag_ms = (now - batch[0][0]) * 1000
+        self.sent += len(batch)
+        self.batches += 1
+        self.last_lag_ms = lag_ms
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        self._rate.add(len(batch), now)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "source": self.source,
+            "transport": "http",
+            "running": self.running,
+            "received": self.received,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "batches": self.batches,
+            "buffered": len(self._buffer),
+            "lines_per_sec": self._rate.per_second(),
+            # Time from buffering a batch's oldest line to the API accepting it
+            "lag_ms": {"last": round(self.last_lag_ms, 2), "max": round(self.max_lag_ms, 2)},
+            "oldest_buffered_ms": round((now - self._buffer[0][0]) * 1000, 2) if self._buffer else 0.0,
+            "last_error": self.last_error
+        }
+
+# source name -> the forwarder (or local sink) of its latest collection run
+forwarders = {}
+
+def forwarding_stats() -> list:
+    return [forwarder.stats() for forwarder in forwarders.values()]
@@ -0,0 +1,249 @@
+"""
+In-process ring buffer of the most recently ingested logs.
+
+The dashboard polls the newest page of GET /ingest/logs and short-window
+counts constantly; both are answered from here when the buffer provably
+holds every matching row, and from the database otherwise.
+
+Timestamp, id, source, type, threat flag and occurrence count are kept in
+numpy arrays so filters are vectorized; the row payload is kept alongside.
+Everything this process inserts goes through `add`, so it assumes a
+single API process (HOT_WINDOW_MINUTES=0 disables it).
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from models import Log
+
+HOT_WINDOW_MINUTES = float(os.getenv("HOT_WINDOW_MINUTES", "20"))
+HOT_WINDOW_CAPACITY = int(os.getenv("HOT_WINDOW_CAPACITY", "50000"))
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def to_micros(moment: datetime) -> int:
+    moment = moment.astimezone(timezone.utc) if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+class HotWindow:
+    """
+    Fixed-capacity ring in arrival order. Rows leave when they are older
+    (by arrival) than the window or the ring is full.
+
+    `horizon` is the coverage boundary: every stored log with a timestamp
+    after it is in the buffer. It starts at construction time and moves up
+    to the timestamp of each evicted row.
+    """
+
+    def __init__(self, window_seconds=HOT_WINDOW_MINUTES * 60, capacity=HOT_WINDOW_CAPACITY, now: datetime = None,
+                 columns: list = None):
+        self.window_seconds = window_seconds
+        self.capacity = capacity
+        self._lock = threading.Lock()
+
+        self._ts = np.zeros(capacity, dtype=np.int64)        # log timestamp, µs since epoch
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._source = np.zeros(capacity, dtype=np.int32)
+        self._type = np.zeros(capacity, dtype=np.int32)
+        self._threat = np.zeros(capacity, dtype=np.bool_)
+        self._occurrences = np.zeros(capacity, dtype=np.int64)
+        self._arrived = np.zeros(capacity, dtype=np.float64) # monotonic arrival time
+        self._rows = np.empty(capacity, dtype=object)
+
+        self._columns = columns
+        self._codes = {"source": {}, "type": {}}
+        self._names = {"source": [], "type": []}
+        self._head = 0
+        self._size = 0
+        self.horizon = to_micros(now or datetime.now(timezone.utc))
+
+        self.added = 0
+        self.evicted = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0 and self.capacity > 0
+
+    def _code(self, kind: str, value) -> int:
+        codes = self._codes[kind]
+        if value not in codes:
+            codes[value] = len(self._names[kind])
+            self._names[kind].append(value)
+        return codes[value]
+
+    def _evict(self, slot: int):
+        self.horizon = max(self.horizon, int(self._ts[slot]))
+        self._rows[slot] = None
+        self.evicted += 1
+
+    def _trim(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._size:
+            oldest = (self._head - self._size) % self.capacity
+            if self._arrived[oldest] >= cutoff:
+                break
+            self._evict(oldest)
+            self._size -= 1
+
+    def add(self, rows: list, ids: list, now: float = None):
+        """
+        Records freshly committed rows (with their new ids).
+        """
+        if not self.enabled:
+            return
+        now = time.monotonic() if now is None else now
+        received = datetime.now(timezone.utc)
+        if self._columns is None:
+            # The same keys the API serializes for a Log loaded from the database
+            self._columns = [c.name for c in Log.__table__.columns if c.computed is None]
+        with self._lock:
+            for row, log_id in zip(rows, ids):
+                slot = self._head
+                if self._size == self.capacity:
+                    self._evict(slot)
+                else:
+                    self._size += 1
+                record = {column: row.get(column) for column in self._columns}
+                record["id"] = log_id
+                record["received_at"] = record["received_at"] or received
+                record["occurrences"] = record["occurrences"] or 1
+                record["is_threat"] = bool(record["is_threat"])
+                self._rows[slot] = record
+                self._ts[slot] = to_micros(record["timestamp"] or received)
+                self._ids[slot] = log_id
+                self._source[slot] = self._code("source", record["source"])
+                self._type[slot] = self._code("type", record["type"])
+                self._threat[slot] = record["is_threat"]
+                self._occurrences[slot] = record["occurrences"]
+                self._arrived[slot] = now
+                self._head = (slot + 1) % self.capacity
+            self.added += len(ids)
+            self._trim(now)
+
+    def _mask(self, since=None, until=None, source=None, log_type=None, is_threat=None):
+        """
+        Slots in use that match the filters; None if a filter value was
+        never seen (so nothing can match).
+        """
+        if self._size == self.capacity:
+            mask = np.ones(self.capacity, dtype=np.bool_)
+        else:
+            mask = np.zeros(self.capacity, dtype=np.bool_)
+            start = (self._head - self._size) % self.capacity
+            if start + self._size <= self.capacity:
+                mask[start:start + self._size] = True
+            else:
+                mask[start:] = True
+                mask[:self._head] = True
+        if since is not None:
+            mask &= self._ts >= to_micros(since)
+        if until is not None:
+            mask &= self._ts < to_micros(until)
+        for kind, value, column in (("source", source, self._source), ("type", log_type, self._type)):
+            if value is not None:
+                if value not in self._codes[kind]:
+                    return None
+                mask &= column == self._codes[kind][value]
+        if is_threat is not None:
+            mask &= self._threat == bool(is_threat)
+        return mask
+
+    def _covers(self, since) -> bool:
+        return since is not None and to_micros(since) > self.horizon
+
+    def page(self, limit: int, before=None, source=None, log_type=None, is_threat=None, since=None, until=None):
+        """
+        Newest-first rows on (timestamp, id) strictly after the `before`
+        keyset position, or None if the database has to answer: the buffer
+        must hold `limit + 1` matches newer than the horizon, or the range
+        must start after it.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._trim(time.monotonic())
+            mask = self._mask(since, until, source, log_type, is_threat)
+            if mask is None and not self._covers(since):
+                self.misses += 1
+                return None
+            if mask is None:
+                rows = []
+            else:
+                if before is not None:
+                    before_ts = to_micros(before[0])
+                    mask &= (self._ts < before_ts) | ((self._ts == before_ts) & (self._ids < before[1]))
+                covered = np.flatnonzero(mask & (self._ts > self.horizon))
+                if len(covered) <= limit and not self._covers(since):
+                    self.misses += 1
+                    return None
+                order = np.lexsort((self._ids[covered], self._ts[covered]))[::-1][:limit + 1]
+                rows = [dict(self._rows[slot]) for slot in covered[order]]
+            self.hits += 1
+            return rows
+
+    def totals(self, start: datetime, end: datetime) -> dict:
+        """
+        Distinct sources, total and threat counts over [start, end), or None
+        if the range starts at or before the horizon.
+        """
+        if not self.enabled or not self._covers(start):
+            return None
+        with self._lock:
+            self._trim(time.monotonic())
+            if not self._covers(start):
+                self.misses += 1
+                return None
+            mask = self._mask(since=start, until=end)
+            self.hits += 1
+            occurrences = self._occurrences[mask]
+            return {
+                "sources": len(np.unique(self._source[mask])),
+                "total": int(occurrences.sum()),
+                "threats": int(occurrences[self._threat[mask]].sum())
+            }
+
+    def traffic(self, start: datetime, end: datetime) -> list:
+        """
+        Per-minute total vs threat counts (same shape as rollups.traffic),
+        or None if the range starts at or before the horizon.
+        """
+        # Whole minutes, like the rollup buckets
+        start = start.replace(second=0, microsecond=0)
+        if not self.enabled or not self._covers(start):
+            return None
+        with self._lock:
+            self._trim(time.monotonic())
+            if not self._covers(start):
+                self.misses += 1
+                return None
+            mask = self._mask(since=start, until=end)
+            self.hits += 1
+            minutes = self._ts[mask] // 60_000_000
+            occurrences = self._occurrences[mask]
+            threats = np.where(self._threat[mask], occurrences, 0)
+        buckets, inverse = np.unique(minutes, return_inverse=True)
+        totals = np.bincount(inverse, weights=occurrences, minlength=len(buckets))
+        blocked = np.bincount(inverse, weights=threats, minlength=len(buckets))
+        return [
+            {"bucket": EPOCH + timedelta(minutes=int(b)), "total": int(t), "blocked": int(k)}
+            for b, t, k in zip(buckets, totals, blocked)
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "window_seconds": self.window_seconds,
+                "capacity": self.capacity,
+                "rows": self._size,
+                "horizon": EPOCH + timedelta(microseconds=self.horizon),
+                "added": self.added,
+                "evicted": self.evicted,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+hot_window = HotWindow()
@@ -1,24 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from typing import Dict, Any, List
-from sqlalchemy.orm import Session
-from database import get_db
-from models import Log
-from datetime import datetime
-import sys
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Query
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import Dict, Any, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, SessionLocal
+from log_store import insert_logs, page_logs
+from hot_window import hot_window
+from live_tail import broker, SEVERITY
+import rollups
+from search import search_logs
+from log_fields import promote_fields, parse_field_filters
+from ingest_queue import WriteBehindQueue
+from fold import LogFolder, parse_windows
+from ndjson_stream import NDJSONDecoder, DuplexStreamingResponse
+from ai_provider import get_ai_engine
+from datetime import datetime, timedelta, timezone
 import os
-
-# Add parent directory to path to import ai_engine
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
-try:
-    from ai_engine.engine import AIEngine
-    print("Initializing AI Engine...")
-    ai_engine = AIEngine()
-    print("AI Engine initialized.")
-except Exception as e:
-    print(f"Failed to initialize AI Engine: {e}")
-    ai_engine = None
+import json
+import zlib
+import asyncio
 
 router = APIRouter()
 
@@ -29,104 +30,385 @@ class LogEntry(BaseModel):
     message: str
     content: Dict[str, Any] = {}
 
-@router.post("/logs")
-async def ingest_logs(log: LogEntry, db: Session = Depends(get_db)):
-    # Run AI Analysis
-    is_threat = False
-    threat_confidence = None
-    threat_signature = None
-    remediation = None
-    
+MAX_BATCH_SIZE = int(os.getenv("INGEST_MAX_BATCH_SIZE", "5000"))
+
+def _parse_timestamp(value: str) -> datetime:
+    if not value:
+        return datetime.now(timezone.utc)
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # Collectors send naive UTC (utcnow().isoformat())
+    return moment.astimezone(timezone.utc) if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+def _verdict_from_analysis(analysis) -> dict:
+    """
+    Maps a RAG match to the threat columns stored on a Log row.
+    """
+    verdict = {
+        "is_threat": False,
+        "threat_confidence": None,
+        "threat_signature": None,
+        "remediation": None
+    }
+    # Only trust high confidence matches (Tier 2) for ingestion
+    if analysis and analysis['distance'] < 0.4:
+        meta = analysis['metadata']
+        if meta.get('is_threat') == 'True':
+            verdict["is_threat"] = True
+            verdict["threat_confidence"] = "High" # We trust the DB match
+            verdict["threat_signature"] = analysis.get("document")
+            verdict["remediation"] = meta.get("remediation")
+    return verdict
+
+def build_log_row(source: str, message: str, timestamp: str = None, log_type: str = "INFO", content: dict = None) -> dict:
+    """
+    Log column values for one record (raises ValueError on a bad timestamp).
+    Threat columns are filled in by _triage_rows.
+    """
+    return promote_fields({
+        "source": source,
+        "type": log_type,
+        "message": message,
+        "timestamp": _parse_timestamp(timestamp),
+        "raw_content": content or {}
+    })
+
+def _build_log_row(log: LogEntry) -> dict:
+    return build_log_row(log.source, log.message, log.timestamp, log.type, log.content)
+
+async def _triage_rows(rows: list) -> list:
+    """
+    Runs AI triage over a batch of rows and stores the verdict on each row.
+    """
+    analyses = [None] * len(rows)
+    ai_engine = await get_ai_engine() if rows else None
     if ai_engine:
         try:
-            analysis = ai_engine.analyze_log(log.message)
-            # Only trust high confidence matches (Tier 2) for ingestion
-            if analysis and analysis['distance'] < 0.4:
-                meta = analysis['metadata']
-                if meta.get('is_threat') == 'True':
-                    is_threat = True
-                    threat_confidence = "High" # We trust the DB match
-                    threat_signature = analysis.get("document")
-                    remediation = meta.get("remediation")
+            analyses = await ai_engine.analyze_logs([row["message"] for row in rows])
         except Exception as e:
-            print(f"Error during AI analysis: {e}")
-
-    db_log = Log(
-        source=log.source,
-        type=log.type,
-        message=log.message,
-        timestamp=datetime.fromisoformat(log.timestamp.replace("Z", "+00:00")) if log.timestamp else datetime.now(),
-        raw_content=log.content,
-        is_threat=is_threat,
-        threat_confidence=threat_confidence,
-        threat_signature=threat_signature,
-        remediation=remediation
-    )
-    db.add(db_log)
-    db.commit()
-    db.refresh(db_log)
-    return {"status": "received", "id": db_log.id, "is_threat": is_threat}
+            print(f"Error during batch AI analysis: {e}")
+
+    for row, analysis in zip(rows, analyses):
+        row.update(_verdict_from_analysis(analysis))
+    return rows
+
+def _insert_batch(rows: list) -> list:
+    db = SessionLocal()
+    try:
+        return insert_logs(db, rows)
+    finally:
+        db.close()
+
+async def _store_rows(rows: list) -> list:
+    """
+    Bulk insert in a thread, then record the committed rows in the hot
+    window and push them to live-tail subscribers.
+    """
+    ids = await asyncio.to_thread(_insert_batch, rows)
+    for row, log_id in zip(rows, ids):
+        row["id"] = log_id
+    hot_window.add(rows, ids)
+    broker.publish_logs(rows)
+    return ids
+
+async def _write_rows(rows: list):
+    """
+    Triage on the AI pool, then bulk insert in a thread.
+    """
+    await _triage_rows(rows)
+    await _store_rows(rows)
+
+# Repeated lines are held here per source window and written (and triaged)
+# once per folded group; see fold.py.
+log_folder = LogFolder(
+    emit=_write_rows,
+    default_window=float(os.getenv("FOLD_WINDOW_SECONDS", "0")),
+    windows=parse_windows(os.getenv("FOLD_WINDOWS", "")),
+    mode=os.getenv("FOLD_MODE", "template"),
+    max_groups=int(os.getenv("FOLD_MAX_GROUPS", "10000")),
+    retries=int(os.getenv("INGEST_FLUSH_RETRIES", "2"))
+)
+
+STREAM_ACK_EVERY = int(os.getenv("INGEST_STREAM_ACK_EVERY", "1000"))
+
+# Write-behind flush: rows from folded sources join their open group (once,
+# even if the write is retried), everything else is written straight away.
+write_queue = WriteBehindQueue(
+    flush=_write_rows,
+    prepare=log_folder.add,
+    maxsize=int(os.getenv("INGEST_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("INGEST_FLUSH_SIZE", "500")),
+    flush_interval=int(os.getenv("INGEST_FLUSH_INTERVAL_MS", "250")) / 1000,
+    workers=int(os.getenv("INGEST_WORKERS", "2")),
+    retries=int(os.getenv("INGEST_FLUSH_RETRIES", "2"))
+)
+
+@router.post("/logs", status_code=202)
+async def ingest_logs(log: LogEntry, response: Response, wait: bool = False):
+    """
+    Validates and enqueues a log for the write-behind workers (202).
+    With ?wait=true the log is analyzed and committed before responding (200).
+    """
+    try:
+        row = _build_log_row(log)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid timestamp: {e}")
+
+    if wait:
+        await _triage_rows([row])
+        # Same write path as the queue (rollups included), off the event loop
+        ids = await _store_rows([row])
+        response.status_code = 200
+        return {"status": "received", "id": ids[0], "is_threat": row["is_threat"]}
+
+    if not write_queue.submit(row):
+        raise HTTPException(status_code=503, detail="Ingest queue is full, retry later")
+    return {"status": "queued"}
+
+@router.post("/logs/batch")
+async def ingest_logs_batch(logs: List[LogEntry]):
+    """
+    Ingests many logs in one request.
+    AI triage runs once over the whole batch and the rows are written with a
+    single multi-row INSERT, so the per-log cost is a fraction of POST /logs.
+    Repeats within the batch from folded sources are stored as one row; each
+    of their results carries that row's id.
+    """
+    if len(logs) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_SIZE} logs)")
+    if not logs:
+        return {"status": "received", "count": 0, "results": []}
+
+    rows = []
+    for index, log in enumerate(logs):
+        try:
+            rows.append(_build_log_row(log))
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid timestamp in log {index}: {e}")
+
+    folded, index = log_folder.fold_batch(rows)
+    await _triage_rows(folded)
+    ids = await _store_rows(folded)
+    return {
+        "status": "received",
+        "count": len(rows),
+        "results": [{"id": ids[i], "is_threat": folded[i]["is_threat"]} for i in index]
+    }
+
+@router.post("/stream")
+async def ingest_stream(request: Request):
+    """
+    Long-lived ingest over one connection.
+    The body is chunked NDJSON (one LogEntry per line, optionally
+    Content-Encoding: gzip). Records are parsed and enqueued as bytes arrive;
+    the response is NDJSON progress acks every STREAM_ACK_EVERY records plus a
+    final summary line.
+    """
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+
+    async def progress():
+        decoder = NDJSONDecoder(gzipped=gzipped)
+        counts = {"accepted": 0, "rejected": 0}
+        since_ack = 0
+
+        async def enqueue(line: bytes):
+            try:
+                row = _build_log_row(LogEntry.model_validate_json(line))
+            except (ValidationError, ValueError):
+                counts["rejected"] += 1
+                return
+            if await write_queue.put(row):
+                counts["accepted"] += 1
+            else:
+                counts["rejected"] += 1
+
+        error = None
+        try:
+            async for chunk in request.stream():
+                for line in decoder.feed(chunk):
+                    await enqueue(line)
+                    since_ack += 1
+                if since_ack >= STREAM_ACK_EVERY:
+                    since_ack = 0
+                    yield json.dumps({"status": "progress", **counts}) + "\n"
+            for line in decoder.close():
+                await enqueue(line)
+        except ClientDisconnect:
+            print(f"Ingest stream disconnected after {counts['accepted']} records")
+            return
+        except (ValueError, zlib.error) as e:
+            error = str(e)
+
+        summary = {"status": "error" if error else "done", **counts, "bytes": decoder.bytes_in}
+        if error:
+            summary["error"] = error
+        yield json.dumps(summary) + "\n"
+
+    return DuplexStreamingResponse(progress(), media_type="application/x-ndjson")
+
+@router.get("/queue/stats")
+async def get_queue_stats():
+    """
+    Write-behind queue depth, flush latency and drop counters.
+    Queued logs are delivered at most once: a batch that still fails after
+    its retries is counted in `failed` and discarded.
+    """
+    return {**write_queue.stats(), "folding": log_folder.stats(), "hot_window": hot_window.stats()}
+
+TAIL_HEARTBEAT_SECONDS = float(os.getenv("TAIL_HEARTBEAT_SECONDS", "15"))
+TAIL_KINDS = ("log", "notification")
+
+@router.get("/tail")
+async def tail(request: Request, source: List[str] = Query(default=[]), min_severity: str = "DEBUG",
+               threats_only: bool = False, kind: List[str] = Query(default=[])):
+    """
+    Live tail as server-sent events: `log` events for newly committed logs
+    and `notification` events for new threat notifications, filtered by
+    source (repeatable), minimum severity (log type, e.g. WARNING) and
+    threats_only. A client that falls behind loses its oldest events and is
+    told so with a `dropped` event.
+    """
+    if min_severity.upper() not in SEVERITY:
+        raise HTTPException(status_code=422, detail=f"min_severity must be one of {list(SEVERITY)}")
+    if any(k not in TAIL_KINDS for k in kind):
+        raise HTTPException(status_code=422, detail=f"kind must be one of {list(TAIL_KINDS)}")
+    subscription = broker.subscribe(sources=source, min_severity=SEVERITY[min_severity.upper()],
+                                    threats_only=threats_only, kinds=kind)
+    if subscription is None:
+        raise HTTPException(status_code=503, detail="Too many live-tail subscribers, retry later")
+
+    async def events():
+        reported_drops = 0
+        try:
+            yield b"retry: 3000\n\n"
+            while not await request.is_disconnected():
+                frames = await subscription.next_frames(TAIL_HEARTBEAT_SECONDS)
+                if subscription.dropped != reported_drops:
+                    reported_drops = subscription.dropped
+                    frames.insert(0, f"event: dropped\ndata: {{\"dropped\":{reported_drops}}}\n\n".encode())
+                yield b"".join(frames) if frames else b": keep-alive\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/tail/stats")
+async def get_tail_stats():
+    """
+    Live-tail subscribers, published/delivered events and drops.
+    """
+    return broker.stats()
+
+# Default range of the dashboard aggregates (served from log_rollups).
+STATS_WINDOW_HOURS = int(os.getenv("STATS_WINDOW_HOURS", "24"))
+
+MAX_PAGE_SIZE = int(os.getenv("LOGS_MAX_PAGE_SIZE", "1000"))
 
 @router.get("/logs")
-async def get_logs(limit: int = 50, db: Session = Depends(get_db)):
-    return db.query(Log).order_by(Log.timestamp.desc()).limit(limit).all()
+async def get_logs(response: Response, limit: int = 50, cursor: Optional[str] = None, source: Optional[str] = None,
+                   type: Optional[str] = None, is_threat: Optional[bool] = None,
+                   since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   field: List[str] = Query(default=[]), db: AsyncSession = Depends(get_async_db)):
+    """
+    Newest-first page of logs, optionally filtered by source, type, threat
+    flag, time range and raw_content fields (repeatable `field=key:value`,
+    e.g. field=user:alice@company.com&field=action:Login).
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the
+    next page; the header is absent on the last page.
+    """
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=422, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    try:
+        rows, next_cursor = await page_logs(db, limit, cursor=cursor, source=source, log_type=type,
+                                            is_threat=is_threat, since=since, until=until,
+                                            fields=parse_field_filters(field))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+@router.get("/search")
+async def search(q: str, source: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 limit: int = 50, offset: int = 0, sort: str = "rank", db: AsyncSession = Depends(get_async_db)):
+    """
+    Full-text search over log messages: words, "exact phrases" and prefix*
+    terms (all must match), ranked by relevance or newest first (sort=recent).
+    """
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=422, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    if sort not in ("rank", "recent"):
+        raise HTTPException(status_code=422, detail="sort must be 'rank' or 'recent'")
+    try:
+        rows, ranks, next_offset = await search_logs(db, q, source=source, since=since, until=until,
+                                                     limit=limit, offset=max(offset, 0), sort=sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "results": [{"log": row, "rank": rank} for row, rank in zip(rows, ranks)],
+        "next_offset": next_offset
+    }
+
+@router.get("/archive/stats")
+async def get_archive_stats():
+    """
+    Cold-tier segment count, rows, bytes on disk and covered time range.
+    """
+    from archive import log_archive
+    return log_archive.stats()
 
 @router.get("/stats/threats")
-async def get_threat_stats(db: Session = Depends(get_db)):
+async def get_threat_stats(start: Optional[datetime] = None, end: Optional[datetime] = None, hours: int = STATS_WINDOW_HOURS, db: AsyncSession = Depends(get_async_db)):
     """
-    Returns top threat sources based on 'is_threat' flag.
+    Returns top threat sources based on 'is_threat' flag (from hourly rollups).
+    Defaults to the last `hours` when no start is given.
     """
-    from sqlalchemy import func
-    results = db.query(Log.source, func.count(Log.id).label('count'))\
-        .filter(Log.is_threat == True)\
-        .group_by(Log.source)\
-        .order_by(func.count(Log.id).desc())\
-        .limit(5)\
-        .all()
-    
-    return [{"source": r[0], "count": r[1]} for r in results]
+    start, end = rollups.resolve_range(start, end, hours)
+    return await rollups.top_threat_sources(db, start, end)
 
 @router.get("/stats/traffic")
-async def get_traffic_stats(db: Session = Depends(get_db)):
+async def get_traffic_stats(start: Optional[datetime] = None, end: Optional[datetime] = None, hours: int = STATS_WINDOW_HOURS,
+                            granularity: str = "hour", db: AsyncSession = Depends(get_async_db)):
     """
-    Returns traffic volume vs blocked volume by hour.
+    Returns traffic volume vs blocked volume per hour (or minute) bucket.
+    Served from the rollup tables, so cost depends on the range, not on log volume.
     """
-    from sqlalchemy import func, text, case
-    # Postgres specific date truncation
-    results = db.query(
-        func.to_char(Log.timestamp, 'HH24:00').label('hour'),
-        func.count(Log.id).label('total'),
-        func.sum(case((Log.is_threat == True, 1), else_=0)).label('blocked')
-    ).group_by(func.to_char(Log.timestamp, 'HH24:00'))\
-     .order_by(func.to_char(Log.timestamp, 'HH24:00'))\
-     .all()
+    if granularity not in rollups.GRANULARITIES:
+        raise HTTPException(status_code=422, detail=f"granularity must be one of {list(rollups.GRANULARITIES)}")
+    start, end = rollups.resolve_range(start, end, hours)
+    label = "%H:00" if granularity == "hour" else "%H:%M"
+    buckets = hot_window.traffic(start, end) if granularity == "minute" else None
+    if buckets is None:
+        buckets = await rollups.traffic(db, start, end, granularity)
+    return [
+        {"time": r["bucket"].strftime(label), "bucket": r["bucket"], "inbound": r["total"], "blocked": r["blocked"]}
+        for r in buckets
+    ]
 
-    return [{"time": r[0], "inbound": r[1], "blocked": r[2] or 0} for r in results]
+HEALTH_WINDOW_MINUTES = int(os.getenv("HEALTH_WINDOW_MINUTES", "15"))
 
 @router.get("/stats/summary")
-async def get_summary_stats(db: Session = Depends(get_db)):
+async def get_summary_stats(start: Optional[datetime] = None, end: Optional[datetime] = None, hours: int = STATS_WINDOW_HOURS, db: AsyncSession = Depends(get_async_db)):
     """
-    Returns summary stats for the dashboard.
+    Returns summary stats for the dashboard (from rollups).
     """
-    from sqlalchemy import func
-    
-    # Active Collectors (from config + logs)
-    # real_sources = db.query(models.LogSource).count() 
-    # Or just distinct sources in logs if no config
-    cols = db.query(func.count(func.distinct(Log.source))).scalar()
-    
-    # Blocked Threats (total)
-    blocked = db.query(func.count(Log.id)).filter(Log.is_threat == True).scalar()
-    
-    # Health Calculation (Based on last 100 logs to be responsive)
+    start, end = rollups.resolve_range(start, end, hours)
+    window = await rollups.totals(db, start, end)
+
+    # Active Collectors (distinct sources seen in range)
+    cols = window["sources"]
+
+    # Blocked Threats (in range)
+    blocked = window["threats"]
+
+    # Health Calculation (based on the last few minutes to be responsive)
     # If recent logs are mostly threats, health drops.
-    recent_total = db.query(Log).order_by(Log.timestamp.desc()).limit(100).count()
-    recent_threats = db.query(Log).filter(Log.is_threat == True).order_by(Log.timestamp.desc()).limit(100).count()
-    
+    recent_start = end - timedelta(minutes=HEALTH_WINDOW_MINUTES)
+    recent = hot_window.totals(recent_start, end) or await rollups.totals(db, recent_start, end, granularity="minute")
+
     health = 100
-    if recent_total > 0:
-        threat_ratio = recent_threats / recent_total
-        # Penalize heavily: 10% threats = 50% health? No, let's say 100 - (ratio * 100)
+    if recent["total"] > 0:
+        threat_ratio = recent["threats"] / recent["total"]
         health = int(100 - (threat_ratio * 100))
     
     # Latency (Mocking real variance for "AI Processing Time")
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("ingest-queue")
+
+async def flush_with_retries(flush, rows: list, retries: int, retry_delay: float, on_retry=None):
+    """
+    Awaits flush(rows), retrying up to `retries` more times with a doubling
+    delay (on_retry() is called before each retry). The last error is raised.
+    """
+    for attempt in range(retries + 1):
+        try:
+            await flush(rows)
+            return
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = retry_delay * (2 ** attempt)
+            if on_retry:
+                on_retry()
+            logger.warning(f"Flush of {len(rows)} logs failed ({e}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+class WriteBehindQueue:
+    """
+    In-process write-behind buffer for ingested logs.
+    Producers enqueue without waiting on the database; background workers
+    drain the queue and hand size- or time-bounded batches to `flush`.
+
+    A batch whose flush raises is retried up to `retries` more times with
+    a doubling delay. Items already acknowledged to the producer are
+    delivered at most once: a batch that still fails is logged, counted in
+    `failed` and discarded.
+    """
+
+    def __init__(self, flush, maxsize=10000, batch_size=500, flush_interval=0.25, workers=2,
+                 prepare=None, retries=2, retry_delay=0.5):
+        # flush(batch) is a coroutine function; blocking work inside it must
+        # be pushed off the event loop by the caller. It must be safe to call
+        # again with the same batch after it raised.
+        self.flush = flush
+        # prepare(batch) -> batch runs once per batch before flush (not retried)
+        self.prepare = prepare
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.worker_count = workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+        self._queue = None
+        self._workers = []
+        self._closing = False
+
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retried = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._closing = False
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self.worker_count)]
+        logger.info(f"Write-behind queue started ({self.worker_count} workers, batch {self.batch_size}, max depth {self.maxsize})")
+
+    async def stop(self):
+        """
+        Stops accepting work and waits for the workers to drain the queue.
+        """
+        if not self.running:
+            return
+        self._closing = True
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info(f"Write-behind queue stopped (flushed={self.flushed}, dropped={self.dropped}, failed={self.failed})")
+
+    def submit(self, item) -> bool:
+        """
+        Enqueues one item. Returns False (and counts a drop) if the queue is
+        full or not running.
+        """
+        if not self.running or self._closing:
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    async def put(self, item) -> bool:
+        """
+        Enqueues one item, waiting for space instead of dropping it.
+        Used by streaming producers so a full queue throttles the sender.
+        """
+        if not self.running or self._closing:
+            self.dropped += 1
+            return False
+        await self._queue.put(item)
+        self.enqueued += 1
+        return True
+
+    async def _next_batch(self) -> list:
+        try:
+            first = await asyncio.wait_for(self._queue.get(), timeout=self.flush_interval)
+        except asyncio.TimeoutError:
+            return []
+
+        batch = [first]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self._closing:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            if not batch:
+                if self._closing and self._queue.empty():
+                    return
+                continue
+
+            start = time.perf_counter()
+            try:
+                await self._flush_with_retries(batch)
+                self.flushed += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"Failed to flush {len(batch)} logs, discarding them: {e}")
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                self.batches += 1
+                self.last_flush_ms = elapsed_ms
+                self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+                self._total_flush_ms += elapsed_ms
+
+    async def _flush_with_retries(self, batch: list):
+        ready = self.prepare(batch) if self.prepare else batch
+        if not ready:
+            return
+        await flush_with_retries(self.flush, ready, self.retries, self.retry_delay, on_retry=self._count_retry)
+
+    def _count_retry(self):
+        self.retried += 1
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "depth": self._queue.qsize() if self._queue else 0,
+            "max_depth": self.maxsize,
+            "workers": self.worker_count,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "retried": self.retried,
+            "batches": self.batches,
+            "flush_latency_ms": {
+                "last": round(self.last_flush_ms, 2),
+                "avg": round(self._total_flush_ms / self.batches, 2) if self.batches else 0.0,
+                "max": round(self.max_flush_ms, 2)
+            }
+        }
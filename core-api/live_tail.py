@@ -0,0 +1,157 @@
+"""
+In-process pub/sub for live tailing of new logs and notifications.
+
+Each published event is serialized once into an SSE frame; every matching
+subscriber queues a reference to the same bytes. Subscriber queues are
+bounded and drop their oldest events when a client falls behind, so a slow
+consumer never holds up ingest or grows memory.
+"""
+import asyncio
+import json
+import os
+from collections import deque
+from datetime import datetime, date
+
+TAIL_QUEUE_SIZE = int(os.getenv("TAIL_QUEUE_SIZE", "1000"))
+TAIL_MAX_SUBSCRIBERS = int(os.getenv("TAIL_MAX_SUBSCRIBERS", "100"))
+
+# Log.type / Notification.type -> rank; unknown types rank as INFO
+SEVERITY = {
+    "DEBUG": 0,
+    "INFO": 1, "LOW": 1,
+    "NOTICE": 2, "MEDIUM": 2,
+    "WARNING": 3, "WARN": 3,
+    "ERROR": 4, "HIGH": 4,
+    "CRITICAL": 5, "ALERT": 5, "EMERGENCY": 5
+}
+
+def severity_rank(value) -> int:
+    return SEVERITY.get(str(value or "").upper(), SEVERITY["INFO"])
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+class Event:
+    __slots__ = ("kind", "source", "severity", "is_threat", "frame")
+
+    def __init__(self, kind: str, payload: dict, source=None, severity=None, is_threat=False):
+        self.kind = kind
+        self.source = source
+        self.severity = severity_rank(severity)
+        self.is_threat = bool(is_threat)
+        data = json.dumps(payload, default=_json_default, separators=(",", ":"))
+        self.frame = f"event: {kind}\ndata: {data}\n\n".encode()
+
+class Subscription:
+    """
+    One client's filters and bounded event queue (oldest dropped first).
+    """
+
+    def __init__(self, sources=None, min_severity=0, threats_only=False, kinds=None, maxlen=TAIL_QUEUE_SIZE):
+        self.sources = set(sources) if sources else None
+        self.min_severity = min_severity
+        self.threats_only = threats_only
+        self.kinds = set(kinds) if kinds else None
+        self._events = deque(maxlen=maxlen)
+        self._ready = asyncio.Event()
+        self.delivered = 0
+        self.dropped = 0
+
+    def matches(self, event: Event) -> bool:
+        if self.kinds is not None and event.kind not in self.kinds:
+            return False
+        if event.kind == "notification":
+            # Notifications are threat alerts and carry no source
+            return event.severity >= self.min_severity
+        if self.sources is not None and event.source not in self.sources:
+            return False
+        if self.threats_only and not event.is_threat:
+            return False
+        return event.severity >= self.min_severity
+
+    def push(self, event: Event):
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(event)
+        self._ready.set()
+
+    async def next_frames(self, timeout: float) -> list:
+        """
+        Waits up to `timeout` seconds and returns every queued frame
+        (empty on timeout).
+        """
+        if not self._events:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return []
+        frames = [event.frame for event in self._events]
+        self._events.clear()
+        self.delivered += len(frames)
+        return frames
+
+class LiveTailBroker:
+    def __init__(self, max_subscribers=TAIL_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self.published = 0
+        self.rejected = 0
+        # Totals of subscribers that have gone away
+        self._delivered = 0
+        self._dropped = 0
+
+    def subscribe(self, **filters) -> Subscription:
+        """
+        Registers a subscriber; returns None when the subscriber limit is reached.
+        """
+        if len(self._subscribers) >= self.max_subscribers:
+            self.rejected += 1
+            return None
+        subscription = Subscription(**filters)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self._subscribers:
+            self._subscribers.discard(subscription)
+            self._delivered += subscription.delivered
+            self._dropped += subscription.dropped
+
+    def publish(self, event: Event):
+        self.published += 1
+        for subscription in self._subscribers:
+            if subscription.matches(event):
+                subscription.push(event)
+
+    def publish_logs(self, rows: list):
+        """
+        Publishes committed log rows (must be called on the event loop).
+        Nothing is serialized while nobody is listening.
+        """
+        if not self._subscribers:
+            return
+        for row in rows:
+            self.publish(Event("log", row, source=row.get("source"), severity=row.get("type"),
+                               is_threat=row.get("is_threat")))
+
+    def publish_notification(self, payload: dict):
+        if not self._subscribers:
+            return
+        self.publish(Event("notification", payload, severity=payload.get("type"), is_threat=True))
+
+    def stats(self) -> dict:
+        subscribers = list(self._subscribers)
+        return {
+            "subscribers": len(subscribers),
+            "max_subscribers": self.max_subscribers,
+            "published": self.published,
+            "rejected": self.rejected,
+            "delivered": self._delivered + sum(s.delivered for s in subscribers),
+            "dropped": self._dropped + sum(s.dropped for s in subscribers),
+            "queued": sum(len(s._events) for s in subscribers)
+        }
+
+broker = LiveTailBroker()
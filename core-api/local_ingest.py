@@ -0,0 +1,91 @@
+"""
+In-process handoff from collectors to the ingest pipeline.
+
+Collectors started from /config/sources/{id}/start run inside core-api, so
+their records go straight onto the write-behind queue (the same path as
+POST /ingest/logs) instead of being serialized and sent back to this
+process over HTTP. Set INGEST_URL to forward them over HTTP instead, e.g.
+when ingest runs on another host.
+"""
+import time
+from forwarder import BatchForwarder, RateWindow, INGEST_URL
+from ingest import build_log_row, write_queue
+
+class LocalIngestSink:
+    """
+    Same interface and stats shape as BatchForwarder.
+    """
+
+    def __init__(self, source: str, queue=None):
+        self.source = source
+        self.queue = queue or write_queue
+        self._running = False
+        self._rate = RateWindow()
+
+        self.received = 0
+        self.sent = 0
+        self.failed = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.last_error = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    async def start(self):
+        self._running = True
+
+    async def close(self):
+        self._running = False
+
+    async def send(self, record: dict):
+        """
+        Enqueues one log record, waiting while the ingest queue is full.
+        """
+        self.received += 1
+        try:
+            row = build_log_row(record["source"], record["message"], record.get("timestamp"),
+                                record.get("type", "INFO"), record.get("content"))
+        except (KeyError, ValueError) as e:
+            self.failed += 1
+            self.last_error = f"Invalid record: {e}"
+            return
+
+        start = time.monotonic()
+        if not await self.queue.put(row):
+            self.failed += 1
+            self.last_error = "Ingest queue is not running"
+            return
+        now = time.monotonic()
+        # Time spent waiting for queue space
+        self.last_lag_ms = (now - start) * 1000
+        self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+        self.sent += 1
+        self._rate.add(1, now)
+
+    def stats(self) -> dict:
+        return {
+            "source": self.source,
+            "transport": "local",
+            "running": self.running,
+            "received": self.received,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": 0,
+            "batches": 0,
+            "buffered": 0,
+            "lines_per_sec": self._rate.per_second(),
+            "lag_ms": {"last": round(self.last_lag_ms, 2), "max": round(self.max_lag_ms, 2)},
+            "oldest_buffered_ms": 0.0,
+            "last_error": self.last_error
+        }
+
+def collector_sink(source: str):
+    """
+    The sink a collector should push records into: in-process unless
+    INGEST_URL points elsewhere.
+    """
+    if INGEST_URL:
+        return BatchForwarder(source)
+    return LocalIngestSink(source)
@@ -0,0 +1,99 @@
+"""
+Structured fields from Log.raw_content.
+
+The keys collectors send most often are copied into real, indexed columns
+at ingest; any other key is filtered through the JSONB GIN index on
+Postgres (containment) or json_extract on SQLite.
+"""
+import json
+from sqlalchemy import func, inspect, or_, text
+from models import Log
+
+# raw_content key -> Log column
+PROMOTED_FIELDS = {
+    "user": "user_name",
+    "ip": "ip_address",
+    "action": "action",
+    "location": "location",
+    "event_id": "event_id"
+}
+
+MAX_FIELD_LENGTH = 255
+
+def promote_fields(row: dict) -> dict:
+    """
+    Copies promoted raw_content keys onto the row's columns (in place).
+    """
+    content = row.get("raw_content")
+    if not isinstance(content, dict):
+        return row
+    for key, column in PROMOTED_FIELDS.items():
+        value = content.get(key)
+        if value is not None and not isinstance(value, (dict, list)):
+            row[column] = str(value)[:MAX_FIELD_LENGTH]
+    return row
+
+def parse_field_filters(values: list) -> dict:
+    """
+    Parses `key:value` query parameters (raises ValueError if malformed).
+    """
+    filters = {}
+    for item in values or []:
+        key, sep, value = item.partition(":")
+        if not sep or not key:
+            raise ValueError(f"Invalid field filter '{item}', expected key:value")
+        filters[key] = value
+    return filters
+
+def _scalar_variants(value: str) -> list:
+    # Query strings are text but JSON may hold numbers/booleans ("port": 22)
+    variants = [value]
+    try:
+        parsed = json.loads(value)
+        if isinstance(parsed, (int, float, bool)):
+            variants.append(parsed)
+    except ValueError:
+        pass
+    return variants
+
+def field_condition(key: str, value: str, dialect_name: str):
+    if key in PROMOTED_FIELDS:
+        return getattr(Log, PROMOTED_FIELDS[key]) == value
+    if dialect_name == "postgresql":
+        return or_(*[Log.raw_content.contains({key: v}) for v in _scalar_variants(value)])
+    return or_(*[func.json_extract(Log.raw_content, f'$."{key}"') == v for v in _scalar_variants(value)])
+
+def apply_field_filters(stmt, filters: dict, dialect_name: str):
+    for key, value in filters.items():
+        stmt = stmt.where(field_condition(key, value, dialect_name))
+    return stmt
+
+def ensure_field_columns(engine):
+    """
+    Brings an existing logs table up to date: raw_content as JSONB
+    (Postgres) and the promoted columns, backfilled from raw_content.
+    Indexes are created by log_store.ensure_log_indexes.
+    """
+    with engine.begin() as conn:
+        columns = {c["name"]: c for c in inspect(conn).get_columns("logs")}
+        postgres = engine.dialect.name == "postgresql"
+
+        if postgres and columns["raw_content"]["type"].__class__.__name__ == "JSON":
+            print("Converting logs.raw_content to JSONB...")
+            conn.execute(text("ALTER TABLE logs ALTER COLUMN raw_content TYPE jsonb USING raw_content::jsonb"))
+
+        for key, column in PROMOTED_FIELDS.items():
+            if column in columns:
+                continue
+            print(f"Adding promoted column logs.{column}...")
+            conn.execute(text(f"ALTER TABLE logs ADD COLUMN {column} VARCHAR"))
+            if postgres:
+                conn.execute(text(
+                    f"UPDATE logs SET {column} = left(raw_content->>'{key}', {MAX_FIELD_LENGTH}) "
+                    f"WHERE raw_content ? '{key}' AND jsonb_typeof(raw_content->'{key}') NOT IN ('object', 'array', 'null')"
+                ))
+            else:
+                conn.execute(text(
+                    f"UPDATE logs SET {column} = substr(json_extract(raw_content, '$.{key}'), 1, {MAX_FIELD_LENGTH}) "
+                    f"WHERE json_type(raw_content, '$.{key}') NOT IN ('object', 'array', 'null')"
+                ))
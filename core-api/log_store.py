@@ -0,0 +1,123 @@
+import asyncio
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models import Log
+from rollups import apply_rollups
+from log_fields import apply_field_filters
+from archive import log_archive, row_key
+from hot_window import hot_window
+
+# Log has ~20 bound columns per row (raw fields are promoted to columns);
+# 3000 rows keeps a single INSERT well under Postgres' 65535 bind-parameter limit.
+MAX_ROWS_PER_INSERT = 3000
+
+def insert_logs(db: Session, rows: list) -> list:
+    """
+    Writes many log rows with multi-row INSERT ... RETURNING statements
+    (one per MAX_ROWS_PER_INSERT rows) and a single commit, together with
+    the matching log_rollups increments.
+    Returns the new ids in the same order as `rows`.
+    """
+    if not rows:
+        return []
+
+    stmt = insert(Log).returning(Log.id, sort_by_parameter_order=True)
+    result = db.execute(
+        stmt,
+        rows,
+        execution_options={"insertmanyvalues_page_size": MAX_ROWS_PER_INSERT}
+    )
+    ids = [row[0] for row in result]
+    apply_rollups(db, rows)
+    db.commit()
+    return ids
+
+def encode_cursor(timestamp: datetime, log_id: int) -> str:
+    raw = json.dumps([timestamp.isoformat(), log_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """
+    Returns (timestamp, id) from an opaque cursor (raises ValueError if malformed).
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, log_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+async def page_logs(db: AsyncSession, limit: int, cursor: str = None, source: str = None, log_type: str = None,
+              is_threat: bool = None, since: datetime = None, until: datetime = None, fields: dict = None):
+    """
+    Keyset pagination over logs, newest first, on (timestamp, id).
+    Each page is an index range scan starting right after the cursor, so its
+    cost does not depend on how deep the caller has paged. Pages reaching
+    back into archived days are merged with rows read from the archive.
+    Recent pages are served from the in-memory hot window when it holds
+    every matching row.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    rows = None if fields else hot_window.page(limit, before=position, source=source, log_type=log_type,
+                                               is_threat=is_threat, since=since, until=until)
+    if rows is not None:
+        return _page(rows, limit)
+
+    stmt = select(Log)
+    if source is not None:
+        stmt = stmt.where(Log.source == source)
+    if log_type is not None:
+        stmt = stmt.where(Log.type == log_type)
+    if is_threat is not None:
+        stmt = stmt.where(Log.is_threat == is_threat)
+    if since is not None:
+        stmt = stmt.where(Log.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(Log.timestamp < until)
+    if fields:
+        stmt = apply_field_filters(stmt, fields, db.bind.dialect.name)
+    if position:
+        stmt = stmt.where(tuple_(Log.timestamp, Log.id) < tuple_(*position))
+
+    stmt = stmt.order_by(Log.timestamp.desc(), Log.id.desc()).limit(limit + 1)
+    rows = list((await db.execute(stmt)).scalars().all())
+
+    if _archive_may_hold(rows, limit, since):
+        archived = await asyncio.to_thread(
+            log_archive.query, limit + 1, before=position, source=source, log_type=log_type,
+            is_threat=is_threat, since=since, until=until, fields=fields
+        )
+        rows = sorted(rows + archived, key=row_key, reverse=True)[:limit + 1]
+    return _page(rows, limit)
+
+def _page(rows: list, limit: int):
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*row_key(rows[-1]))
+
+def _archive_may_hold(rows: list, limit: int, since: datetime = None) -> bool:
+    """
+    True when archived rows could belong on this page: the archive reaches
+    the requested range and the database page does not already end with
+    rows newer than anything archived.
+    """
+    newest = log_archive.newest
+    if newest is None:
+        return False
+    if since is not None and row_key({"timestamp": since, "id": 0})[0] > newest:
+        return False
+    return len(rows) <= limit or row_key(rows[limit])[0] <= newest
+
+def ensure_log_indexes(engine):
+    """
+    create_all() skips tables that already exist; this adds indexes that
+    were introduced after the logs table was first created.
+    """
+    for index in Log.__table__.indexes:
+        index.create(engine, checkfirst=True)
@@ -0,0 +1,358 @@
+"""
+Resumable tailing of a remote file for SSHCollector.
+
+Each LogSource remembers the inode and byte offset of the last line it
+ingested (file_inode / file_offset, next to last_collected_at). On
+(re)connect the collector stats the file and its rotated `.1` copy and
+resumes with one remote pipeline:
+
+    tail -c +<offset+1> -- syslog.1 | head -c <rest> && exec tail -c +<offset+1> -f -- syslog
+
+The catch-up part streams as fast as SSH allows and is read in large
+binary chunks. The follow part keeps a known inode, so a later rotation
+(or truncation) is detected by re-statting and ends the run, and the next
+run resumes from the rotated copy.
+
+A source's include/exclude patterns are pushed down to the remote host:
+each part of the pipeline is piped through awk, so only matching lines
+(plus the offsets needed to resume) cross the SSH connection.
+"""
+import re
+import shlex
+import warnings
+from datetime import datetime
+from sqlalchemy import inspect, text
+
+READ_CHUNK_BYTES = 256 * 1024
+
+def stat_command(path: str) -> str:
+    """
+    Prints "<inode> <size>" (or "- -") for the file and its rotated copy.
+    """
+    quoted = " ".join(shlex.quote(p) for p in (path, rotated_path(path)))
+    return f"for f in {quoted}; do stat -L -c '%i %s' -- \"$f\" 2>/dev/null || echo '- -'; done"
+
+def rotated_path(path: str) -> str:
+    return path + ".1"
+
+def parse_stat(output: str) -> list:
+    """
+    [(inode, size) or None, ...] for each line of stat_command output.
+    """
+    result = []
+    for line in output.strip().splitlines():
+        inode, _, size = line.strip().partition(" ")
+        result.append((inode, int(size)) if inode.isdigit() and size.strip().isdigit() else None)
+    return result
+
+def plan_resume(saved_inode, saved_offset, current, rotated) -> dict:
+    """
+    Where to start reading, given the saved position and the (inode, size)
+    of the file and its rotated copy (None if missing).
+
+    Returns {"inode", "offset"} for the live file plus "catchup":
+    (offset, size) of the rotated copy still to read, or None.
+    """
+    if current is None:
+        raise FileNotFoundError("Log file not found on the remote host")
+    inode, size = current
+    if saved_inode is None:
+        # First run: only new lines, like `tail -f`
+        return {"inode": inode, "offset": size, "catchup": None}
+    saved_offset = saved_offset or 0
+    if saved_inode == inode:
+        # Truncated in place (copytruncate) if the file is now shorter
+        return {"inode": inode, "offset": saved_offset if saved_offset <= size else 0, "catchup": None}
+    if rotated is not None and rotated[0] == saved_inode:
+        rotated_size = rotated[1]
+        start = min(saved_offset, rotated_size)
+        catchup = (start, rotated_size) if start < rotated_size else None
+        return {"inode": inode, "offset": 0, "catchup": catchup}
+    # Rotated further than .1 (or renamed): the live file is new since then
+    return {"inode": inode, "offset": 0, "catchup": None}
+
+# Filtered lines are sent as "<tag><offset>\t<line>", where tag is R (rotated
+# copy) or L (live file) and offset is the raw byte offset just past the line.
+# A bare "<tag><offset>\t" reports progress through filtered-out lines.
+AWK_FILTER = (
+    'BEGIN { o = start; n = start; inc = ENVIRON["LW_INCLUDE"]; exc = ENVIRON["LW_EXCLUDE"]; '
+    # Match once up front so a pattern this awk cannot compile fails before any output
+    'probe = ("" ~ inc) + ("" ~ exc) } '
+    '{ o += length($0) + 1; '
+    'if ((inc == "" || $0 ~ inc) && (exc == "" || $0 !~ exc)) { print tag o "\t" $0; n = o; fflush() } '
+    'else if (o - n >= every) { print tag o "\t"; n = o; fflush() } } '
+    'END { print tag o "\t"; fflush() }'
+)
+
+# Filtered-out bytes between progress reports
+FILTER_PROGRESS_BYTES = 64 * 1024
+
+def parse_patterns(value) -> list:
+    """
+    Patterns are stored one per line (POSIX extended regular expressions).
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.splitlines()
+    return [p for p in (v.strip() for v in value) if p]
+
+class FilterError(ValueError):
+    """
+    The source's patterns cannot be used as a remote filter; retrying will not help.
+    """
+
+# Escapes that Python's re accepts but POSIX ERE does not have (awk reads
+# "\d" as a literal "d")
+_NON_ERE_ESCAPES = set("dDwWsSbBAZzG0123456789")
+
+def _non_ere(pattern: str):
+    """
+    The first construct in `pattern` that is not POSIX ERE, or None.
+    """
+    i = 0
+    while i < len(pattern):
+        c, following = pattern[i], pattern[i + 1:i + 2]
+        if c == "\\":
+            if following in _NON_ERE_ESCAPES:
+                return c + following
+            i += 2
+            continue
+        if c == "[":
+            # Skip the bracket expression; "]" right after "[" or "[^" is literal
+            j = i + 1
+            if pattern[j:j + 1] == "^":
+                j += 1
+            if pattern[j:j + 1] == "]":
+                j += 1
+            while j < len(pattern) and pattern[j] != "]":
+                if pattern[j:j + 2] in ("[:", "[.", "[="):
+                    close = pattern.find(pattern[j + 1] + "]", j + 2)
+                    j = close + 1 if close != -1 else j
+                j += 1
+            i = j + 1
+            continue
+        if c == "(" and following == "?":
+            return "(?"
+        if c in "*+?}" and following in ("?", "+"):
+            # Lazy (*?) and possessive (*+) quantifiers
+            return c + following
+        i += 1
+    return None
+
+def validate_patterns(patterns: list):
+    """
+    Raises FilterError for a pattern that cannot be used as a filter. The
+    patterns run as POSIX ERE in the remote awk, so Python-only syntax
+    (inline flags, \\d, lazy quantifiers, lookarounds) is rejected here.
+    """
+    for pattern in patterns:
+        if "\n" in pattern or "\0" in pattern:
+            raise FilterError(f"Pattern must be a single line: {pattern!r}")
+        construct = _non_ere(pattern)
+        if construct:
+            raise FilterError(f"Invalid pattern {pattern!r}: {construct!r} is not POSIX extended regex syntax")
+        try:
+            with warnings.catch_warnings():
+                # POSIX classes like [[:digit:]] look like nested sets to re
+                warnings.simplefilter("ignore", FutureWarning)
+                re.compile(pattern)
+        except re.error as e:
+            raise FilterError(f"Invalid pattern {pattern!r}: {e}")
+
+def _alternation(patterns: list) -> str:
+    return "|".join(f"({p})" for p in patterns)
+
+def _filter(tag: str, start: int, include: list, exclude: list) -> str:
+    # Patterns travel through the environment so awk never parses them as code;
+    # LC_ALL=C makes length() count bytes
+    return (f"LW_INCLUDE={shlex.quote(_alternation(include))} LW_EXCLUDE={shlex.quote(_alternation(exclude))} "
+            f"LC_ALL=C awk -v tag={tag} -v start={start} -v every={FILTER_PROGRESS_BYTES} {shlex.quote(AWK_FILTER)}")
+
+def tail_command(path: str, plan: dict, include: list = None, exclude: list = None) -> str:
+    filtered = bool(include or exclude)
+    follow = f"tail -c +{plan['offset'] + 1} -f -- {shlex.quote(path)}"
+    follow = f"{follow} | {_filter('L', plan['offset'], include, exclude)}" if filtered else f"exec {follow}"
+    if not plan["catchup"]:
+        return follow
+    start, size = plan["catchup"]
+    # head -c pins the catch-up to the bytes counted in the plan
+    catchup = f"tail -c +{start + 1} -- {shlex.quote(rotated_path(path))} | head -c {size - start}"
+    if filtered:
+        catchup = f"{catchup} | {_filter('R', start, include, exclude)}"
+    return f"{catchup} && {follow}"
+
+class TailPosition:
+    """
+    Splits the remote stream into lines and tracks the (inode, offset) just
+    past the last line ingested, moving from the rotated copy to the live
+    file once the catch-up is consumed. With `filtered` the stream is the awk
+    filter's output and offsets come from its line prefixes.
+
+    feed() only moves the read cursor; `inode`/`offset` advance when the
+    caller commit()s an entry after handing its line on, so a position saved
+    mid-chunk never skips lines that were read but not yet ingested.
+    `scanned` counts the raw file bytes covered so far.
+    """
+
+    def __init__(self, plan: dict, rotated_inode: str = None, filtered: bool = False):
+        self.filtered = filtered
+        self.scanned = 0
+        self._pending = b""
+        self._live = (plan["inode"], plan["offset"])
+        if plan["catchup"]:
+            start, self._catchup_end = plan["catchup"]
+            self._inode, self._offset = rotated_inode, start
+            self._catchup_left = self._catchup_end - start
+        else:
+            self._inode, self._offset = self._live
+            self._catchup_end = self._catchup_left = 0
+        self.inode, self.offset = self._inode, self._offset
+
+    @property
+    def catching_up(self) -> bool:
+        return self._catchup_left > 0
+
+    def commit(self, inode: str, offset: int):
+        self.inode, self.offset = inode, offset
+
+    def _to_live(self, entries: list):
+        self._catchup_left = 0
+        self._inode, self._offset = self._live
+        self._emit(entries, None)
+
+    def _advance(self, offset: int):
+        if offset > self._offset:
+            self.scanned += offset - self._offset
+            self._offset = offset
+
+    def _emit(self, entries: list, line):
+        # A progress-only entry is superseded by whatever position follows it
+        entry = (line or None, self._inode, self._offset)
+        if entries and entries[-1][0] is None:
+            entries[-1] = entry
+        else:
+            entries.append(entry)
+
+    def feed(self, chunk: bytes) -> list:
+        """
+        Returns (line, inode, offset) for the complete lines in `chunk`, where
+        (inode, offset) is the position just past the line. `line` is decoded
+        and stripped; it is None for entries that only report progress
+        (blank or filtered-out lines), which are still to be committed.
+        """
+        entries = []
+        if self.filtered:
+            self._feed_filtered(chunk, entries)
+            return entries
+        while chunk:
+            if self._catchup_left:
+                # Never join the rotated file's last partial line to the live file
+                part, chunk = chunk[:self._catchup_left], chunk[self._catchup_left:]
+                self._catchup_left -= len(part)
+                self._split(part, entries, final=not self._catchup_left)
+                if not self._catchup_left:
+                    self._to_live(entries)
+            else:
+                self._split(chunk, entries)
+                chunk = b""
+        return entries
+
+    def _split(self, data: bytes, entries: list, final: bool = False):
+        data = self._pending + data
+        if final:
+            # End of the rotated copy: a last line without a newline is still a line
+            consumed, self._pending = data, b""
+        else:
+            cut = data.rfind(b"\n") + 1
+            consumed, self._pending = data[:cut], data[cut:]
+        if not consumed:
+            return
+        raw_lines = consumed.split(b"\n")
+        for i, raw in enumerate(raw_lines):
+            length = len(raw) + (i < len(raw_lines) - 1)
+            if length:
+                self._advance(self._offset + length)
+                self._emit(entries, self._decode(raw))
+
+    def _feed_filtered(self, chunk: bytes, entries: list):
+        data = self._pending + chunk
+        cut = data.rfind(b"\n") + 1
+        complete, self._pending = data[:cut], data[cut:]
+        for record in complete.split(b"\n"):
+            prefix, sep, message = record.partition(b"\t")
+            if not sep or prefix[:1] not in (b"R", b"L") or not prefix[1:].isdigit():
+                continue
+            offset = int(prefix[1:])
+            if prefix[:1] == b"R":
+                if not self.catching_up:
+                    continue
+                # awk counts a newline after the copy's last line even if it has none
+                self._advance(min(offset, self._catchup_end))
+                self._emit(entries, self._decode(message))
+                if offset >= self._catchup_end:
+                    self._to_live(entries)
+            else:
+                if self.catching_up:
+                    self._to_live(entries)
+                self._advance(offset)
+                self._emit(entries, self._decode(message))
+
+    @staticmethod
+    def _decode(raw: bytes) -> str:
+        return raw.decode("utf-8", errors="replace").strip()
+
+class TransferStats:
+    """
+    Raw bytes covered on the remote host vs bytes actually received, per
+    source: the bandwidth the remote filter saved.
+    """
+
+    def __init__(self):
+        self.sources = {}
+
+    def add(self, source: str, scanned: int, received: int, lines: int):
+        entry = self.sources.setdefault(source, {"bytes_scanned": 0, "bytes_received": 0, "lines": 0})
+        entry["bytes_scanned"] += scanned
+        entry["bytes_received"] += received
+        entry["lines"] += lines
+
+    def stats(self) -> list:
+        result = []
+        for source, entry in self.sources.items():
+            saved = max(entry["bytes_scanned"] - entry["bytes_received"], 0)
+            result.append({
+                "source": source,
+                **entry,
+                "bytes_saved": saved,
+                "saved_pct": round(100 * saved / entry["bytes_scanned"], 1) if entry["bytes_scanned"] else 0.0
+            })
+        return result
+
+transfer_stats = TransferStats()
+
+def ensure_source_columns(engine):
+    """
+    Adds the tail position and filter columns to an existing log_sources table.
+    """
+    with engine.begin() as conn:
+        columns = {c["name"] for c in inspect(conn).get_columns("log_sources")}
+        for column, ddl in (("file_inode", "VARCHAR"), ("file_offset", "BIGINT"),
+                            ("include_patterns", "TEXT"), ("exclude_patterns", "TEXT")):
+            if column not in columns:
+                print(f"Adding log_sources.{column}...")
+                conn.execute(text(f"ALTER TABLE log_sources ADD COLUMN {column} {ddl}"))
+
+def save_position(source_id: int, inode: str, offset: int):
+    from database import SessionLocal
+    from models import LogSource
+    db = SessionLocal()
+    try:
+        db.query(LogSource).filter(LogSource.id == source_id).update({
+            "file_inode": inode,
+            "file_offset": offset,
+            "last_collected_at": datetime.utcnow()
+        })
+        db.commit()
+    finally:
+        db.close()
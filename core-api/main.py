@@ -1,8 +1,8 @@
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine
+from database import engine, pool_stats
 import models
-from ingest import router as ingest_router
+from ingest import router as ingest_router, write_queue, log_folder
 from agent import router as agent_router
 from chat_agent import router as chat_router
 from remediation import RemediationRequest, execute_remediation
@@ -10,6 +10,15 @@ import os
 import sys
 import logging
 from license_manager import validate_license_key
+import ai_provider
+import asyncio
+import partitions
+from log_store import ensure_log_indexes
+from search import ensure_search_schema
+from log_fields import ensure_field_columns
+from fold import ensure_fold_columns
+from log_tail import ensure_source_columns
+from collector_supervisor import supervisor as collector_supervisor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +26,11 @@ logger = logging.getLogger("core-api")
 
 # Create tables
 models.Base.metadata.create_all(bind=engine)
+ensure_field_columns(engine)
+ensure_fold_columns(engine)
+ensure_search_schema(engine)
+ensure_log_indexes(engine)
+ensure_source_columns(engine)
 
 app = FastAPI(title="LogWarden Core API")
 
@@ -32,6 +46,23 @@ async def startup_event():
         sys.exit(1)
     
     logger.info("License Verified. Starting Core API...")
+    # Create today's and upcoming log partitions before accepting writes
+    await asyncio.to_thread(partitions.ensure_partitions)
+    asyncio.create_task(partitions.maintenance_loop())
+    await write_queue.start()
+    await log_folder.start()
+    if os.getenv("AI_WARMUP", "true").lower() == "true":
+        # Load the shared engine in the background so startup stays fast
+        asyncio.create_task(ai_provider.warmup())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Stop collectors first so their last records reach the queue
+    await collector_supervisor.stop_all()
+    # Drain logs that were acknowledged but not yet committed
+    await write_queue.stop()
+    # Then write the groups still open in their fold window
+    await log_folder.stop()
 
 # CORS
 app.add_middleware(
@@ -40,6 +71,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -66,6 +98,7 @@ from sqlalchemy.orm import Session
 from fastapi import Depends
 from database import get_db
 from pydantic import BaseModel
+from typing import List
 
 class ConfigRequest(BaseModel):
     key: str
@@ -115,10 +148,51 @@ class SourceCreate(BaseModel):
     aws_access_key: str = None
     aws_secret_key: str = None
 
+    # SSH line filters (POSIX extended regular expressions)
+    include_patterns: List[str] = []
+    exclude_patterns: List[str] = []
+
+class SourceFilters(BaseModel):
+    include_patterns: List[str] = []
+    exclude_patterns: List[str] = []
+
+def _filter_columns(include: List[str], exclude: List[str]) -> dict:
+    from log_tail import parse_patterns, validate_patterns
+    include, exclude = parse_patterns(include), parse_patterns(exclude)
+    try:
+        validate_patterns(include + exclude)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"include_patterns": "\n".join(include) or None, "exclude_patterns": "\n".join(exclude) or None}
+
 @app.get("/config/sources")
 def get_sources(db: Session = Depends(get_db)):
     return db.query(models.LogSource).all()
 
+@app.get("/config/sources/status")
+def get_collectors_status():
+    """
+    State, restarts, last error and lines/sec of every supervised collector.
+    """
+    return collector_supervisor.status()
+
+@app.get("/config/sources/forwarding")
+def get_forwarding_stats():
+    """
+    Per-source collector forwarding throughput, lag, retries and failures.
+    """
+    from forwarder import forwarding_stats
+    return forwarding_stats()
+
+@app.get("/config/sources/bandwidth")
+def get_bandwidth_stats():
+    """
+    Per-source bytes scanned on the remote host vs bytes received, i.e. what
+    the include/exclude filters saved.
+    """
+    from log_tail import transfer_stats
+    return transfer_stats.stats()
+
 @app.post("/config/sources")
 def add_source(source: SourceCreate, db: Session = Depends(get_db)):
     new_source = models.LogSource(
@@ -134,6 +208,7 @@ def add_source(source: SourceCreate, db: Session = Depends(get_db)):
         aws_log_group=source.aws_log_group,
         aws_access_key=source.aws_access_key,
         aws_secret_key=source.aws_secret_key,
+        **_filter_columns(source.include_patterns, source.exclude_patterns),
         status="offline"
     )
     db.add(new_source)
@@ -141,6 +216,23 @@ def add_source(source: SourceCreate, db: Session = Depends(get_db)):
     db.refresh(new_source)
     return new_source
 
+@app.put("/config/sources/{id}/filters")
+async def set_source_filters(id: int, filters: SourceFilters, db: Session = Depends(get_db)):
+    """
+    Replaces a source's include/exclude patterns; a running collector is
+    restarted to pick them up.
+    """
+    source = db.query(models.LogSource).filter(models.LogSource.id == id).first()
+    if not source: raise HTTPException(404, "Source not found")
+    columns = _filter_columns(filters.include_patterns, filters.exclude_patterns)
+    for column, value in columns.items():
+        setattr(source, column, value)
+    db.commit()
+    restarted = collector_supervisor.is_running(id)
+    if restarted:
+        await collector_supervisor.restart(id)
+    return {**columns, "restarted": restarted}
+
 @app.post("/config/sources/{id}/test")
 async def test_source_connection(id: int, db: Session = Depends(get_db)):
     source = db.query(models.LogSource).filter(models.LogSource.id == id).first()
@@ -163,20 +255,30 @@ async def test_source_connection(id: int, db: Session = Depends(get_db)):
     return {"success": success}
 
 @app.post("/config/sources/{id}/start")
-async def start_source_collection(id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    # Launch in background, manage own DB session
-    if id: # simple check
-        from ssh_collector import start_collection_task
-        # Note: We reuse the same task wrapper. We need to update it to support AWS.
-        # or we make a new one. Let's update ssh_collector.py to be a generic collector_task.
-        # actually, easier to make a new task loader in main for now or update the task.
-        
-        # Let's route based on type inside the task? No, task takes ID.
-        # Let's update `ssh_collector.py` to `collector_service.py` concept but keeping name for now.
-        # We will modify start_collection_task in ssh_collector.py to dispatch.
-        background_tasks.add_task(start_collection_task, id)
-
-    return {"status": "started"}
+async def start_source_collection(id: int, db: Session = Depends(get_db)):
+    if not db.query(models.LogSource).filter(models.LogSource.id == id).first():
+        raise HTTPException(404, "Source not found")
+    started = collector_supervisor.start(id)
+    return {"status": "started" if started else "already_running", **collector_supervisor.status(id)}
+
+@app.post("/config/sources/{id}/stop")
+async def stop_source_collection(id: int):
+    stopped = await collector_supervisor.stop(id)
+    return {"status": "stopped" if stopped else "not_running"}
+
+@app.post("/config/sources/{id}/restart")
+async def restart_source_collection(id: int, db: Session = Depends(get_db)):
+    if not db.query(models.LogSource).filter(models.LogSource.id == id).first():
+        raise HTTPException(404, "Source not found")
+    await collector_supervisor.restart(id)
+    return {"status": "restarted", **collector_supervisor.status(id)}
+
+@app.get("/config/sources/{id}/status")
+def get_source_collection_status(id: int):
+    status = collector_supervisor.status(id)
+    if status is None:
+        raise HTTPException(404, "Collector was never started for this source")
+    return status
 
 @app.get("/notifications")
 def get_notifications(db: Session = Depends(get_db)):
@@ -192,6 +294,52 @@ def mark_notification_read(note_id: int, db: Session = Depends(get_db)):
         db.commit()
     return {"status": "success"}
 
+@app.get("/ai/status")
+def get_ai_status():
+    """
+    Readiness of the shared AI engine (cold, loading, ready, failed).
+    """
+    return ai_provider.status()
+
+@app.post("/ai/warmup")
+async def warmup_ai():
+    return await ai_provider.warmup()
+
+@app.get("/ai/stats")
+def get_ai_stats():
+    """
+    Per-stage AI engine timings (queue wait vs compute, embed vs search).
+    """
+    engine = ai_provider.peek_ai_engine()
+    return {**ai_provider.status(), "engine": engine.stats() if engine else None}
+
+@app.get("/db/stats")
+def get_db_stats():
+    """
+    Connection pool checkouts/wait times and query timings (sync + async engines).
+    """
+    return pool_stats()
+
+@app.get("/ai/templates")
+def get_templates(limit: int = 50):
+    """
+    Mined log templates, most frequent first, with verdict reuse counters.
+    """
+    engine = ai_provider.peek_ai_engine()
+    if not engine or not engine.miner:
+        raise HTTPException(503, "Template mining is not active")
+    return engine.miner.stats(limit=limit)
+
+@app.get("/ai/templates/{template_id}")
+def get_template(template_id: int):
+    engine = ai_provider.peek_ai_engine()
+    if not engine or not engine.miner:
+        raise HTTPException(503, "Template mining is not active")
+    template = engine.miner.get(template_id)
+    if not template:
+        raise HTTPException(404, "Template not found")
+    return template
+
 @app.get("/")
 async def root():
     return {"message": "LogWarden Core API is running"}
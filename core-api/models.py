@@ -1,19 +1,46 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, JSON, ForeignKey
-from sqlalchemy.orm import relationship
-from database import Base
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, DateTime, JSON, ForeignKey, Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR, JSONB
+from sqlalchemy.orm import relationship, deferred
+from database import Base, IS_POSTGRES
 from datetime import datetime
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 
 class Log(Base):
     __tablename__ = "logs"
+    # On Postgres the table is range-partitioned by day/week on timestamp
+    # (see partitions.py); the partition key has to be part of the primary key.
+    # The (..., timestamp, id) indexes back keyset pagination in GET /ingest/logs,
+    # one per filter it supports; threat-only browsing uses partial indexes.
+    __table_args__ = (
+        Index("ix_logs_timestamp_id", "timestamp", "id"),
+        Index("ix_logs_source_timestamp_id", "source", "timestamp", "id"),
+        Index("ix_logs_type_timestamp_id", "type", "timestamp", "id"),
+        Index("ix_logs_user_name_timestamp_id", "user_name", "timestamp", "id"),
+        Index("ix_logs_ip_address_timestamp_id", "ip_address", "timestamp", "id"),
+        Index("ix_logs_action_timestamp_id", "action", "timestamp", "id"),
+        Index("ix_logs_location_timestamp_id", "location", "timestamp", "id"),
+        Index("ix_logs_event_id_timestamp_id", "event_id", "timestamp", "id"),
+        Index("ix_logs_threat_timestamp_id", "timestamp", "id",
+              postgresql_where=text("is_threat"), sqlite_where=text("is_threat")),
+        Index("ix_logs_threat_source_timestamp_id", "source", "timestamp", "id",
+              postgresql_where=text("is_threat"), sqlite_where=text("is_threat")),
+        {"postgresql_partition_by": "RANGE (timestamp)"} if IS_POSTGRES else {}
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     source = Column(String, index=True)
     type = Column(String, index=True)
     message = Column(String)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), primary_key=IS_POSTGRES, nullable=False, server_default=func.now())
     received_at = Column(DateTime(timezone=True), server_default=func.now())
-    raw_content = Column(JSON, nullable=True)
+    raw_content = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
+
+    # Frequently queried raw_content keys, promoted at ingest (see log_fields.py)
+    user_name = Column(String, nullable=True)
+    ip_address = Column(String, nullable=True)
+    action = Column(String, nullable=True)
+    location = Column(String, nullable=True)
+    event_id = Column(String, nullable=True)
     
     # AI/RAG Analysis
     is_threat = Column(Boolean, default=False)
@@ -21,6 +48,36 @@ class Log(Base):
     threat_signature = Column(String, nullable=True)
     remediation = Column(String, nullable=True)
 
+    # Repeated lines folded into this row at ingest (see fold.py)
+    occurrences = Column(Integer, nullable=False, default=1, server_default="1")
+    first_seen = Column(DateTime(timezone=True), nullable=True)
+    last_seen = Column(DateTime(timezone=True), nullable=True)
+
+    # Full-text search: a generated tsvector over message on Postgres (deferred
+    # so it is never loaded or serialized); SQLite uses the logs_fts FTS5 table.
+    # See search.py.
+    if IS_POSTGRES:
+        message_tsv = deferred(Column(TSVECTOR, Computed("to_tsvector('simple', coalesce(message, ''))", persisted=True)))
+
+if IS_POSTGRES:
+    Index("ix_logs_message_tsv", Log.message_tsv, postgresql_using="gin")
+    # Containment (@>) lookups on any other raw_content key
+    Index("ix_logs_raw_content", Log.raw_content, postgresql_using="gin", postgresql_ops={"raw_content": "jsonb_path_ops"})
+
+class LogRollup(Base):
+    """
+    Pre-aggregated log counts per minute/hour bucket, maintained by
+    rollups.apply_rollups on every insert.
+    """
+    __tablename__ = "log_rollups"
+
+    granularity = Column(String, primary_key=True) # minute, hour
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    source = Column(String, primary_key=True)
+    type = Column(String, primary_key=True)
+    is_threat = Column(Boolean, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
 class SystemConfig(Base):
     __tablename__ = "system_config"
 
@@ -50,6 +107,12 @@ class LogSource(Base):
     log_path = Column(String) # /var/log/syslog or "Security"
     status = Column(String, default="offline") # online, offline, error
     last_collected_at = Column(DateTime, nullable=True)
+    # Tail position of the last ingested line (SSH sources, see log_tail.py)
+    file_inode = Column(String, nullable=True)
+    file_offset = Column(BigInteger, nullable=True)
+    # Remote line filters, one ERE per line (applied on the host over SSH)
+    include_patterns = Column(Text, nullable=True)
+    exclude_patterns = Column(Text, nullable=True)
 
     # AWS Specific Fields
     aws_region = Column(String, nullable=True)
@@ -0,0 +1,84 @@
+import zlib
+from starlette.responses import StreamingResponse
+
+MAX_LINE_BYTES = 1024 * 1024
+# Upper bound on what one decompress call may produce
+INFLATE_CHUNK_BYTES = 64 * 1024
+
+class NDJSONDecoder:
+    """
+    Incremental newline-delimited JSON splitter.
+    Bytes are fed as they arrive off the socket and only complete lines are
+    yielded, so memory use is bounded by one line rather than the whole body.
+    Handles gzip (including multi-member) bodies when `gzipped` is set; the
+    body is inflated INFLATE_CHUNK_BYTES at a time, so a small, highly
+    compressed chunk cannot expand past the line limit unchecked.
+    """
+
+    def __init__(self, gzipped=False, max_line_bytes=MAX_LINE_BYTES):
+        self.gzipped = gzipped
+        self.max_line_bytes = max_line_bytes
+        self._inflater = self._new_inflater() if gzipped else None
+        self._pending = b""
+        self.bytes_in = 0
+
+    @staticmethod
+    def _new_inflater():
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def _inflate(self, chunk: bytes):
+        data = chunk
+        while True:
+            piece = self._inflater.decompress(data, INFLATE_CHUNK_BYTES)
+            if piece:
+                yield piece
+            if self._inflater.eof:
+                # A finished gzip member may be followed by another one
+                data = self._inflater.unused_data
+                if not data:
+                    return
+                self._inflater = self._new_inflater()
+            else:
+                data = self._inflater.unconsumed_tail
+                # A full piece may leave output buffered inside zlib
+                if not data and len(piece) < INFLATE_CHUNK_BYTES:
+                    return
+
+    def feed(self, chunk: bytes):
+        """
+        Consumes a chunk and returns an iterator over the complete (non-empty)
+        lines it finished. Iterating raises ValueError as soon as a single
+        line grows past max_line_bytes.
+        """
+        self.bytes_in += len(chunk)
+        return self._lines(self._inflate(chunk) if self._inflater else (chunk,))
+
+    def _lines(self, pieces):
+        for data in pieces:
+            lines = (self._pending + data).split(b"\n")
+            self._pending = lines.pop()
+            if len(self._pending) > self.max_line_bytes:
+                raise ValueError(f"NDJSON line exceeds {self.max_line_bytes} bytes")
+            for line in lines:
+                if line.strip():
+                    yield line
+
+    def close(self) -> list:
+        """
+        Returns the trailing line if the body did not end with a newline.
+        """
+        if self._inflater and not self._inflater.eof and self.bytes_in:
+            raise ValueError("Truncated gzip stream")
+        tail, self._pending = self._pending, b""
+        return [tail] if tail.strip() else []
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body generator is still reading the request body.
+    Starlette normally listens for disconnects on `receive` while streaming,
+    which would swallow request chunks; here the generator owns `receive`
+    (request.stream() raises ClientDisconnect itself).
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
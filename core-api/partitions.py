@@ -0,0 +1,271 @@
+"""
+Time partitioning for the `logs` table (Postgres only).
+
+`logs` is declared `PARTITION BY RANGE (timestamp)` in models.py. This module
+creates upcoming daily/weekly partitions ahead of time, keeps a DEFAULT
+partition for out-of-range timestamps, and enforces retention by detaching
+and dropping whole partitions instead of running huge DELETEs.
+
+Usage:
+    python partitions.py maintain   # create upcoming partitions + retention
+    python partitions.py migrate    # convert a legacy unpartitioned logs table
+"""
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text, inspect
+from database import engine, IS_POSTGRES, SessionLocal
+from models import Log
+from rollups import prune_rollups
+
+logger = logging.getLogger("partitions")
+
+PARTITION_INTERVAL = os.getenv("LOG_PARTITION_INTERVAL", "day") # day | week
+PARTITIONS_AHEAD = int(os.getenv("LOG_PARTITIONS_AHEAD", "7"))
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "0")) # 0 keeps everything (retention is opt-in)
+MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("LOG_PARTITION_MAINTENANCE_SECONDS", "3600"))
+
+DEFAULT_PARTITION = "logs_default"
+
+def _interval() -> timedelta:
+    return timedelta(weeks=1) if PARTITION_INTERVAL == "week" else timedelta(days=1)
+
+def partition_start(moment: datetime) -> datetime:
+    """
+    Start (UTC midnight, Monday for weekly) of the partition holding `moment`.
+    """
+    moment = moment.astimezone(timezone.utc) if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if PARTITION_INTERVAL == "week":
+        start -= timedelta(days=start.weekday())
+    return start
+
+def partition_name(start: datetime) -> str:
+    prefix = "logs_w" if PARTITION_INTERVAL == "week" else "logs_p"
+    return f"{prefix}{start:%Y%m%d}"
+
+def _parse_partition_start(name: str):
+    try:
+        return datetime.strptime(name[-8:], "%Y%m%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+def is_partitioned(conn) -> bool:
+    relkind = conn.execute(text("SELECT relkind FROM pg_class WHERE relname = 'logs' AND relkind IN ('r', 'p')")).scalar()
+    return relkind == "p"
+
+def list_partitions(conn) -> list:
+    rows = conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'logs'
+    """))
+    return sorted(r[0] for r in rows)
+
+def _stored_columns(conn) -> list:
+    """
+    Columns of `logs` that hold written values, i.e. everything but generated
+    columns. Read from the catalog so columns added by ALTER are included.
+    """
+    rows = conn.execute(text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'logs' AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+    """))
+    return [r[0] for r in rows]
+
+def _create_partition(conn, start: datetime):
+    end = start + _interval()
+    name = partition_name(start)
+    bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+
+    # Rows for this range may already sit in the default partition; they
+    # must be moved out before the new range can be attached.
+    stray = conn.execute(
+        text(f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE timestamp >= :s AND timestamp < :e LIMIT 1"),
+        {"s": start, "e": end}
+    ).first()
+    if stray is None:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF logs FOR VALUES {bounds}"))
+        return
+
+    logger.info(f"Moving rows for {name} out of {DEFAULT_PARTITION}")
+    # Generated columns (message_tsv) cannot be written, and a table made with
+    # LIKE would hold them as plain columns that ATTACH rejects. Park the rows
+    # in a temp table, create a real partition, and insert them back.
+    columns = ", ".join(f'"{c}"' for c in _stored_columns(conn))
+    moving = f"{name}_moving"
+    conn.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN SHARE ROW EXCLUSIVE MODE"))
+    conn.execute(text(
+        f"CREATE TEMP TABLE {moving} ON COMMIT DROP AS "
+        f"SELECT {columns} FROM {DEFAULT_PARTITION} WHERE timestamp >= :s AND timestamp < :e"
+    ), {"s": start, "e": end})
+    conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :s AND timestamp < :e"), {"s": start, "e": end})
+    conn.execute(text(f"CREATE TABLE {name} PARTITION OF logs FOR VALUES {bounds}"))
+    conn.execute(text(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {moving}"))
+    conn.execute(text(f"DROP TABLE {moving}"))
+
+def ensure_partitions(now: datetime = None, since: datetime = None):
+    """
+    Creates the default partition and every partition from `since`
+    (default: the current one) up to PARTITIONS_AHEAD intervals ahead.
+    """
+    if not IS_POSTGRES:
+        return []
+    now = now or datetime.now(timezone.utc)
+    created = []
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            logger.warning("logs table is not partitioned; run `python partitions.py migrate` to convert it")
+            return []
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF logs DEFAULT"))
+        existing = set(list_partitions(conn))
+
+        start = partition_start(since or now)
+        last = partition_start(now) + _interval() * PARTITIONS_AHEAD
+        while start <= last:
+            if partition_name(start) not in existing:
+                _create_partition(conn, start)
+                created.append(partition_name(start))
+            start += _interval()
+    if created:
+        logger.info(f"Created log partitions: {', '.join(created)}")
+    return created
+
+def drop_expired_partitions(retention_days: int = LOG_RETENTION_DAYS, now: datetime = None):
+    """
+    Detaches and drops partitions that ended before the retention cutoff.
+    Out-of-range rows in the default partition are trimmed with a DELETE.
+    """
+    if not IS_POSTGRES or retention_days <= 0:
+        return []
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=retention_days)
+    dropped = []
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return []
+        for name in list_partitions(conn):
+            start = _parse_partition_start(name)
+            if name == DEFAULT_PARTITION or start is None:
+                continue
+            if start + _interval() <= cutoff:
+                conn.execute(text(f"ALTER TABLE logs DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+        conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff"), {"cutoff": cutoff})
+    if dropped:
+        logger.info(f"Dropped expired log partitions: {', '.join(dropped)}")
+    return dropped
+
+def drop_partition_if_within(start: datetime, end: datetime, archived_rows: int) -> bool:
+    """
+    Drops the partition for [start, end) if its bounds lie inside that range
+    and its row count matches the rows the archive holds for it
+    (`archived_rows`). Ids are not assigned in commit order, so an id bound
+    cannot tell whether a late row was archived. Returns False when the
+    caller has to DELETE instead.
+    """
+    if not IS_POSTGRES:
+        return False
+    part_start = partition_start(start)
+    if part_start != start or part_start + _interval() > end:
+        return False
+    name = partition_name(part_start)
+    with engine.begin() as conn:
+        if name not in list_partitions(conn):
+            return False
+        # Block concurrent inserts while checking for late, unarchived rows
+        conn.execute(text(f"LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE"))
+        rows = conn.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+        if rows != archived_rows:
+            logger.info(f"Not dropping {name}: {rows} rows, {archived_rows} archived")
+            return False
+        conn.execute(text(f"ALTER TABLE logs DETACH PARTITION {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+    logger.info(f"Dropped archived partition {name}")
+    return True
+
+def run_maintenance():
+    # Imported here: archive uses this module to drop archived partitions
+    from archive import archive_old_logs
+    try:
+        ensure_partitions()
+        # Archive before retention so nothing is dropped unarchived
+        archive_old_logs()
+        drop_expired_partitions()
+    except Exception as e:
+        logger.error(f"Partition maintenance failed: {e}")
+
+    # Rollups are trimmed on the same schedule
+    db = SessionLocal()
+    try:
+        prune_rollups(db)
+    except Exception as e:
+        logger.error(f"Rollup pruning failed: {e}")
+    finally:
+        db.close()
+
+async def maintenance_loop():
+    """
+    Background task: keeps upcoming partitions created and retention applied.
+    """
+    while True:
+        await asyncio.to_thread(run_maintenance)
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+
+def migrate_to_partitioned():
+    """
+    One-off conversion of a legacy (unpartitioned) logs table: the old table
+    is renamed, the partitioned table created, rows copied, and ids resumed.
+    """
+    if not IS_POSTGRES:
+        print("Partitioning is only supported on Postgres.")
+        return
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            print("logs is already partitioned.")
+            return
+        if not inspect(conn).has_table("logs"):
+            print("No logs table yet; it will be created partitioned on startup.")
+            return
+
+        print("Renaming legacy logs table...")
+        conn.execute(text("ALTER TABLE logs RENAME TO logs_legacy"))
+        conn.execute(text("ALTER SEQUENCE IF EXISTS logs_id_seq RENAME TO logs_legacy_id_seq"))
+        for (index_name,) in conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = 'logs_legacy'")).fetchall():
+            conn.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name}_legacy"'))
+
+        Log.__table__.create(conn)
+        legacy_columns = {c["name"] for c in inspect(conn).get_columns("logs_legacy")}
+        oldest = conn.execute(text("SELECT MIN(timestamp) FROM logs_legacy")).scalar()
+
+    since = None
+    if oldest is not None:
+        since = oldest
+        if LOG_RETENTION_DAYS > 0:
+            since = max(partition_start(oldest), datetime.now(timezone.utc) - timedelta(days=LOG_RETENTION_DAYS))
+    ensure_partitions(since=since)
+
+    with engine.begin() as conn:
+        columns = [c.name for c in Log.__table__.columns if c.name in legacy_columns and c.computed is None]
+        select_list = ", ".join(
+            "COALESCE(timestamp, received_at, now())" if c == "timestamp" else f'"{c}"' for c in columns
+        )
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        print("Copying rows into the partitioned table...")
+        conn.execute(text(f"INSERT INTO logs ({column_list}) SELECT {select_list} FROM logs_legacy"))
+        conn.execute(text("SELECT setval('logs_id_seq', (SELECT COALESCE(MAX(id), 0) + 1 FROM logs), false)"))
+        conn.execute(text("DROP TABLE logs_legacy"))
+    print("Migration complete.")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else "maintain"
+    if command == "migrate":
+        migrate_to_partitioned()
+    else:
+        run_maintenance()
@@ -1,17 +1,20 @@
 from database import engine, Base
-from models import Log
+from models import Log, LogRollup
+from partitions import ensure_partitions
 import sys
 
 def reset_db():
     print("Dropping logs table...")
     try:
         Log.__table__.drop(engine)
+        LogRollup.__table__.drop(engine, checkfirst=True)
         print("Table dropped.")
     except Exception as e:
         print(f"Error dropping table (might not exist): {e}")
 
     print("Recreating tables...")
     Base.metadata.create_all(bind=engine)
+    ensure_partitions()
     print("Done.")
 
 if __name__ == "__main__":
@@ -0,0 +1,170 @@
+"""
+Per-minute and per-hour log counts keyed by (source, type, is_threat).
+
+insert_logs() folds every batch into these rollups in the same transaction
+as the rows themselves, so the dashboard stats endpoints read a few hundred
+rollup rows instead of scanning `logs`.
+
+Usage:
+    python rollups.py rebuild [hours]   # backfill rollups from logs
+"""
+import os
+import sys
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, text, case, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models import LogRollup
+
+GRANULARITIES = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1)
+}
+
+# Minute buckets only back short windows; hour buckets follow log retention.
+MINUTE_ROLLUP_RETENTION_HOURS = int(os.getenv("MINUTE_ROLLUP_RETENTION_HOURS", "48"))
+HOUR_ROLLUP_RETENTION_DAYS = int(os.getenv("HOUR_ROLLUP_RETENTION_DAYS", os.getenv("LOG_RETENTION_DAYS", "0")))
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    moment = moment.astimezone(timezone.utc) if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(second=0, microsecond=0)
+
+def count_rows(rows: list, now: datetime = None) -> Counter:
+    """
+    Aggregates log rows into {(granularity, bucket, source, type, is_threat): count}.
+    A folded row counts as its number of occurrences.
+    """
+    now = now or datetime.now(timezone.utc)
+    counts = Counter()
+    for row in rows:
+        moment = row.get("timestamp") or now
+        key = (row.get("source") or "unknown", row.get("type") or "INFO", bool(row.get("is_threat")))
+        occurrences = row.get("occurrences") or 1
+        for granularity in GRANULARITIES:
+            counts[(granularity, bucket_start(moment, granularity)) + key] += occurrences
+    return counts
+
+def _upsert(dialect_name: str):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def apply_rollups(db: Session, rows: list):
+    """
+    Adds a batch of log rows to the rollups (no commit; runs inside the
+    caller's transaction). Keys are written in sorted order so concurrent
+    flush workers lock rollup rows in the same order.
+    """
+    counts = count_rows(rows)
+    if not counts:
+        return
+    values = [
+        {"granularity": g, "bucket": b, "source": s, "type": t, "is_threat": th, "count": n}
+        for (g, b, s, t, th), n in sorted(counts.items(), key=lambda item: tuple(str(part) for part in item[0]))
+    ]
+    insert = _upsert(db.bind.dialect.name)
+    stmt = insert(LogRollup).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["granularity", "bucket", "source", "type", "is_threat"],
+        set_={"count": LogRollup.count + stmt.excluded["count"]}
+    )
+    db.execute(stmt)
+
+def resolve_range(start: datetime = None, end: datetime = None, default_hours: int = 24):
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(hours=default_hours)
+    return start, end
+
+def _in_range(stmt, granularity: str, start: datetime, end: datetime):
+    return stmt.where(
+        LogRollup.granularity == granularity,
+        LogRollup.bucket >= bucket_start(start, granularity),
+        LogRollup.bucket < end
+    )
+
+async def traffic(db: AsyncSession, start: datetime, end: datetime, granularity: str = "hour") -> list:
+    """
+    Total vs threat counts per bucket.
+    """
+    blocked = func.sum(case((LogRollup.is_threat == True, LogRollup.count), else_=0))
+    stmt = _in_range(select(LogRollup.bucket, func.sum(LogRollup.count), blocked), granularity, start, end)\
+        .group_by(LogRollup.bucket)\
+        .order_by(LogRollup.bucket)
+    results = (await db.execute(stmt)).all()
+    return [{"bucket": r[0], "total": int(r[1] or 0), "blocked": int(r[2] or 0)} for r in results]
+
+async def top_threat_sources(db: AsyncSession, start: datetime, end: datetime, limit: int = 5) -> list:
+    total = func.sum(LogRollup.count)
+    stmt = _in_range(select(LogRollup.source, total).where(LogRollup.is_threat == True), "hour", start, end)\
+        .group_by(LogRollup.source)\
+        .order_by(total.desc())\
+        .limit(limit)
+    results = (await db.execute(stmt)).all()
+    return [{"source": r[0], "count": int(r[1])} for r in results]
+
+async def totals(db: AsyncSession, start: datetime, end: datetime, granularity: str = "hour") -> dict:
+    """
+    Distinct sources, total and threat counts over a range.
+    """
+    blocked = func.sum(case((LogRollup.is_threat == True, LogRollup.count), else_=0))
+    stmt = select(func.count(func.distinct(LogRollup.source)), func.sum(LogRollup.count), blocked)
+    sources, total, threats = (await db.execute(_in_range(stmt, granularity, start, end))).one()
+    return {"sources": sources or 0, "total": int(total or 0), "threats": int(threats or 0)}
+
+def prune_rollups(db: Session, now: datetime = None) -> int:
+    now = now or datetime.now(timezone.utc)
+    removed = 0
+    for granularity, keep in (("minute", timedelta(hours=MINUTE_ROLLUP_RETENTION_HOURS)),
+                              ("hour", timedelta(days=HOUR_ROLLUP_RETENTION_DAYS))):
+        if keep.total_seconds() <= 0:
+            continue
+        removed += db.query(LogRollup)\
+            .filter(LogRollup.granularity == granularity, LogRollup.bucket < now - keep)\
+            .delete(synchronize_session=False)
+    db.commit()
+    return removed
+
+def _bucket_sql(dialect_name: str, granularity: str) -> str:
+    if dialect_name == "postgresql":
+        return "date_trunc(:granularity, timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'"
+    # SQLite keeps UTC timestamps as text in SQLAlchemy's format; the bucket
+    # must be written the same way or it will not match insert_logs' upserts
+    if granularity == "hour":
+        return "strftime('%Y-%m-%d %H:00:00.000000', timestamp)"
+    return "strftime('%Y-%m-%d %H:%M:00.000000', timestamp)"
+
+def rebuild_rollups(db: Session, hours: int = 24 * 30):
+    """
+    Recomputes the rollups for the last `hours` from the logs table.
+    """
+    since = bucket_start(datetime.now(timezone.utc) - timedelta(hours=hours), "hour")
+    db.query(LogRollup).filter(LogRollup.bucket >= since).delete(synchronize_session=False)
+    for granularity in GRANULARITIES:
+        db.execute(text(f"""
+            INSERT INTO log_rollups (granularity, bucket, source, type, is_threat, count)
+            SELECT :granularity, {_bucket_sql(db.bind.dialect.name, granularity)},
+                   COALESCE(source, 'unknown'), COALESCE(type, 'INFO'), COALESCE(is_threat, false), sum(COALESCE(occurrences, 1))
+            FROM logs
+            WHERE timestamp >= :since
+            GROUP BY 1, 2, 3, 4, 5
+        """), {"granularity": granularity, "since": since})
+    db.commit()
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        hours = int(sys.argv[2]) if len(sys.argv) > 2 else 24 * 30
+        db = SessionLocal()
+        try:
+            print(f"Rebuilding rollups for the last {hours} hours...")
+            rebuild_rollups(db, hours)
+            print("Done.")
+        finally:
+            db.close()
+    else:
+        print(__doc__)
@@ -0,0 +1,154 @@
+"""
+Full-text search over Log.message.
+
+Postgres: `logs.message_tsv` is a generated tsvector ('simple' config, so
+IPs, usernames and paths are kept verbatim rather than stemmed) with a GIN
+index. SQLite (local testing): an external-content FTS5 table `logs_fts`
+kept in sync with triggers.
+
+Query syntax (all terms must match):
+    failed password        words
+    "invalid user admin"   phrase (words adjacent, in order)
+    auth*                  prefix
+"""
+import asyncio
+import re
+from datetime import datetime
+from sqlalchemy import select, text, func, literal_column, table, column, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Log
+from archive import log_archive, message_matcher, row_key
+
+# (kind, value): kind is "term", "prefix" or "phrase"
+_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+_PREFIX_WORD = re.compile(r"^[\w.\-@]+$")
+
+def parse_query(query: str) -> list:
+    terms = []
+    for phrase, word in _TOKEN.findall(query or ""):
+        if phrase:
+            if phrase.split():
+                terms.append(("phrase", " ".join(phrase.split())))
+        elif word.endswith("*") and _PREFIX_WORD.match(word.rstrip("*")):
+            terms.append(("prefix", word.rstrip("*")))
+        elif word.strip('"*'):
+            terms.append(("term", word.strip('"*')))
+    return terms
+
+def to_fts5_query(terms: list) -> str:
+    """
+    Renders parsed terms as an FTS5 MATCH expression (each term quoted, so
+    user input can never be read as FTS5 operators).
+    """
+    parts = []
+    for kind, value in terms:
+        quoted = '"' + value.replace('"', '""') + '"'
+        parts.append(quoted + "*" if kind == "prefix" else quoted)
+    return " AND ".join(parts)
+
+def _pg_tsquery(terms: list):
+    """
+    Builds the tsquery as SQL so every term goes through the same parser as
+    the indexed text (bound parameters, no tsquery escaping).
+    """
+    query = None
+    for kind, value in terms:
+        if kind == "prefix":
+            part = func.to_tsquery("simple", func.quote_literal(value).concat(":*"))
+        else:
+            # A single word may still split into several lexemes (e.g. "sshd[42]:")
+            part = func.phraseto_tsquery("simple", value)
+        query = part if query is None else query.op("&&")(part)
+    return query
+
+_fts = table("logs_fts", column("rowid"))
+
+async def search_logs(db: AsyncSession, query: str, source: str = None, since: datetime = None,
+                      until: datetime = None, limit: int = 50, offset: int = 0, sort: str = "rank"):
+    """
+    Ranked (or newest-first with sort="recent") matches for `query`.
+    Once the database matches are exhausted, results continue with archived
+    logs (newest first, rank 0).
+    Returns (rows, ranks, next_offset); next_offset is None on the last page.
+    """
+    terms = parse_query(query)
+    if not terms:
+        raise ValueError("Empty search query")
+
+    if db.bind.dialect.name == "postgresql":
+        tsquery = _pg_tsquery(terms)
+        # ts_rank_cd: higher is better
+        rank = func.ts_rank_cd(Log.message_tsv, tsquery)
+        stmt = select(Log, rank.label("rank")).where(Log.message_tsv.op("@@")(tsquery))
+        order = [rank.desc()]
+    else:
+        # bm25: lower is better, negated so both backends sort the same way
+        rank = -literal_column("bm25(logs_fts)")
+        stmt = select(Log, rank.label("rank"))\
+            .join(_fts, _fts.c.rowid == Log.id)\
+            .where(text("logs_fts MATCH :fts_query").bindparams(fts_query=to_fts5_query(terms)))
+        order = [literal_column("bm25(logs_fts)")]
+
+    if source is not None:
+        stmt = stmt.where(Log.source == source)
+    if since is not None:
+        stmt = stmt.where(Log.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(Log.timestamp < until)
+
+    if sort == "recent":
+        order = []
+    page = stmt.order_by(*order, Log.timestamp.desc(), Log.id.desc()).offset(offset).limit(limit + 1)
+
+    results = [(r[0], float(r[1] or 0)) for r in (await db.execute(page)).all()]
+    newest_archived = log_archive.newest
+    if len(results) <= limit and newest_archived is not None \
+            and (since is None or row_key({"timestamp": since, "id": 0})[0] <= newest_archived):
+        # Database matches end on this page; continue into the archive
+        if results or offset == 0:
+            db_total = offset + len(results)
+        else:
+            db_total = (await db.execute(select(func.count()).select_from(stmt.subquery()))).scalar()
+        archive_offset = max(offset - db_total, 0)
+        wanted = limit + 1 - len(results)
+        archived = await asyncio.to_thread(
+            log_archive.query, archive_offset + wanted, source=source, since=since, until=until,
+            match=message_matcher(terms)
+        )
+        results += [(row, 0.0) for row in archived[archive_offset:archive_offset + wanted]]
+
+    next_offset = offset + limit if len(results) > limit else None
+    results = results[:limit]
+    return [r[0] for r in results], [r[1] for r in results], next_offset
+
+_SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE logs_fts USING fts5(message, content='logs', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS logs_fts_ai AFTER INSERT ON logs BEGIN
+        INSERT INTO logs_fts(rowid, message) VALUES (new.id, new.message);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS logs_fts_ad AFTER DELETE ON logs BEGIN
+        INSERT INTO logs_fts(logs_fts, rowid, message) VALUES ('delete', old.id, old.message);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS logs_fts_au AFTER UPDATE OF message ON logs BEGIN
+        INSERT INTO logs_fts(logs_fts, rowid, message) VALUES ('delete', old.id, old.message);
+        INSERT INTO logs_fts(rowid, message) VALUES (new.id, new.message);
+    END""",
+    # Index rows that existed before the FTS table
+    "INSERT INTO logs_fts(logs_fts) VALUES ('rebuild')"
+]
+
+def ensure_search_schema(engine):
+    """
+    Adds the search structures to an existing database (create_all does not
+    alter tables that already exist). The GIN index itself is created by
+    log_store.ensure_log_indexes.
+    """
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(
+                "ALTER TABLE logs ADD COLUMN IF NOT EXISTS message_tsv tsvector "
+                "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(message, ''))) STORED"
+            ))
+        elif engine.dialect.name == "sqlite" and not inspect(conn).has_table("logs_fts"):
+            for statement in _SQLITE_FTS:
+                conn.execute(text(statement))
@@ -1,9 +1,17 @@
 import asyncssh
 import asyncio
+import os
 from datetime import datetime
 from models import LogSource, Log
 from sqlalchemy.orm import Session
 from database import SessionLocal
+from forwarder import forwarders
+from local_ingest import collector_sink
+from log_tail import (READ_CHUNK_BYTES, FilterError, TailPosition, parse_patterns, parse_stat, plan_resume, save_position,
+                      stat_command, tail_command, transfer_stats)
+
+# How often the tail position is persisted and the file re-checked for rotation
+OFFSET_SAVE_SECONDS = float(os.getenv("COLLECTOR_OFFSET_SAVE_SECONDS", "5"))
 
 class SSHCollector:
     async def test_connection(self, source: LogSource) -> bool:
@@ -25,77 +33,147 @@ class SSHCollector:
 
     async def collect_stream(self, source: LogSource, ingest_callback):
         """
-        Connects and streams logs via `tail -f` (Linux only for MVP).
+        Connects and streams logs (Linux: resumable `tail`, see log_tail.py;
+        Windows: Get-Content -Wait).
         Calls ingest_callback(log_entry) for each line.
         """
         try:
              async with asyncssh.connect(source.host, port=source.port, username=source.username, password=source.password if source.auth_type=='password' else None, known_hosts=None) as conn:
-                
-                # Determine command based on OS type
-                cmd = f"tail -f {source.log_path}" if source.type == 'linux' else f"Get-Content -Path '{source.log_path}' -Wait"
-                
-                # If windows, we'd need a different shell or powershell invocation, keeping simple for now
+                print(f"Started collection from {source.name} ({source.host})")
                 if source.type == 'windows':
-                   # Basic PowerShell wrapper
-                   cmd = f"powershell -Command \"Get-Content -Path '{source.log_path}' -Wait\""
+                    await self._follow_windows(conn, source, ingest_callback)
+                    return
 
-                async with conn.create_process(cmd) as process:
-                    print(f"Started collection from {source.name} ({source.host})")
-                    async for line in process.stdout:
-                        # Ingest the line
-                        line = line.strip()
-                        if line:
-                             await ingest_callback({
-                                 "source": source.name,
-                                 "timestamp": datetime.utcnow().isoformat(),
-                                 "message": line,
-                                 "type": "INFO" # Default, AI will enrich later
-                             })
+                position = (source.file_inode, source.file_offset)
+                while True:
+                    # Each pass ends when the file is rotated or truncated
+                    position = await self._tail_once(conn, source, position, ingest_callback)
         except Exception as e:
             print(f"Collection Error on {source.name}: {e}")
+            raise
+
+    @staticmethod
+    def _entry(source: LogSource, line: str) -> dict:
+        return {
+            "source": source.name,
+            "timestamp": datetime.utcnow().isoformat(),
+            "message": line,
+            "type": "INFO" # Default, AI will enrich later
+        }
+
+    async def _follow_windows(self, conn, source: LogSource, ingest_callback):
+        # Basic PowerShell wrapper
+        cmd = f"powershell -Command \"Get-Content -Path '{source.log_path}' -Wait\""
+        async with conn.create_process(cmd) as process:
+            async for line in process.stdout:
+                line = line.strip()
+                if line:
+                    await ingest_callback(self._entry(source, line))
 
-# Global instance manager stub
-_active_collectors = {}
+    async def _tail_once(self, conn, source: LogSource, saved: tuple, ingest_callback) -> tuple:
+        """
+        Resumes from `saved` (inode, offset), catching up on the rotated
+        copy first, and follows the file until it is rotated or truncated.
+        Returns the position reached.
+        """
+        stat = await conn.run(stat_command(source.log_path), check=False)
+        current, rotated = (parse_stat(stat.stdout or "") + [None, None])[:2]
+        plan = plan_resume(saved[0], saved[1], current, rotated)
+        include, exclude = parse_patterns(source.include_patterns), parse_patterns(source.exclude_patterns)
+        position = TailPosition(plan, rotated[0] if rotated else None, filtered=bool(include or exclude))
+        if plan["catchup"]:
+            start, size = plan["catchup"]
+            print(f"Catching up {size - start} bytes of rotated {source.log_path}.1 on {source.name}")
 
-async def start_collection_task(source_id: int):
-    print(f"DEBUG: Starting collection task for Source ID {source_id}")
+        replaced = asyncio.Event()
+        async with conn.create_process(tail_command(source.log_path, plan, include, exclude), encoding=None) as process:
+            watcher = asyncio.create_task(self._watch(conn, source, position, process, replaced))
+            try:
+                while True:
+                    try:
+                        chunk = await process.stdout.read(READ_CHUNK_BYTES)
+                    except Exception:
+                        # The watcher closed the channel under us
+                        if replaced.is_set():
+                            break
+                        raise
+                    if not chunk:
+                        break
+                    scanned = position.scanned
+                    entries = position.feed(chunk)
+                    transfer_stats.add(source.name, position.scanned - scanned, len(chunk),
+                                       sum(1 for line, _, _ in entries if line))
+                    for line, inode, offset in entries:
+                        if line:
+                            await ingest_callback(self._entry(source, line))
+                        # Only a line that was handed on may be skipped on resume
+                        position.commit(inode, offset)
+                if not replaced.is_set():
+                    error = (await process.stderr.read()).decode(errors="replace").strip()
+                    if position.filtered and "awk" in error:
+                        # The remote awk rejected the patterns; reconnecting would fail the same way
+                        raise FilterError(f"Remote filter failed on {source.name}: {error}")
+                    raise ConnectionError(f"Remote tail exited: {error or 'no output'}")
+            finally:
+                watcher.cancel()
+                await asyncio.gather(watcher, return_exceptions=True)
+                await asyncio.to_thread(save_position, source.id, position.inode, position.offset)
+        return position.inode, position.offset
+
+    async def _watch(self, conn, source: LogSource, position: TailPosition, process, replaced: asyncio.Event):
+        """
+        Saves the position every OFFSET_SAVE_SECONDS and ends the tail once
+        the followed file has been rotated away or truncated.
+        """
+        saved = None
+        while True:
+            await asyncio.sleep(OFFSET_SAVE_SECONDS)
+            if (position.inode, position.offset) != saved:
+                saved = (position.inode, position.offset)
+                await asyncio.to_thread(save_position, source.id, *saved)
+            if position.catching_up:
+                continue
+            stat = await conn.run(stat_command(source.log_path), check=False)
+            current = (parse_stat(stat.stdout or "") + [None])[0]
+            if current is None or current[0] != position.inode or current[1] < position.offset:
+                print(f"{source.log_path} on {source.name} was rotated or truncated; resuming")
+                replaced.set()
+                process.close()
+                return
+
+async def run_collection(source_id: int, on_start=None):
+    """
+    Collects from one LogSource until its stream ends; errors propagate to
+    the caller (collector_supervisor restarts the run).
+    on_start(source, sink) is called once the source is loaded.
+    """
     db = SessionLocal()
+    forwarder = None
     try:
         source = db.query(LogSource).filter(LogSource.id == source_id).first()
         if not source:
-            print(f"ERROR: Source ID {source_id} not found in DB")
-            return
+            raise LookupError(f"Source ID {source_id} not found")
 
-        print(f"DEBUG: Found source {source.name} ({source.host}). Initializing collector...")
-        
-        collector = None
         if source.type == 'aws_cloudwatch':
             from aws_collector import AWSCollector
             collector = AWSCollector(source)
         else:
             collector = SSHCollector()
-        
-        import httpx
-        async def send_to_api(log_data):
-            try:
-                # print(f"DEBUG: Sending log: {log_data['message'][:20]}...")
-                async with httpx.AsyncClient() as client:
-                    await client.post("http://localhost:8000/ingest/logs", json=log_data)
-            except Exception as e:
-                print(f"ERROR: Failed to forward log from {source.name}: {e}")
+
+        # Straight onto the ingest queue, or batched HTTP when INGEST_URL is set
+        forwarder = collector_sink(source.name)
+        forwarders[source.name] = forwarder
+        await forwarder.start()
+        if on_start:
+            on_start(source, forwarder)
 
         # AWS Collector collect_stream takes only callback
         # SSH Collector collect_stream takes source + callback
         if source.type == 'aws_cloudwatch':
-             await collector.collect_stream(send_to_api)
+            await collector.collect_stream(forwarder.send)
         else:
-             await collector.collect_stream(source, send_to_api)
-             
-        print(f"DEBUG: Collection finished for {source.name}")
-
-    except Exception as e:
-        print(f"CRITICAL ERROR in collection task: {e}")
-        import traceback
-        traceback.print_exc()
+            await collector.collect_stream(source, forwarder.send)
     finally:
+        if forwarder is not None:
+            await forwarder.close()
         db.close()
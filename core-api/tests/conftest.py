@@ -0,0 +1,11 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# Modules under test build their engines at import time. Point them at a
+# throwaway SQLite file (shared by the sync and aiosqlite engines) before any
+# test module is imported; no server is needed.
+_db_dir = tempfile.mkdtemp(prefix="logwarden-tests-")
+atexit.register(shutil.rmtree, _db_dir, ignore_errors=True)
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_db_dir, "test.db")
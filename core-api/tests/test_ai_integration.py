@@ -5,11 +5,20 @@ import json
 from unittest.mock import MagicMock, patch, AsyncMock
 
 # 1. SETUP MOCKS BEFORE IMPORTING AGENT
+# They are undone once agent is imported (see below) so that later test
+# modules get the real database and sqlalchemy
+_SCOPED_MOCKS = ['database', 'models', 'sqlalchemy', 'sqlalchemy.orm', 'sqlalchemy.ext',
+                 'sqlalchemy.ext.asyncio', 'httpx', 'cvss_calculator']
+_real_modules = {name: sys.modules.get(name) for name in _SCOPED_MOCKS}
+
 # We need to block DB connections
 sys.modules['database'] = MagicMock()
 sys.modules['models'] = MagicMock()
 sys.modules['sqlalchemy'] = MagicMock()
 sys.modules['sqlalchemy.orm'] = MagicMock()
+# agent imports AsyncSession; with sqlalchemy mocked the submodules must be too
+sys.modules['sqlalchemy.ext'] = MagicMock()
+sys.modules['sqlalchemy.ext.asyncio'] = MagicMock()
 sys.modules['httpx'] = MagicMock()
 
 sys.modules['sqlalchemy'] = MagicMock()
@@ -28,6 +37,12 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from agent import analyze_security_event, AnalysisRequest, _extract_entities, _get_user_context, _check_ip_reputation
 
+for _name, _module in _real_modules.items():
+    if _module is None:
+        sys.modules.pop(_name, None)
+    else:
+        sys.modules[_name] = _module
+
 class TestAIIntegration(unittest.IsolatedAsyncioTestCase):
     
     async def test_admin_context_injection(self):
@@ -44,7 +59,7 @@ class TestAIIntegration(unittest.IsolatedAsyncioTestCase):
         # Mocking the query_ollama function inside agent module
         # AND mocking the RAG engine to return "No Match" so we force LLM usage
         with patch('agent.query_ollama', new_callable=AsyncMock) as mock_llm, \
-             patch('ai_engine.engine.AIEngine.analyze_log') as mock_rag:
+             patch('ai_engine.executor.AsyncAIEngine.analyze_log', new_callable=AsyncMock) as mock_rag:
             
             # RAG returns a "Weak Match" (distance 0.8) so we skip Tier 2 and go to Tier 3 (LLM)
             mock_rag.return_value = {
@@ -85,7 +100,7 @@ class TestAIIntegration(unittest.IsolatedAsyncioTestCase):
         )
         
         with patch('agent.query_ollama', new_callable=AsyncMock) as mock_llm, \
-             patch('ai_engine.engine.AIEngine.analyze_log') as mock_rag:
+             patch('ai_engine.executor.AsyncAIEngine.analyze_log', new_callable=AsyncMock) as mock_rag:
              
             mock_rag.return_value = {"distance": 0.8, "document": "log", "metadata": {}}
             mock_llm.return_value = {
@@ -125,7 +140,7 @@ class TestAIIntegration(unittest.IsolatedAsyncioTestCase):
         """
         
         with patch('agent.query_ollama', new_callable=AsyncMock) as mock_llm, \
-             patch('ai_engine.engine.AIEngine.analyze_log') as mock_rag:
+             patch('ai_engine.executor.AsyncAIEngine.analyze_log', new_callable=AsyncMock) as mock_rag:
              
             mock_rag.return_value = {"distance": 0.8, "document": "log", "metadata": {}}
             mock_llm.return_value = {"response": messy_response}
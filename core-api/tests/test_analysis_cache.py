@@ -0,0 +1,54 @@
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from analysis_cache import AnalysisCache, normalize_message
+
+class TestAnalysisCache(unittest.TestCase):
+
+    def test_lru_bound(self):
+        cache = AnalysisCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a") # 'b' is now least recently used
+        cache.set("c", 3)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_ttl_expiry(self):
+        cache = AnalysisCache(max_entries=10, ttl_seconds=30)
+        with patch("analysis_cache.time.monotonic", return_value=1000.0):
+            cache.set("k", "v")
+        with patch("analysis_cache.time.monotonic", return_value=1031.0):
+            self.assertIsNone(cache.get("k"))
+
+        stats = cache.stats()
+        self.assertEqual(stats["expirations"], 1)
+        self.assertEqual(stats["entries"], 0)
+
+    def test_invalidate(self):
+        cache = AnalysisCache()
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.invalidate("a"), 1)
+        self.assertEqual(cache.invalidate(), 1)
+        self.assertEqual(cache.stats()["invalidations"], 2)
+
+    def test_normalized_keys_ignore_variable_fields(self):
+        self.assertEqual(
+            normalize_message("Failed password for root from 10.0.0.5 port 51122"),
+            normalize_message("Failed password for root from 10.0.0.9 port 22")
+        )
+        self.assertNotEqual(
+            normalize_message("Failed password for root"),
+            normalize_message("Failed password for alice")
+        )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import unittest
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from archive import LogArchive, message_matcher, archive_old_logs
+from search import parse_query
+from database import engine, SessionLocal
+from models import Base, Log
+
+def make_rows(day, count, start_id):
+    return [{
+        "id": start_id + i,
+        "source": "web" if i % 2 else "db",
+        "type": "AUTH",
+        "message": f"Failed password for user{start_id + i} from 10.0.0.{i}",
+        "timestamp": day + timedelta(hours=i),
+        "raw_content": {"user": f"user{start_id + i}", "port": 22},
+        "is_threat": i % 3 == 0,
+        "user_name": f"user{start_id + i}"
+    } for i in range(count)]
+
+class TestLogArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.archive = LogArchive(self.tmp.name)
+        self.day1 = datetime(2024, 5, 1, tzinfo=timezone.utc)
+        self.day2 = datetime(2024, 5, 2, tzinfo=timezone.utc)
+        self.archive.write_segment(self.day1, [make_rows(self.day1, 4, 1)])
+        self.archive.write_segment(self.day2, [make_rows(self.day2, 2, 5), make_rows(self.day2 + timedelta(hours=2), 2, 7)])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_manifest_round_trip(self):
+        reloaded = LogArchive(self.tmp.name)
+        self.assertEqual(len(reloaded.segments()), 2)
+        self.assertEqual(reloaded.archived_max_id(self.day2), 8)
+        self.assertEqual(reloaded.newest, self.day2 + timedelta(hours=3))
+
+    def test_query_is_newest_first_with_keyset(self):
+        rows = self.archive.query(3)
+        self.assertEqual([r["id"] for r in rows], [8, 7, 6])
+        rows = self.archive.query(3, before=(rows[-1]["timestamp"], rows[-1]["id"]))
+        self.assertEqual([r["id"] for r in rows], [5, 4, 3])
+        self.assertEqual(rows[0]["raw_content"], {"user": "user5", "port": 22})
+
+    def test_segment_pruning(self):
+        with patch("archive.pq.read_table", wraps=__import__("pyarrow.parquet").parquet.read_table) as read:
+            rows = self.archive.query(10, until=self.day2)
+        self.assertEqual(read.call_count, 1)
+        self.assertEqual([r["id"] for r in rows], [4, 3, 2, 1])
+
+    def test_filters(self):
+        self.assertEqual([r["id"] for r in self.archive.query(10, source="web", is_threat=False)], [8, 6, 2])
+        self.assertEqual([r["id"] for r in self.archive.query(10, fields={"user": "user3", "port": "22"})], [3])
+        self.assertEqual(self.archive.query(10, fields={"port": "23"}), [])
+
+    def test_search_matching(self):
+        rows = self.archive.query(10, match=message_matcher(parse_query('"password for user7" 10.0.0.*')))
+        self.assertEqual([r["id"] for r in rows], [7])
+
+    def test_drop_expired(self):
+        dropped = self.archive.drop_expired(retention_days=1, now=self.day2 + timedelta(hours=12))
+        self.assertEqual(len(dropped), 1)
+        self.assertTrue(dropped[0].startswith("logs-20240501-"))
+        self.assertEqual(len(LogArchive(self.tmp.name).segments()), 1)
+
+    def test_concurrent_writers_share_the_manifest(self):
+        # Two handles on one directory, as the server and `archive.py run` would have
+        other = LogArchive(self.tmp.name)
+        self.assertEqual(len(other.segments()), 2)
+        day3 = self.day2 + timedelta(days=1)
+        first = other.write_segment(day3, [make_rows(day3, 2, 9)])
+        second = self.archive.write_segment(day3, [make_rows(day3 + timedelta(hours=2), 2, 11)])
+        self.assertNotEqual(first["file"], second["file"])
+        for archive in (self.archive, other, LogArchive(self.tmp.name)):
+            self.assertEqual(len(archive.segments()), 4)
+            self.assertEqual(archive.archived_max_id(day3), 12)
+        self.assertEqual([r["id"] for r in other.query(4)], [12, 11, 10, 9])
+
+class TestArchiveOldLogs(unittest.TestCase):
+
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.archive = LogArchive(self.tmp.name)
+        self.day = datetime(2024, 5, 1, tzinfo=timezone.utc)
+        self.now = datetime(2024, 5, 10, tzinfo=timezone.utc)
+        self.db = SessionLocal()
+        self.db.query(Log).delete()
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.query(Log).delete()
+        self.db.commit()
+        self.db.close()
+        self.tmp.cleanup()
+
+    def add(self, *ids):
+        for i in ids:
+            self.db.add(Log(id=i, source="web", type="AUTH", message=f"log {i}", timestamp=self.day + timedelta(hours=i)))
+        self.db.commit()
+
+    def run_archive(self):
+        return archive_old_logs(self.archive, after_days=1, now=self.now)
+
+    def db_ids(self):
+        self.db.expire_all()
+        return sorted(i for (i,) in self.db.query(Log.id))
+
+    def test_row_committed_late_with_a_lower_id_is_kept(self):
+        self.add(1, 2, 3, 6)
+        self.assertEqual([s["rows"] for s in self.run_archive()], [4])
+        self.assertEqual(self.db_ids(), [])
+
+        # id 5 was assigned before 6 but committed after the export
+        self.add(5)
+        self.assertEqual([s["rows"] for s in self.run_archive()], [1])
+        self.assertEqual(self.db_ids(), [])
+        self.assertEqual([r["id"] for r in self.archive.query(10)], [6, 5, 3, 2, 1])
+
+    def test_only_exported_ids_are_deleted(self):
+        self.add(1, 2)
+        exported = set()
+
+        def late_insert(day, batches):
+            # A row commits while the segment is being written
+            segment = LogArchive.write_segment(self.archive, day, batches)
+            other = SessionLocal()
+            other.add(Log(id=3, source="web", type="AUTH", message="late", timestamp=self.day))
+            other.commit()
+            other.close()
+            exported.update(r["id"] for r in self.archive.query(10))
+            return segment
+
+        with patch.object(self.archive, "write_segment", side_effect=late_insert):
+            self.run_archive()
+        self.assertEqual(exported, {1, 2})
+        self.assertEqual(self.db_ids(), [3])
+
+    def test_rows_archived_before_a_crash_are_not_exported_twice(self):
+        self.add(7, 8)
+        # A previous run wrote the segment but died before deleting the rows
+        self.archive.write_segment(self.day, [[
+            {"id": i, "source": "web", "type": "AUTH", "message": f"log {i}", "timestamp": self.day + timedelta(hours=i)}
+            for i in (7, 8)
+        ]])
+        self.add(9)
+
+        self.assertEqual([s["rows"] for s in self.run_archive()], [1])
+        self.assertEqual(self.db_ids(), [])
+        self.assertEqual([r["id"] for r in self.archive.query(10)], [9, 8, 7])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import asyncio
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from collector_supervisor import CollectorSupervisor
+
+class FakeSource:
+    name = "web-01"
+
+class FakeSink:
+    def stats(self):
+        return {"sent": 42, "lines_per_sec": 1.5}
+
+class TestCollectorSupervisor(unittest.IsolatedAsyncioTestCase):
+
+    async def test_restarts_failed_runs_with_backoff(self):
+        runs = []
+
+        async def run(source_id, on_start):
+            on_start(FakeSource(), FakeSink())
+            runs.append(source_id)
+            if len(runs) < 3:
+                raise ConnectionError("connection reset")
+            await asyncio.sleep(3600)
+
+        states = []
+        supervisor = CollectorSupervisor(run=run, backoff=0.01, max_backoff=0.02,
+                                         on_state=lambda source_id, state: states.append(state))
+        self.assertTrue(supervisor.start(7))
+        await asyncio.sleep(0.2)
+
+        status = supervisor.status(7)
+        self.assertEqual(runs, [7, 7, 7])
+        self.assertEqual(status["state"], "running")
+        self.assertEqual(status["restarts"], 2)
+        self.assertEqual(status["last_error"], "ConnectionError: connection reset")
+        self.assertEqual((status["name"], status["lines"], status["lines_per_sec"]), ("web-01", 42, 1.5))
+        self.assertIn("backoff", states)
+
+        self.assertTrue(await supervisor.stop(7))
+        self.assertEqual(supervisor.status(7)["state"], "stopped")
+        self.assertFalse(await supervisor.stop(7))
+
+    async def test_one_task_per_source(self):
+        async def run(source_id, on_start):
+            await asyncio.sleep(3600)
+
+        supervisor = CollectorSupervisor(run=run)
+        self.assertTrue(supervisor.start(1))
+        self.assertFalse(supervisor.start(1))
+        await supervisor.restart(1)
+        self.assertTrue(supervisor.is_running(1))
+        await supervisor.stop_all()
+        self.assertFalse(supervisor.is_running(1))
+
+    async def test_missing_source_is_not_retried(self):
+        calls = []
+
+        async def run(source_id, on_start):
+            calls.append(source_id)
+            raise LookupError(f"Source ID {source_id} not found")
+
+        supervisor = CollectorSupervisor(run=run, backoff=0.01)
+        supervisor.start(99)
+        await asyncio.sleep(0.05)
+        self.assertEqual(calls, [99])
+        self.assertEqual(supervisor.status(99)["state"], "failed")
+
+    async def test_state_is_recorded_off_the_event_loop_in_order(self):
+        recorded = []
+
+        def on_state(source_id, state):
+            time.sleep(0.05) # a slow database write
+            recorded.append((source_id, state))
+
+        async def run(source_id, on_start):
+            on_start(FakeSource(), FakeSink())
+            await asyncio.sleep(3600)
+
+        supervisor = CollectorSupervisor(run=run, on_state=on_state)
+        started = time.monotonic()
+        supervisor.start(3)
+        await asyncio.sleep(0.01)
+        # starting + running are still being written, but the loop was not held up
+        self.assertLess(time.monotonic() - started, 0.05)
+        self.assertEqual(supervisor.status(3)["state"], "running")
+
+        await supervisor.restart(3)
+        await asyncio.sleep(0.01)
+        # stop() returns once every queued state, "stopped" last, is stored
+        await supervisor.stop(3)
+        self.assertEqual([state for _, state in recorded],
+                         ["starting", "running", "stopped", "starting", "running", "stopped"])
+
+    def test_backoff_grows_and_is_capped(self):
+        supervisor = CollectorSupervisor(run=None, backoff=1, max_backoff=8)
+        for failures, ceiling in ((1, 1), (2, 2), (3, 4), (10, 8)):
+            delay = supervisor._delay(failures)
+            self.assertTrue(ceiling / 2 <= delay <= ceiling)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import sys
+import os
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database import get_async_db, async_metrics
+from main import get_db_stats
+
+async def _execute(statement):
+    sessions = get_async_db()
+    db = await sessions.__anext__()
+    try:
+        return (await db.execute(text(statement))).scalar()
+    finally:
+        await sessions.aclose()
+
+class TestAsyncDatabase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        # The first connection runs dialect setup queries; keep them out of the deltas
+        await _execute("SELECT 1")
+
+    async def test_session_is_counted_in_db_stats(self):
+        before = get_db_stats()["async"]
+        self.assertEqual(await _execute("SELECT 41 + 1"), 42)
+        after = get_db_stats()["async"]
+
+        self.assertEqual(after["queries"], before["queries"] + 1)
+        self.assertEqual(after["checkouts"], before["checkouts"] + 1)
+        self.assertEqual(after["checkins"], before["checkins"] + 1)
+        self.assertGreater(after["query_ms"]["max"], 0)
+
+    async def test_failed_statement_is_not_timed(self):
+        before = get_db_stats()["async"]
+        with self.assertRaises(OperationalError):
+            await _execute("SELECT * FROM no_such_table")
+        self.assertEqual(await _execute("SELECT 1"), 1)
+        after = get_db_stats()["async"]
+
+        self.assertEqual(after["queries"], before["queries"] + 1)
+        self.assertEqual(after["checkins"] - before["checkins"], 2)
+
+    async def test_slow_queries_are_listed(self):
+        threshold = async_metrics.slow_query_ms
+        async_metrics.slow_query_ms = 0
+        try:
+            before = get_db_stats()["async"]["slow_queries"]
+            await _execute("SELECT 'slow one'")
+        finally:
+            async_metrics.slow_query_ms = threshold
+        stats = get_db_stats()["async"]
+
+        self.assertEqual(stats["slow_queries"], before + 1)
+        self.assertEqual(stats["recent_slow"][-1]["statement"], "SELECT 'slow one'")
+
+if __name__ == '__main__':
+    unittest.main()
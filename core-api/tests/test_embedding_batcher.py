@@ -0,0 +1,118 @@
+import asyncio
+import unittest
+import sys
+import os
+import threading
+from unittest.mock import MagicMock
+
+# The batcher only needs an object with embed_batch(); block the real model
+sys.modules['sentence_transformers'] = MagicMock()
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from ai_engine.embedding import MicroBatchEmbedder
+from ai_engine.executor import AsyncAIEngine
+
+class FakeEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def embed_batch(self, texts, batch_size=64):
+        self.calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+class FakeEngine:
+    def __init__(self, embedder):
+        self.embedder = embedder
+
+    def analyze_log(self, log_text, vector=None):
+        return vector
+
+class TestMicroBatchEmbedder(unittest.TestCase):
+
+    def test_concurrent_calls_share_one_encode(self):
+        """
+        Texts submitted inside the latency window are encoded together and
+        every caller gets its own vector back.
+        """
+        fake = FakeEmbedder()
+        batcher = MicroBatchEmbedder(fake, max_batch_size=8, max_wait_ms=200)
+
+        texts = [f"log {'x' * i}" for i in range(8)]
+        futures = [batcher.submit(t) for t in texts]
+        results = [f.result(timeout=5) for f in futures]
+
+        self.assertEqual(results, [[float(len(t))] for t in texts])
+        self.assertEqual(len(fake.calls), 1)
+        self.assertEqual(batcher.stats()["max_batch_size_seen"], 8)
+
+    def test_batch_size_cap(self):
+        fake = FakeEmbedder()
+        batcher = MicroBatchEmbedder(fake, max_batch_size=3, max_wait_ms=200)
+
+        futures = [batcher.submit(str(i)) for i in range(7)]
+        for f in futures:
+            f.result(timeout=5)
+
+        self.assertTrue(all(len(call) <= 3 for call in fake.calls))
+        self.assertEqual(sum(len(call) for call in fake.calls), 7)
+
+    def test_errors_propagate_to_callers(self):
+        broken = MagicMock()
+        broken.embed_batch.side_effect = RuntimeError("model crashed")
+        batcher = MicroBatchEmbedder(broken, max_batch_size=4, max_wait_ms=1)
+
+        with self.assertRaises(RuntimeError):
+            batcher.embed("failed password for root")
+
+    def test_threads_blocking_on_embed(self):
+        fake = FakeEmbedder()
+        batcher = MicroBatchEmbedder(fake, max_batch_size=16, max_wait_ms=50)
+        results = {}
+
+        def worker(i):
+            results[i] = batcher.embed("a" * i)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=5)
+
+        self.assertEqual(results, {i: [float(i)] for i in range(10)})
+        self.assertLess(len(fake.calls), 10)
+
+    def test_more_callers_than_workers_share_one_encode(self):
+        """
+        analyze_log waits for its vector on the event loop, so the merge is
+        not capped at the executor's worker count.
+        """
+        fake = FakeEmbedder()
+        batcher = MicroBatchEmbedder(fake, max_batch_size=64, max_wait_ms=200)
+        engine = AsyncAIEngine(FakeEngine(batcher), max_workers=2)
+
+        async def main():
+            texts = ["b" * i for i in range(1, 17)]
+            return await asyncio.gather(*(engine.analyze_log(t) for t in texts))
+
+        try:
+            results = asyncio.run(main())
+        finally:
+            engine.shutdown()
+
+        self.assertEqual(results, [[float(i)] for i in range(1, 17)])
+        self.assertEqual(len(fake.calls), 1)
+        self.assertEqual(len(fake.calls[0]), 16)
+
+    def test_short_embedder_output_fails_every_caller(self):
+        fake = FakeEmbedder()
+        fake.embed_batch = lambda texts, batch_size=64: texts[1:]
+        batcher = MicroBatchEmbedder(fake, max_batch_size=4, max_wait_ms=50)
+
+        futures = [batcher.submit(str(i)) for i in range(3)]
+        for f in futures:
+            with self.assertRaises(RuntimeError):
+                f.result(timeout=5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import asyncio
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fold import LogFolder, parse_windows
+
+BASE = datetime(2024, 5, 1, 13, 0, tzinfo=timezone.utc)
+
+def row(message, seconds=0, source="sshd"):
+    return {"source": source, "type": "AUTH", "message": message, "timestamp": BASE + timedelta(seconds=seconds)}
+
+class TestLogFolder(unittest.TestCase):
+
+    def test_parse_windows(self):
+        self.assertEqual(parse_windows("nginx=30, cron=300"), {"nginx": 30.0, "cron": 300.0})
+        self.assertEqual(parse_windows(""), {})
+        with self.assertRaises(ValueError):
+            parse_windows("nginx")
+
+    def test_same_template_folds_into_one_row(self):
+        folder = LogFolder(emit=None, windows={"sshd": 10})
+        ready = folder.add([
+            row("Failed password for root from 10.0.0.1 port 4242", 5),
+            row("Failed password for root from 10.0.0.2 port 5151", 1),
+            row("Failed password for root from 10.0.0.3 port 6161", 9),
+            row("Accepted publickey for deploy", 2),
+            row("GET /health 200", 3, source="nginx")
+        ])
+        # nginx has no window and is written straight away
+        self.assertEqual([r["message"] for r in ready], ["GET /health 200"])
+
+        groups = sorted(folder.expire(now=float("inf")), key=lambda r: r["occurrences"])
+        self.assertEqual([g["occurrences"] for g in groups], [1, 3])
+        failed = groups[1]
+        self.assertEqual(failed["message"], "Failed password for root from 10.0.0.1 port 4242")
+        self.assertEqual(failed["first_seen"], BASE + timedelta(seconds=1))
+        self.assertEqual(failed["last_seen"], BASE + timedelta(seconds=9))
+        self.assertEqual(failed["timestamp"], failed["first_seen"])
+        self.assertEqual(folder.stats()["open_groups"], 0)
+
+    def test_exact_mode_keeps_different_values_apart(self):
+        folder = LogFolder(emit=None, default_window=10, mode="exact")
+        folder.add([row("login from 10.0.0.1"), row("login from 10.0.0.2"), row("login from 10.0.0.1")])
+        self.assertEqual(sorted(g["occurrences"] for g in folder.expire(now=float("inf"))), [1, 2])
+
+    def test_groups_close_after_their_window(self):
+        folder = LogFolder(emit=None, windows={"sshd": 10})
+        folder.add([row("cron job ran")])
+        self.assertEqual(folder.expire(), [])
+        self.assertEqual(len(folder.expire(now=float("inf"))), 1)
+
+    def test_max_groups_forces_oldest_out(self):
+        folder = LogFolder(emit=None, default_window=10, mode="exact", max_groups=2)
+        ready = folder.add([row("a"), row("b"), row("c")])
+        self.assertEqual([r["message"] for r in ready], ["a"])
+        self.assertEqual(folder.stats()["forced"], 1)
+
+    def test_fold_batch_maps_every_row_to_its_group(self):
+        folder = LogFolder(emit=None, windows={"sshd": 10})
+        rows = [row("Failed password from 10.0.0.1"), row("ok", source="nginx"), row("Failed password from 10.0.0.9")]
+        folded, index = folder.fold_batch(rows)
+        self.assertEqual(len(folded), 2)
+        self.assertEqual(index, [0, 1, 0])
+        self.assertEqual(folded[0]["occurrences"], 2)
+        self.assertNotIn("occurrences", folded[1])
+
+    def test_naive_and_aware_timestamps_fold_together(self):
+        # Collectors send naive UTC, other clients "Z"
+        folder = LogFolder(emit=None, windows={"sshd": 10})
+        naive = {**row("Failed password from 10.0.0.1", 4), "timestamp": BASE.replace(tzinfo=None) + timedelta(seconds=4)}
+        folded, index = folder.fold_batch([row("Failed password from 10.0.0.2", 7), naive,
+                                           row("Failed password from 10.0.0.3", 2)])
+        self.assertEqual(index, [0, 0, 0])
+        self.assertEqual(folded[0]["first_seen"], BASE + timedelta(seconds=2))
+        self.assertEqual(folded[0]["last_seen"], BASE + timedelta(seconds=7))
+
+    def test_stop_emits_open_groups(self):
+        written = []
+
+        async def emit(rows):
+            written.extend(rows)
+
+        async def run():
+            folder = LogFolder(emit=emit, default_window=60)
+            await folder.start()
+            folder.add([row("x"), row("x")])
+            await folder.stop()
+
+        asyncio.run(run())
+        self.assertEqual([r["occurrences"] for r in written], [2])
+
+class TestFoldedWrites(unittest.IsolatedAsyncioTestCase):
+
+    async def test_expired_groups_are_retried(self):
+        written, attempts = [], []
+
+        async def emit(rows):
+            attempts.append(len(rows))
+            if len(attempts) == 1:
+                raise RuntimeError("database is locked")
+            written.extend(rows)
+
+        folder = LogFolder(emit=emit, windows={"sshd": 10}, retries=1, retry_delay=0)
+        folder.add([row("Failed password for root from 10.0.0.1"), row("Failed password for root from 10.0.0.2")])
+        await folder.stop()
+
+        self.assertEqual(attempts, [1, 1])
+        self.assertEqual([r["occurrences"] for r in written], [2])
+        stats = folder.stats()
+        self.assertEqual((stats["retried"], stats["failed"]), (1, 0))
+
+    async def test_groups_are_discarded_after_their_retries(self):
+        async def emit(rows):
+            raise RuntimeError("database is down")
+
+        folder = LogFolder(emit=emit, windows={"sshd": 10}, retries=2, retry_delay=0)
+        folder.add([row("Failed password for root"), row("Accepted publickey for deploy")])
+        await folder.stop()
+
+        stats = folder.stats()
+        self.assertEqual((stats["retried"], stats["failed"], stats["open_groups"]), (2, 2, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+import asyncio
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from forwarder import BatchForwarder
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        if self.body is None:
+            raise ValueError("No JSON body")
+        return self.body
+
+class FakeClient:
+    """
+    Records POSTed batches; `statuses` are returned in order (exceptions are
+    raised, (status, body) pairs carry a JSON body, callables get the records).
+    """
+    def __init__(self, statuses=None):
+        self.statuses = list(statuses or [])
+        self.batches = []
+
+    async def post(self, path, json):
+        status = self.statuses.pop(0) if self.statuses else 200
+        if callable(status):
+            status = status(json)
+        if isinstance(status, Exception):
+            raise status
+        status, body = status if isinstance(status, tuple) else (status, None)
+        if status < 300:
+            self.batches.append((path, json))
+        return FakeResponse(status, body)
+
+def record(i):
+    return {"source": "web", "timestamp": "2024-05-01T13:00:00", "message": f"line {i}", "type": "INFO"}
+
+class TestBatchForwarder(unittest.IsolatedAsyncioTestCase):
+
+    async def test_batches_by_size_and_flushes_on_close(self):
+        client = FakeClient()
+        forwarder = BatchForwarder("web", client=client, batch_size=4, flush_interval=60, backoff=0)
+        await forwarder.start()
+        for i in range(10):
+            await forwarder.send(record(i))
+        await forwarder.close()
+
+        self.assertEqual([len(batch) for _, batch in client.batches], [4, 4, 2])
+        self.assertEqual({path for path, _ in client.batches}, {"/ingest/logs/batch"})
+        self.assertEqual([r["message"] for _, batch in client.batches for r in batch], [f"line {i}" for i in range(10)])
+        stats = forwarder.stats()
+        self.assertEqual((stats["sent"], stats["failed"], stats["batches"], stats["buffered"]), (10, 0, 3, 0))
+
+    async def test_flushes_on_interval(self):
+        client = FakeClient()
+        forwarder = BatchForwarder("web", client=client, batch_size=100, flush_interval=0.05)
+        await forwarder.start()
+        await forwarder.send(record(0))
+        await asyncio.sleep(0.2)
+        self.assertEqual(len(client.batches), 1)
+        await forwarder.close()
+
+    async def test_retries_transient_failures(self):
+        client = FakeClient([503, ConnectionError("refused"), 200])
+        forwarder = BatchForwarder("web", client=client, batch_size=2, backoff=0)
+        await forwarder.start()
+        await forwarder.send(record(0))
+        await forwarder.send(record(1))
+        await forwarder.close()
+
+        stats = forwarder.stats()
+        self.assertEqual((stats["sent"], stats["retries"], stats["failed"]), (2, 2, 0))
+
+    async def test_gives_up_on_rejected_batch(self):
+        client = FakeClient([422])
+        forwarder = BatchForwarder("web", client=client, batch_size=1, backoff=0)
+        await forwarder.start()
+        await forwarder.send(record(0))
+        await forwarder.close()
+
+        stats = forwarder.stats()
+        self.assertEqual((stats["sent"], stats["retries"], stats["failed"]), (0, 0, 1))
+        self.assertEqual(stats["last_error"], "HTTP 422")
+
+    async def test_rejected_record_is_dropped_alone(self):
+        client = FakeClient([(422, {"detail": "Invalid timestamp in log 2: bad"}), 200])
+        forwarder = BatchForwarder("web", client=client, batch_size=5, backoff=0)
+        await forwarder.start()
+        for i in range(5):
+            await forwarder.send(record(i))
+        await forwarder.close()
+
+        self.assertEqual([r["message"] for _, batch in client.batches for r in batch],
+                         ["line 0", "line 1", "line 3", "line 4"])
+        self.assertEqual((forwarder.sent, forwarder.failed), (4, 1))
+
+    async def test_validation_errors_name_records(self):
+        detail = [{"loc": ["body", 1, "message"], "msg": "Field required"},
+                  {"loc": ["body", 3, "source"], "msg": "Field required"}]
+        client = FakeClient([(422, {"detail": detail})])
+        forwarder = BatchForwarder("web", client=client, batch_size=4, backoff=0)
+        await forwarder.start()
+        for i in range(4):
+            await forwarder.send(record(i))
+        await forwarder.close()
+
+        self.assertEqual([r["message"] for _, batch in client.batches for r in batch], ["line 0", "line 2"])
+        self.assertEqual((forwarder.sent, forwarder.failed), (2, 2))
+
+    async def test_rejection_without_detail_is_bisected(self):
+        def reject_line_5(records):
+            return 400 if any(r["message"] == "line 5" for r in records) else 200
+
+        client = FakeClient([reject_line_5] * 20)
+        forwarder = BatchForwarder("web", client=client, batch_size=8, backoff=0)
+        await forwarder.start()
+        for i in range(8):
+            await forwarder.send(record(i))
+        await forwarder.close()
+
+        self.assertEqual([r["message"] for _, batch in client.batches for r in batch],
+                         [f"line {i}" for i in range(8) if i != 5])
+        self.assertEqual((forwarder.sent, forwarder.failed, forwarder.retries), (7, 1, 0))
+
+    async def test_full_buffer_applies_backpressure(self):
+        forwarder = BatchForwarder("web", client=FakeClient(), batch_size=2, max_buffer=2)
+        await forwarder.send(record(0))
+        await forwarder.send(record(1))
+        # Not started: nothing drains the buffer, so the next send has to wait
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(forwarder.send(record(2)), timeout=0.05)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import sys
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hot_window import HotWindow
+
+START = datetime(2024, 5, 1, 13, 0, tzinfo=timezone.utc)
+COLUMNS = ["id", "source", "type", "message", "timestamp", "received_at", "is_threat", "occurrences"]
+
+def rows(count, source="web", threat_every=0, offset=0):
+    return [{
+        "source": source,
+        "type": "AUTH",
+        "message": f"line {i}",
+        "timestamp": START + timedelta(seconds=offset + i),
+        "is_threat": bool(threat_every and i % threat_every == 0)
+    } for i in range(count)]
+
+class TestHotWindow(unittest.TestCase):
+
+    def setUp(self):
+        self.window = HotWindow(window_seconds=600, capacity=100, now=START, columns=COLUMNS)
+
+    def test_latest_page_newest_first(self):
+        self.window.add(rows(10), list(range(1, 11)))
+        page = self.window.page(3)
+        self.assertEqual([r["id"] for r in page], [10, 9, 8, 7])
+        self.assertEqual(page[0]["occurrences"], 1)
+
+        # Continue from the cursor position of the third row
+        page = self.window.page(3, before=(page[2]["timestamp"], page[2]["id"]))
+        self.assertEqual([r["id"] for r in page], [7, 6, 5, 4])
+
+    def test_too_few_rows_falls_back_to_database(self):
+        self.window.add(rows(3), [1, 2, 3])
+        self.assertIsNone(self.window.page(5))
+        self.assertIsNone(self.window.page(5, source="never-seen"))
+        # ...unless the requested range starts after the horizon
+        self.assertEqual(len(self.window.page(5, since=START + timedelta(seconds=1))), 2)
+
+    def test_filters(self):
+        self.window.add(rows(10, threat_every=2) + rows(5, source="db", offset=20), list(range(1, 16)))
+        self.assertEqual([r["id"] for r in self.window.page(2, source="db")], [15, 14, 13])
+        self.assertEqual([r["id"] for r in self.window.page(2, is_threat=True)], [9, 7, 5])
+
+    def test_eviction_moves_horizon(self):
+        window = HotWindow(window_seconds=600, capacity=5, now=START, columns=COLUMNS)
+        window.add(rows(8), list(range(1, 9)))
+        # Rows 1-3 were evicted, so only rows after the third timestamp are known complete
+        self.assertEqual([r["id"] for r in window.page(4)], [8, 7, 6, 5, 4])
+        self.assertIsNone(window.page(5))
+        self.assertIsNone(window.totals(START, START + timedelta(minutes=1)))
+
+    def test_age_trim(self):
+        window = HotWindow(window_seconds=60, capacity=100, now=START, columns=COLUMNS)
+        now = time.monotonic()
+        window.add(rows(3), [1, 2, 3], now=now - 100)
+        window.add(rows(2, offset=10), [4, 5], now=now)
+        self.assertEqual(window.stats()["rows"], 2)
+
+    def test_totals_and_traffic(self):
+        batch = rows(90, threat_every=3)
+        batch[0]["occurrences"] = 10
+        self.window.add(batch, list(range(1, 91)))
+        since = START + timedelta(microseconds=1)
+        totals = self.window.totals(since, START + timedelta(hours=1))
+        self.assertEqual(totals, {"sources": 1, "total": 89, "threats": 29})
+
+        traffic = self.window.traffic(START + timedelta(seconds=61), START + timedelta(hours=1))
+        self.assertEqual(len(traffic), 1)
+        self.assertEqual(traffic[0]["bucket"], START + timedelta(minutes=1))
+        self.assertEqual((traffic[0]["total"], traffic[0]["blocked"]), (30, 10))
+        # The first minute starts at the horizon, so the rollups have to answer
+        self.assertIsNone(self.window.traffic(since, START + timedelta(hours=1)))
+
+if __name__ == '__main__':
+    unittest.main()
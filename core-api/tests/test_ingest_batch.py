@@ -0,0 +1,103 @@
+import unittest
+import sys
+import os
+from unittest.mock import AsyncMock, patch
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.sql.compiler import InsertmanyvaluesSentinelOpts
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import log_store
+from database import engine, SessionLocal
+from models import Base, Log, LogRollup
+from hot_window import HotWindow
+from ingest import LogEntry, ingest_logs_batch
+
+def entry(i, timestamp=None):
+    return LogEntry(source="web", type="AUTH", message=f"line {i}",
+                    timestamp=timestamp or f"2024-05-01T13:{59 - i:02d}:00Z", content={"user": f"user{i}"})
+
+class TestIngestBatch(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+        self.clear()
+        # No AI engine (rows keep the default verdict) and no shared hot window
+        self.patches = [
+            patch("ingest.get_ai_engine", AsyncMock(return_value=None)),
+            patch("ingest.hot_window", HotWindow(window_seconds=0))
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.clear()
+        self.db.close()
+
+    def clear(self):
+        self.db.query(Log).delete()
+        self.db.query(LogRollup).delete()
+        self.db.commit()
+
+    def stored(self):
+        self.db.expire_all()
+        return {log.id: log for log in self.db.query(Log)}
+
+    async def test_ids_follow_item_order(self):
+        # Timestamps run backwards so neither time nor id order can be mistaken for item order
+        body = await ingest_logs_batch([entry(i) for i in range(6)])
+        self.assertEqual(body["count"], 6)
+
+        stored = self.stored()
+        ids = [r["id"] for r in body["results"]]
+        self.assertEqual(len(set(ids)), 6)
+        self.assertEqual([stored[i].message for i in ids], [f"line {i}" for i in range(6)])
+        self.assertEqual([stored[i].user_name for i in ids], [f"user{i}" for i in range(6)])
+        self.assertEqual([r["is_threat"] for r in body["results"]], [False] * 6)
+
+    async def test_oversized_batch_is_rejected(self):
+        with patch("ingest.MAX_BATCH_SIZE", 3):
+            with self.assertRaises(HTTPException) as raised:
+                await ingest_logs_batch([entry(i) for i in range(4)])
+            self.assertEqual(raised.exception.status_code, 413)
+            self.assertEqual(len((await ingest_logs_batch([entry(i) for i in range(3)]))["results"]), 3)
+
+    async def test_bad_timestamp_reports_its_index(self):
+        logs = [entry(0), entry(1), entry(2, timestamp="yesterday"), entry(3)]
+        with self.assertRaises(HTTPException) as raised:
+            await ingest_logs_batch(logs)
+        self.assertEqual(raised.exception.status_code, 422)
+        self.assertIn("log 2", raised.exception.detail)
+        # Nothing from a rejected batch is written
+        self.assertEqual(self.stored(), {})
+
+    def test_insert_logs_splits_at_the_row_limit(self):
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("INSERT INTO LOGS"):
+                statements.append(statement)
+
+        rows = [{"source": "web", "type": "AUTH", "message": f"line {i}"} for i in range(7)]
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            # SQLAlchemy only batches an ordered INSERT ... RETURNING when it can
+            # sort by the autoincrement id, which it assumes on Postgres but not
+            # on SQLite (it falls back to one row per statement there)
+            with patch.object(log_store, "MAX_ROWS_PER_INSERT", 3), \
+                 patch.object(engine.dialect, "insertmanyvalues_implicit_sentinel",
+                              InsertmanyvaluesSentinelOpts.ANY_AUTOINCREMENT):
+                ids = log_store.insert_logs(self.db, rows)
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+
+        self.assertEqual(len(statements), 3) # 3 + 3 + 1 rows
+        stored = self.stored()
+        self.assertEqual([stored[i].message for i in ids], [f"line {i}" for i in range(7)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import asyncio
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ingest_queue import WriteBehindQueue
+
+class Recorder:
+    """
+    Flush target that records batches; the first `failures` calls raise.
+    """
+    def __init__(self, failures=0, gate=None):
+        self.failures = failures
+        self.gate = gate
+        self.calls = 0
+        self.batches = []
+
+    async def __call__(self, batch):
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database unavailable")
+        self.batches.append(list(batch))
+
+class TestWriteBehindQueue(unittest.IsolatedAsyncioTestCase):
+
+    async def test_full_batches_flush_without_waiting_for_the_interval(self):
+        flush = Recorder()
+        queue = WriteBehindQueue(flush, batch_size=3, flush_interval=0.5, workers=1)
+        await queue.start()
+        for i in range(6):
+            self.assertTrue(queue.submit(i))
+        await asyncio.sleep(0.05)
+        self.assertEqual(flush.batches, [[0, 1, 2], [3, 4, 5]])
+        await queue.stop()
+
+    async def test_partial_batch_flushes_after_the_interval(self):
+        flush = Recorder()
+        queue = WriteBehindQueue(flush, batch_size=100, flush_interval=0.05, workers=1)
+        await queue.start()
+        queue.submit("a")
+        queue.submit("b")
+        await asyncio.sleep(0.01)
+        self.assertEqual(flush.batches, [])
+        await asyncio.sleep(0.1)
+        self.assertEqual(flush.batches, [["a", "b"]])
+        await queue.stop()
+
+    async def test_put_waits_for_space(self):
+        gate = asyncio.Event()
+        queue = WriteBehindQueue(Recorder(gate=gate), maxsize=2, batch_size=1, flush_interval=0.01, workers=1)
+        await queue.start()
+        # One item is held by the blocked worker, two fill the queue
+        for i in range(3):
+            await queue.put(i)
+            await asyncio.sleep(0.01)
+        blocked = asyncio.create_task(queue.put(3))
+        await asyncio.sleep(0.05)
+        self.assertFalse(blocked.done())
+        self.assertFalse(queue.submit(4))
+        gate.set()
+        self.assertTrue(await asyncio.wait_for(blocked, 1))
+        await queue.stop()
+        self.assertEqual((queue.flushed, queue.dropped), (4, 1))
+
+    async def test_stop_drains_the_queue(self):
+        flush = Recorder()
+        queue = WriteBehindQueue(flush, batch_size=4, flush_interval=0.2, workers=2)
+        await queue.start()
+        for i in range(10):
+            queue.submit(i)
+        await queue.stop()
+        self.assertEqual(sorted(i for batch in flush.batches for i in batch), list(range(10)))
+        self.assertFalse(queue.running)
+        self.assertFalse(queue.submit(10))
+        self.assertFalse(await queue.put(11))
+        self.assertEqual(queue.dropped, 2)
+
+    async def test_failed_flush_is_retried(self):
+        flush = Recorder(failures=1)
+        queue = WriteBehindQueue(flush, batch_size=2, flush_interval=0.01, workers=1, retries=1, retry_delay=0)
+        await queue.start()
+        queue.submit("a")
+        queue.submit("b")
+        await queue.stop()
+        self.assertEqual(flush.batches, [["a", "b"]])
+        stats = queue.stats()
+        self.assertEqual((stats["flushed"], stats["failed"], stats["retried"]), (2, 0, 1))
+
+    async def test_batch_is_discarded_after_its_retries(self):
+        flush = Recorder(failures=5)
+        queue = WriteBehindQueue(flush, batch_size=2, flush_interval=0.01, workers=1, retries=2, retry_delay=0)
+        await queue.start()
+        queue.submit("a")
+        queue.submit("b")
+        await queue.stop()
+        self.assertEqual(flush.calls, 3)
+        self.assertEqual((queue.flushed, queue.failed, queue.retried), (0, 2, 2))
+
+    async def test_prepare_runs_once_per_batch(self):
+        prepared = []
+
+        def prepare(batch):
+            prepared.append(list(batch))
+            return [item for item in batch if item != "held"]
+
+        flush = Recorder(failures=1)
+        queue = WriteBehindQueue(flush, prepare=prepare, batch_size=3, flush_interval=0.01, workers=1,
+                                 retries=1, retry_delay=0)
+        await queue.start()
+        for item in ("a", "held", "b"):
+            queue.submit(item)
+        await queue.stop()
+        self.assertEqual(prepared, [["a", "held", "b"]])
+        self.assertEqual(flush.batches, [["a", "b"]])
+
+if __name__ == '__main__':
+    unittest.main()
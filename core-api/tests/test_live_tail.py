@@ -0,0 +1,67 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from live_tail import LiveTailBroker, SEVERITY
+
+def log(source="web", type="INFO", is_threat=False, message="hello"):
+    return {"id": 1, "source": source, "type": type, "message": message, "is_threat": is_threat}
+
+class TestLiveTail(unittest.TestCase):
+
+    def test_filters(self):
+        async def run():
+            broker = LiveTailBroker()
+            everything = broker.subscribe()
+            web_warnings = broker.subscribe(sources=["web"], min_severity=SEVERITY["WARNING"])
+            threats = broker.subscribe(threats_only=True, kinds=["log"])
+
+            broker.publish_logs([log(), log(type="ERROR"), log(source="db", type="ERROR", is_threat=True)])
+            broker.publish_notification({"type": "Critical", "message": "Threat Detected"})
+
+            counts = [len(await s.next_frames(0.1)) for s in (everything, web_warnings, threats)]
+            self.assertEqual(counts, [4, 2, 1])
+
+        asyncio.run(run())
+
+    def test_payload_serialized_once_and_shared(self):
+        async def run():
+            broker = LiveTailBroker()
+            first, second = broker.subscribe(), broker.subscribe()
+            broker.publish_logs([log(message="shared")])
+            frame_a, = await first.next_frames(0.1)
+            frame_b, = await second.next_frames(0.1)
+            self.assertIs(frame_a, frame_b)
+            event, data = frame_a.decode().strip().split("\n")
+            self.assertEqual(event, "event: log")
+            self.assertEqual(json.loads(data[len("data: "):])["message"], "shared")
+
+        asyncio.run(run())
+
+    def test_slow_consumer_drops_oldest(self):
+        async def run():
+            broker = LiveTailBroker()
+            slow = broker.subscribe(maxlen=3)
+            broker.publish_logs([log(message=f"m{i}") for i in range(5)])
+            frames = await slow.next_frames(0.1)
+            self.assertEqual([json.loads(f.decode().split("data: ")[1])["message"] for f in frames], ["m2", "m3", "m4"])
+            self.assertEqual(slow.dropped, 2)
+            self.assertEqual(await slow.next_frames(0.01), [])
+
+            broker.unsubscribe(slow)
+            self.assertEqual(broker.stats()["dropped"], 2)
+            self.assertEqual(broker.stats()["subscribers"], 0)
+
+        asyncio.run(run())
+
+    def test_subscriber_limit(self):
+        broker = LiveTailBroker(max_subscribers=1)
+        self.assertIsNotNone(broker.subscribe())
+        self.assertIsNone(broker.subscribe())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import sys
+import os
+from datetime import datetime, timezone
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from local_ingest import LocalIngestSink
+
+class FakeQueue:
+    def __init__(self, running=True):
+        self.running = running
+        self.rows = []
+
+    async def put(self, row):
+        if not self.running:
+            return False
+        self.rows.append(row)
+        return True
+
+class TestLocalIngestSink(unittest.IsolatedAsyncioTestCase):
+
+    async def test_records_become_log_rows(self):
+        queue = FakeQueue()
+        sink = LocalIngestSink("web-01", queue=queue)
+        await sink.start()
+        await sink.send({"source": "web-01", "timestamp": "2024-05-01T13:00:00Z",
+                         "message": "Failed password for root", "type": "AUTH",
+                         "content": {"ip": "10.0.0.1"}})
+        await sink.close()
+
+        row, = queue.rows
+        self.assertEqual(row["source"], "web-01")
+        self.assertEqual(row["type"], "AUTH")
+        self.assertEqual(row["timestamp"], datetime(2024, 5, 1, 13, 0, tzinfo=timezone.utc))
+        self.assertEqual(row["ip_address"], "10.0.0.1")
+        self.assertEqual(sink.stats()["sent"], 1)
+
+    async def test_bad_records_and_stopped_queue_are_counted(self):
+        sink = LocalIngestSink("web-01", queue=FakeQueue(running=False))
+        await sink.send({"source": "web-01", "message": "x", "timestamp": "not a date"})
+        await sink.send({"source": "web-01", "message": "y"})
+        stats = sink.stats()
+        self.assertEqual((stats["received"], stats["sent"], stats["failed"]), (2, 0, 2))
+        self.assertEqual(stats["last_error"], "Ingest queue is not running")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from fastapi import HTTPException, Response
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from log_store import encode_cursor, decode_cursor, insert_logs
+from archive import LogArchive
+from hot_window import HotWindow
+from database import engine, SessionLocal, AsyncSessionLocal
+from models import Base, Log, LogRollup
+from ingest import get_logs
+
+class TestLogCursor(unittest.TestCase):
+
+    def test_round_trip(self):
+        timestamp = datetime(2024, 5, 1, 13, 47, 12, 123456, tzinfo=timezone.utc)
+        cursor = encode_cursor(timestamp, 42)
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decode_cursor(cursor), (timestamp, 42))
+
+    def test_malformed_cursor(self):
+        for cursor in ("not-a-cursor", encode_cursor(datetime(2024, 1, 1), 1)[:-3]):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+DAY1 = datetime(2024, 5, 1, tzinfo=timezone.utc)
+DAY2 = datetime(2024, 5, 2, tzinfo=timezone.utc)
+
+def log(log_id, timestamp):
+    return {"id": log_id, "source": "web", "type": "AUTH", "message": f"line {log_id}", "timestamp": timestamp,
+            "is_threat": False, "occurrences": 1}
+
+def row_id(row):
+    return row["id"] if isinstance(row, dict) else row.id
+
+class TestPageLogs(unittest.IsolatedAsyncioTestCase):
+    """
+    GET /ingest/logs over all three tiers: ids 9-12 are in the hot window,
+    5-12 in the database and 1-4 only in the archive.
+    """
+
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.archive = LogArchive(self.tmp.name)
+        self.archive.write_segment(DAY1, [[log(i, DAY1 + timedelta(hours=9 + i)) for i in range(1, 5)]])
+
+        noon = DAY2 + timedelta(hours=12)
+        # 5-8 share a timestamp, as do 10 and 11
+        rows = [log(i, noon) for i in range(5, 9)] + [
+            log(9, noon + timedelta(minutes=30)),
+            log(10, noon + timedelta(hours=1)), log(11, noon + timedelta(hours=1)),
+            log(12, noon + timedelta(hours=1, minutes=30))
+        ]
+        self.db = SessionLocal()
+        self.clear()
+        insert_logs(self.db, [dict(r) for r in rows])
+
+        self.hot = HotWindow(window_seconds=3600, capacity=100, now=noon + timedelta(minutes=15))
+        self.hot.add(rows[4:], [r["id"] for r in rows[4:]])
+        self.patches = [patch("log_store.hot_window", self.hot), patch("log_store.log_archive", self.archive)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.clear()
+        self.db.close()
+        self.tmp.cleanup()
+
+    def clear(self):
+        self.db.query(Log).delete()
+        self.db.query(LogRollup).delete()
+        self.db.commit()
+
+    async def fetch(self, cursor=None, limit=3):
+        response = Response()
+        async with AsyncSessionLocal() as db:
+            rows = await get_logs(response, limit=limit, cursor=cursor, field=[], db=db)
+        return rows, response.headers.get("X-Next-Cursor")
+
+    async def test_walk_every_page(self):
+        pages, cursor = [], None
+        while True:
+            rows, cursor = await self.fetch(cursor)
+            pages.append(rows)
+            if cursor is None:
+                break
+
+        self.assertEqual([[row_id(r) for r in page] for page in pages],
+                         [[12, 11, 10], [9, 8, 7], [6, 5, 4], [3, 2, 1]])
+        # Hot window first, then the database, then the database merged with the archive
+        self.assertEqual(self.hot.hits, 1)
+        self.assertTrue(all(isinstance(r, dict) and "archived" not in r for r in pages[0]))
+        self.assertTrue(all(isinstance(r, Log) for r in pages[1]))
+        self.assertEqual([isinstance(r, Log) for r in pages[2]], [True, True, False])
+        self.assertTrue(all(r["archived"] for r in pages[3]))
+
+    async def test_ties_split_across_pages(self):
+        # Page boundaries inside the 5-8 tie, with every page size
+        for limit in (1, 2, 3, 5):
+            ids, cursor = [], None
+            while True:
+                rows, cursor = await self.fetch(cursor, limit=limit)
+                ids += [row_id(r) for r in rows]
+                if cursor is None:
+                    break
+            self.assertEqual(ids, list(range(12, 0, -1)), f"limit={limit}")
+
+    async def test_malformed_cursor_is_rejected(self):
+        for cursor in ("garbage", encode_cursor(DAY2, 7)[:-4]):
+            with self.assertRaises(HTTPException) as raised:
+                await self.fetch(cursor)
+            self.assertEqual(raised.exception.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+from unittest.mock import patch
+from fastapi import Response
+from sqlalchemy import create_engine, select, text
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from log_fields import promote_fields, parse_field_filters, field_condition, ensure_field_columns, MAX_FIELD_LENGTH
+from archive import LogArchive
+from database import engine, SessionLocal, AsyncSessionLocal
+from models import Base, Log, LogRollup
+from log_store import insert_logs, page_logs
+from ingest import build_log_row, get_logs
+
+class TestLogFields(unittest.TestCase):
+
+    def test_promote_fields(self):
+        row = promote_fields({
+            "message": "x",
+            "raw_content": {"user": "alice@company.com", "ip": "10.0.0.1", "event_id": 4625,
+                            "location": {"city": "NY"}, "risk": "High"}
+        })
+        self.assertEqual(row["user_name"], "alice@company.com")
+        self.assertEqual(row["ip_address"], "10.0.0.1")
+        self.assertEqual(row["event_id"], "4625")
+        self.assertNotIn("location", row) # nested values stay in raw_content only
+        self.assertNotIn("risk", row)
+
+    def test_promote_fields_without_content(self):
+        self.assertEqual(promote_fields({"raw_content": None}), {"raw_content": None})
+
+    def test_parse_field_filters(self):
+        self.assertEqual(parse_field_filters(["user:alice", "url:http://x"]), {"user": "alice", "url": "http://x"})
+        with self.assertRaises(ValueError):
+            parse_field_filters(["user"])
+
+def row_id(row):
+    return row["id"] if isinstance(row, dict) else row.id
+
+class TestFieldStore(unittest.IsolatedAsyncioTestCase):
+    """
+    Rows built by ingest and written with insert_logs, then filtered by
+    promoted columns and by raw_content keys (json_extract on SQLite).
+    """
+
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.patch = patch("log_store.log_archive", LogArchive(self.tmp.name))
+        self.patch.start()
+        self.db = SessionLocal()
+        self.clear()
+        self.ids = insert_logs(self.db, [
+            build_log_row("win", "logon failed", log_type="AUTH",
+                          content={"user": "alice", "action": "Login", "event_id": 4625, "port": 22}),
+            build_log_row("win", "logon ok", log_type="AUTH",
+                          content={"user": "alice", "action": "Logout", "port": "22", "ip": "10.0.0.1"}),
+            build_log_row("vpn", "tunnel up", content={"user": "bob", "location": {"city": "NY"}, "mfa": True}),
+            build_log_row("vpn", "no content")
+        ])
+
+    def tearDown(self):
+        self.patch.stop()
+        self.clear()
+        self.db.close()
+        self.tmp.cleanup()
+
+    def clear(self):
+        self.db.query(Log).delete()
+        self.db.query(LogRollup).delete()
+        self.db.commit()
+
+    def test_insert_fills_promoted_columns(self):
+        rows = {r.id: r for r in self.db.query(Log)}
+        first, second, third, fourth = (rows[i] for i in self.ids)
+        self.assertEqual((first.user_name, first.action, first.event_id, first.ip_address), ("alice", "Login", "4625", None))
+        self.assertEqual((second.action, second.ip_address), ("Logout", "10.0.0.1"))
+        self.assertEqual((third.user_name, third.location), ("bob", None))
+        self.assertEqual(third.raw_content["location"], {"city": "NY"})
+        self.assertIsNone(fourth.user_name)
+
+    def test_field_condition(self):
+        def matching(key, value):
+            stmt = select(Log.id).where(field_condition(key, value, "sqlite")).order_by(Log.id)
+            return [self.ids.index(i) for (i,) in self.db.execute(stmt)]
+
+        self.assertEqual(matching("user", "alice"), [0, 1])
+        self.assertEqual(matching("event_id", "4625"), [0])
+        # raw keys match the JSON value as text or as a number/boolean
+        self.assertEqual(matching("port", "22"), [0, 1])
+        self.assertEqual(matching("mfa", "true"), [2])
+        self.assertEqual(matching("port", "23"), [])
+
+    async def test_page_logs_and_endpoint_filter_by_fields(self):
+        async with AsyncSessionLocal() as db:
+            rows, cursor = await page_logs(db, 10, fields={"user": "alice", "port": "22"})
+            self.assertEqual([row_id(r) for r in rows], [self.ids[1], self.ids[0]])
+            self.assertIsNone(cursor)
+
+            rows, _ = await page_logs(db, 10, fields={"user": "alice", "action": "Logout"})
+            self.assertEqual([row_id(r) for r in rows], [self.ids[1]])
+
+            rows = await get_logs(Response(), limit=1, field=["user:alice"], db=db)
+            self.assertEqual([row_id(r) for r in rows], [self.ids[1]])
+            self.assertEqual(await get_logs(Response(), field=["user:carol"], db=db), [])
+
+class TestEnsureFieldColumns(unittest.TestCase):
+
+    def test_backfills_existing_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy = create_engine(f"sqlite:///{tmp}/legacy.db")
+            long_user = "u" * (MAX_FIELD_LENGTH + 10)
+            contents = [
+                {"user": "alice", "event_id": 4625, "ip": None},
+                {"user": long_user, "location": {"city": "NY"}, "action": ["a", "b"]},
+                {}
+            ]
+            with legacy.begin() as conn:
+                conn.execute(text("CREATE TABLE logs (id INTEGER PRIMARY KEY, message VARCHAR, raw_content JSON)"))
+                for i, content in enumerate(contents, 1):
+                    conn.execute(text("INSERT INTO logs VALUES (:id, 'x', :content)"),
+                                 {"id": i, "content": json.dumps(content)})
+
+            ensure_field_columns(legacy)
+            ensure_field_columns(legacy) # already up to date: no-op
+
+            with legacy.connect() as conn:
+                rows = conn.execute(text(
+                    "SELECT user_name, ip_address, action, location, event_id FROM logs ORDER BY id"
+                )).all()
+            legacy.dispose()
+
+        self.assertEqual(rows[0], ("alice", None, None, None, "4625"))
+        self.assertEqual(rows[1], ("u" * MAX_FIELD_LENGTH, None, None, None, None))
+        self.assertEqual(rows[2], (None, None, None, None, None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import unittest
+import sys
+import os
+import shutil
+import subprocess
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from log_tail import (parse_stat, plan_resume, tail_command, TailPosition, TransferStats, _filter,
+                      parse_patterns, validate_patterns, FilterError)
+
+class TestPlanResume(unittest.TestCase):
+
+    def test_parse_stat(self):
+        self.assertEqual(parse_stat("1234 5678\n- -\n"), [("1234", 5678), None])
+
+    def test_first_run_starts_at_end(self):
+        plan = plan_resume(None, None, ("10", 500), None)
+        self.assertEqual(plan, {"inode": "10", "offset": 500, "catchup": None})
+
+    def test_same_file_resumes_at_offset(self):
+        self.assertEqual(plan_resume("10", 120, ("10", 500), None)["offset"], 120)
+        # copytruncate: the file shrank below the saved offset
+        self.assertEqual(plan_resume("10", 900, ("10", 500), None)["offset"], 0)
+
+    def test_rotated_file_is_caught_up_first(self):
+        plan = plan_resume("10", 120, ("11", 40), ("10", 700))
+        self.assertEqual(plan, {"inode": "11", "offset": 0, "catchup": (120, 700)})
+        self.assertEqual(
+            tail_command("/var/log/my app.log", plan),
+            "tail -c +121 -- '/var/log/my app.log.1' | head -c 580 && exec tail -c +1 -f -- '/var/log/my app.log'"
+        )
+
+    def test_unknown_rotation_reads_new_file_from_start(self):
+        self.assertEqual(plan_resume("10", 120, ("12", 40), ("11", 700))["offset"], 0)
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            plan_resume("10", 0, None, None)
+
+def lines(entries):
+    return [line for line, _, _ in entries if line]
+
+def consume(position, chunk):
+    """
+    Feeds `chunk` and commits every entry, as the collector does once each line is ingested.
+    """
+    entries = position.feed(chunk)
+    for _, inode, offset in entries:
+        position.commit(inode, offset)
+    return lines(entries)
+
+class TestTailPosition(unittest.TestCase):
+
+    def test_tracks_offset_of_complete_lines(self):
+        position = TailPosition({"inode": "10", "offset": 100, "catchup": None})
+        self.assertEqual(consume(position, b"first line\nsecond "), ["first line"])
+        self.assertEqual(position.offset, 111)
+        self.assertEqual(consume(position, b"line\n\n"), ["second line"])
+        self.assertEqual(position.offset, 124)
+
+    def test_offset_waits_for_commit(self):
+        position = TailPosition({"inode": "10", "offset": 100, "catchup": None})
+        entries = position.feed(b"one\ntwo\n\nthree\n")
+        self.assertEqual(entries, [("one", "10", 104), ("two", "10", 108), ("three", "10", 115)])
+        # Nothing is saved until a line has been handed on
+        self.assertEqual(position.offset, 100)
+        position.commit(*entries[0][1:])
+        self.assertEqual(position.offset, 104)
+
+    def test_moves_from_rotated_to_live_file(self):
+        position = TailPosition({"inode": "11", "offset": 0, "catchup": (3, 11)}, rotated_inode="10")
+        self.assertTrue(position.catching_up)
+        self.assertEqual((position.inode, position.offset), ("10", 3))
+        # The rotated copy ends without a newline; its last line must not merge with the live file
+        entries = position.feed(b"old\ntail" + b"new\npart")
+        self.assertEqual(entries, [("old", "10", 7), ("tail", "10", 11), ("new", "11", 4)])
+        self.assertFalse(position.catching_up)
+        self.assertEqual((position.inode, position.offset), ("10", 3))
+        for _, inode, offset in entries:
+            position.commit(inode, offset)
+        self.assertEqual((position.inode, position.offset), ("11", 4))
+
+    def test_invalid_utf8_is_replaced(self):
+        position = TailPosition({"inode": "10", "offset": 0, "catchup": None})
+        self.assertEqual(consume(position, b"caf\xe9\n"), ["caf�"])
+
+class TestRemoteFilter(unittest.TestCase):
+
+    def test_patterns(self):
+        self.assertEqual(parse_patterns("sshd\n\n  sudo \n"), ["sshd", "sudo"])
+        self.assertEqual(parse_patterns(None), [])
+        validate_patterns(["Failed password", "error|fatal"])
+        with self.assertRaises(ValueError):
+            validate_patterns(["(unclosed"])
+
+    def test_python_only_syntax_is_rejected(self):
+        validate_patterns([r"port [0-9]+", r"[[:digit:]]{3}", r"a\.b", r"[]\d]", r"(error|fatal)?$"])
+        for pattern in ("(?i)error", r"\d+", r"\bsshd", r"a.*?b", r"x{2}?", r"(?=foo)", r"(a)\1"):
+            with self.assertRaises(FilterError, msg=pattern):
+                validate_patterns([pattern])
+
+    @unittest.skipUnless(shutil.which("awk"), "awk not available")
+    def test_awk_rejects_bad_pattern_before_output(self):
+        command = _filter("L", 0, ["((?i)error)"], [])
+        result = subprocess.run(["sh", "-c", command], input=b"", capture_output=True)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, b"")
+        self.assertIn(b"awk", result.stderr)
+
+    def test_unfiltered_command_is_unchanged(self):
+        plan = {"inode": "11", "offset": 40, "catchup": None}
+        self.assertEqual(tail_command("/var/log/auth.log", plan, [], []), "exec tail -c +41 -f -- /var/log/auth.log")
+
+    def test_filtered_command_pipes_both_parts(self):
+        plan = {"inode": "11", "offset": 0, "catchup": (120, 700)}
+        command = tail_command("/var/log/auth.log", plan, ["sshd"], ["CRON"])
+        self.assertIn("head -c 580 | LW_INCLUDE='(sshd)' LW_EXCLUDE='(CRON)' LC_ALL=C awk -v tag=R -v start=120", command)
+        self.assertIn("&& tail -c +1 -f -- /var/log/auth.log | LW_INCLUDE=", command)
+        self.assertNotIn("exec", command)
+
+    @unittest.skipUnless(shutil.which("awk"), "awk not available")
+    def test_awk_filter_reports_raw_offsets(self):
+        data = b"sshd: accepted\nCRON: job\nsshd: CRON-ish\nkernel: eth0 up\n"
+        command = _filter("L", 100, ["sshd", "kernel"], ["CRON"])
+        output = subprocess.run(["sh", "-c", command], input=data, capture_output=True, check=True).stdout
+        self.assertEqual(output, b"L115\tsshd: accepted\nL156\tkernel: eth0 up\nL156\t\n")
+
+        position = TailPosition({"inode": "10", "offset": 100, "catchup": None}, filtered=True)
+        self.assertEqual(consume(position, output), ["sshd: accepted", "kernel: eth0 up"])
+        self.assertEqual((position.offset, position.scanned), (100 + len(data), len(data)))
+
+    def test_filtered_position_moves_to_live_file(self):
+        position = TailPosition({"inode": "11", "offset": 0, "catchup": (3, 20)}, rotated_inode="10", filtered=True)
+        self.assertEqual(consume(position, b"R9\tmatch\nR1"), ["match"])
+        self.assertEqual((position.inode, position.offset), ("10", 9))
+        # The copy's last line had no newline, so awk reports one byte past its end
+        self.assertEqual(position.feed(b"4\t\nR21\t\n"), [(None, "11", 0)])
+        self.assertFalse(position.catching_up)
+        self.assertEqual(consume(position, b"L6\tlive\n"), ["live"])
+        self.assertEqual((position.inode, position.offset, position.scanned), ("11", 6, 23))
+
+    def test_transfer_stats(self):
+        stats = TransferStats()
+        stats.add("web", 1000, 100, 2)
+        stats.add("web", 1000, 150, 3)
+        self.assertEqual(stats.stats(), [{
+            "source": "web", "bytes_scanned": 2000, "bytes_received": 250, "lines": 5,
+            "bytes_saved": 1750, "saved_pct": 87.5
+        }])
+
+if __name__ == '__main__':
+    unittest.main()
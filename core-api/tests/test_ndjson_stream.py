@@ -0,0 +1,52 @@
+import unittest
+import gzip
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ndjson_stream import NDJSONDecoder
+
+def decode(decoder, chunks):
+    lines = []
+    for chunk in chunks:
+        lines.extend(decoder.feed(chunk))
+    return lines + decoder.close()
+
+class TestNDJSONDecoder(unittest.TestCase):
+
+    def test_lines_split_across_chunks(self):
+        decoder = NDJSONDecoder()
+        lines = decode(decoder, [b'{"a": 1}\n{"b"', b': 2}\n\n', b'{"c": 3}'])
+        self.assertEqual(lines, [b'{"a": 1}', b'{"b": 2}', b'{"c": 3}'])
+        self.assertEqual(decoder.bytes_in, 27)
+
+    def test_multi_member_gzip(self):
+        body = gzip.compress(b'{"a": 1}\n{"b"') + gzip.compress(b': 2}\n{"c": 3}\n')
+        # Chunk boundaries fall inside and between members
+        chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+        self.assertEqual(decode(NDJSONDecoder(gzipped=True), chunks), [b'{"a": 1}', b'{"b": 2}', b'{"c": 3}'])
+
+    def test_truncated_gzip(self):
+        body = gzip.compress(b'{"a": 1}\n' * 100)
+        decoder = NDJSONDecoder(gzipped=True)
+        list(decoder.feed(body[:-10]))
+        with self.assertRaises(ValueError):
+            decoder.close()
+
+    def test_over_long_line(self):
+        decoder = NDJSONDecoder(max_line_bytes=16)
+        self.assertEqual(list(decoder.feed(b'{"a": 1}\n{"b": ')), [b'{"a": 1}'])
+        with self.assertRaises(ValueError):
+            list(decoder.feed(b'"' + b"x" * 32))
+
+    def test_gzip_bomb_stops_at_line_limit(self):
+        # ~100 MB of one line compresses to ~100 KB
+        body = gzip.compress(b"x" * (100 * 1024 * 1024), compresslevel=9)
+        decoder = NDJSONDecoder(gzipped=True, max_line_bytes=1024 * 1024)
+        with self.assertRaises(ValueError):
+            list(decoder.feed(body))
+        self.assertLess(len(decoder._pending), 2 * 1024 * 1024)
+
+if __name__ == '__main__':
+    unittest.main()
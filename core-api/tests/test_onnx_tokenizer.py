@@ -0,0 +1,111 @@
+import unittest
+import sys
+import os
+from unittest.mock import MagicMock
+
+import numpy as np
+
+# Only the tokenizer cache and input padding are exercised; block the runtimes
+sys.modules['onnxruntime'] = MagicMock()
+sys.modules['tokenizers'] = MagicMock()
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from ai_engine.onnx_backend import CachedTokenizer, OnnxEmbedder
+
+class FakeEncoding:
+    def __init__(self, ids):
+        self.ids = ids
+
+class FakeWordPiece:
+    """
+    Whitespace pre-tokenization and 3-character word pieces, with the
+    `tokenizers` calls CachedTokenizer uses. `words` counts the words encoded.
+    """
+    def __init__(self):
+        self.vocab = {"[PAD]": 0, "[CLS]": 101, "[SEP]": 102}
+        self.words = 0
+
+    def token_to_id(self, token):
+        return self.vocab[token]
+
+    def _pieces(self, word):
+        pieces = [word[:3]] + ["##" + word[i:i + 3] for i in range(3, len(word), 3)]
+        return [self.vocab.setdefault(piece, len(self.vocab) + 200) for piece in pieces]
+
+    def encode(self, text, max_length):
+        # Reference: the whole line at once, truncated like the real tokenizer
+        ids = [i for word in text.split() for i in self._pieces(word)]
+        return [101] + ids[:max_length - 2] + [102]
+
+    def encode_batch(self, words, add_special_tokens=True):
+        assert not add_special_tokens
+        self.words += len(words)
+        return [FakeEncoding(self._pieces(word)) for word in words]
+
+LINES = [
+    "sshd[411]: Failed password for root from 10.0.0.1 port 4242",
+    "sshd[411]: Failed password for admin from 10.0.0.2 port 5151",
+    "kernel: eth0 link up",
+    "",
+    "cron: job " + " ".join(f"step{i}" for i in range(200))
+]
+
+class TestCachedTokenizer(unittest.TestCase):
+
+    def test_cached_matches_uncached(self):
+        fake = FakeWordPiece()
+        tokenizer = CachedTokenizer(fake, max_length=32)
+        expected = [fake.encode(line, 32) for line in LINES]
+        self.assertEqual(tokenizer.encode_batch(LINES), expected)
+        # Second pass is served from the cache and still matches
+        words = fake.words
+        self.assertEqual(tokenizer.encode_batch(LINES), expected)
+        self.assertEqual(fake.words, words)
+        self.assertGreater(tokenizer.hits, 0)
+
+    def test_truncation_keeps_special_tokens(self):
+        tokenizer = CachedTokenizer(FakeWordPiece(), max_length=8)
+        ids, = tokenizer.encode_batch([LINES[-1]])
+        self.assertEqual(len(ids), 8)
+        self.assertEqual((ids[0], ids[-1]), (101, 102))
+
+    def test_cache_is_bounded(self):
+        fake = FakeWordPiece()
+        tokenizer = CachedTokenizer(fake, max_length=64, cache_size=10)
+        first = tokenizer.encode_batch(LINES)
+        self.assertLessEqual(len(tokenizer._words), 10)
+        # Evicted words are encoded again, with the same ids
+        self.assertEqual(tokenizer.encode_batch(LINES), first)
+        self.assertLessEqual(len(tokenizer._words), 10)
+
+class FakeSession:
+    def __init__(self):
+        self.feeds = None
+
+    def run(self, outputs, feeds):
+        self.feeds = feeds
+        batch, width = feeds["input_ids"].shape
+        return [np.ones((batch, width, 4), dtype=np.float32)]
+
+class TestOnnxInputs(unittest.TestCase):
+
+    def test_rows_are_padded_and_masked(self):
+        embedder = OnnxEmbedder.__new__(OnnxEmbedder)
+        embedder.session = FakeSession()
+        embedder.input_names = {"input_ids", "attention_mask", "token_type_ids"}
+        embedder.tokenizer = CachedTokenizer(FakeWordPiece(), max_length=16)
+
+        vectors = embedder._encode(["kernel: eth0 link up", "ok"])
+        feeds = embedder.session.feeds
+        expected = embedder.tokenizer.encode_batch(["kernel: eth0 link up", "ok"])
+        width = max(len(row) for row in expected)
+        self.assertEqual(feeds["input_ids"].shape, (2, width))
+        for row, ids in zip(feeds["input_ids"].tolist(), expected):
+            self.assertEqual(row, ids + [0] * (width - len(ids)))
+        self.assertEqual(feeds["attention_mask"].sum(axis=1).tolist(), [len(ids) for ids in expected])
+        self.assertEqual(feeds["token_type_ids"].tolist(), np.zeros((2, width)).tolist())
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), [1.0, 1.0], rtol=1e-6)
+
+if __name__ == '__main__':
+    unittest.main()
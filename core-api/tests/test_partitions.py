@@ -0,0 +1,181 @@
+import unittest
+import sys
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import partitions
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def scalar(self):
+        return self.rows[0][0] if self.rows else None
+
+class FakeConn:
+    """
+    Records the SQL it is given and answers the catalog queries partitions.py
+    makes from a fixed list of partitions and stray default-partition rows.
+    """
+
+    def __init__(self, partitions=(), stray_days=(), columns=("id", "timestamp", "message"), rows=0):
+        self.partitions = list(partitions)
+        self.rows = rows
+        self.stray_days = set(stray_days)
+        self.columns = columns
+        self.statements = []
+
+    def execute(self, clause, params=None):
+        sql = " ".join(str(clause).split())
+        self.statements.append((sql, params))
+        if sql.startswith("SELECT relkind"):
+            return FakeResult([("p",)])
+        if "FROM pg_inherits" in sql:
+            return FakeResult([(p,) for p in self.partitions])
+        if "information_schema.columns" in sql:
+            return FakeResult([(c,) for c in self.columns])
+        if sql.startswith("SELECT count(*)"):
+            return FakeResult([(self.rows,)])
+        if sql.startswith(f"SELECT 1 FROM {partitions.DEFAULT_PARTITION}"):
+            return FakeResult([(1,)] if params["s"].date() in self.stray_days else [])
+        return FakeResult([])
+
+    def sql(self, prefix):
+        return [s for s, _ in self.statements if s.startswith(prefix)]
+
+class FakeEngine:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @contextmanager
+    def begin(self):
+        yield self.conn
+
+def on_postgres(conn):
+    return patch.multiple(partitions, engine=FakeEngine(conn), IS_POSTGRES=True,
+                          PARTITION_INTERVAL="day", PARTITIONS_AHEAD=2)
+
+NOW = datetime(2024, 5, 10, 15, 30, tzinfo=timezone.utc)
+
+class TestEnsurePartitions(unittest.TestCase):
+
+    def test_creates_missing_partitions_ahead(self):
+        conn = FakeConn(partitions=["logs_default", "logs_p20240510"])
+        with on_postgres(conn):
+            created = partitions.ensure_partitions(now=NOW)
+
+        self.assertEqual(created, ["logs_p20240511", "logs_p20240512"])
+        self.assertEqual(conn.sql("CREATE TABLE IF NOT EXISTS logs_p"), [
+            "CREATE TABLE IF NOT EXISTS logs_p20240511 PARTITION OF logs FOR VALUES "
+            "FROM ('2024-05-11T00:00:00+00:00') TO ('2024-05-12T00:00:00+00:00')",
+            "CREATE TABLE IF NOT EXISTS logs_p20240512 PARTITION OF logs FOR VALUES "
+            "FROM ('2024-05-12T00:00:00+00:00') TO ('2024-05-13T00:00:00+00:00')"
+        ])
+
+    def test_stray_rows_move_through_a_temp_table(self):
+        conn = FakeConn(partitions=["logs_default", "logs_p20240510", "logs_p20240512"],
+                        stray_days={datetime(2024, 5, 11).date()},
+                        columns=("id", "timestamp", "message", "user_name"))
+        with on_postgres(conn):
+            created = partitions.ensure_partitions(now=NOW)
+
+        self.assertEqual(created, ["logs_p20240511"])
+        columns = '"id", "timestamp", "message", "user_name"'
+        statements = [s for s, _ in conn.statements]
+        start = statements.index("LOCK TABLE logs_default IN SHARE ROW EXCLUSIVE MODE")
+        self.assertEqual(statements[start + 1:start + 6], [
+            f"CREATE TEMP TABLE logs_p20240511_moving ON COMMIT DROP AS SELECT {columns} FROM logs_default "
+            "WHERE timestamp >= :s AND timestamp < :e",
+            "DELETE FROM logs_default WHERE timestamp >= :s AND timestamp < :e",
+            "CREATE TABLE logs_p20240511 PARTITION OF logs FOR VALUES "
+            "FROM ('2024-05-11T00:00:00+00:00') TO ('2024-05-12T00:00:00+00:00')",
+            f"INSERT INTO logs_p20240511 ({columns}) SELECT {columns} FROM logs_p20240511_moving",
+            "DROP TABLE logs_p20240511_moving"
+        ])
+        # No LIKE copy (it would turn message_tsv into a plain column) and no ATTACH
+        self.assertFalse([s for s in statements if " LIKE " in s or "ATTACH" in s])
+
+    def test_generated_columns_are_not_copied(self):
+        conn = FakeConn()
+        partitions._stored_columns(conn)
+        self.assertIn("is_generated = 'NEVER'", conn.statements[0][0])
+
+    def test_noop_off_postgres(self):
+        with patch.object(partitions, "IS_POSTGRES", False):
+            self.assertEqual(partitions.ensure_partitions(now=NOW), [])
+
+class TestRetention(unittest.TestCase):
+
+    def test_drops_only_partitions_past_the_cutoff(self):
+        conn = FakeConn(partitions=["logs_default", "logs_p20240501", "logs_p20240502", "logs_p20240503",
+                                    "logs_p20240510"])
+        with on_postgres(conn):
+            # Cutoff 2024-05-03 15:30: the 3rd still holds rows inside the window
+            dropped = partitions.drop_expired_partitions(retention_days=7, now=NOW)
+
+        self.assertEqual(dropped, ["logs_p20240501", "logs_p20240502"])
+        self.assertEqual(conn.sql("DROP TABLE"), ["DROP TABLE logs_p20240501", "DROP TABLE logs_p20240502"])
+        self.assertEqual(conn.sql("ALTER TABLE logs DETACH"), [
+            "ALTER TABLE logs DETACH PARTITION logs_p20240501",
+            "ALTER TABLE logs DETACH PARTITION logs_p20240502"
+        ])
+        trims = [p for s, p in conn.statements if s.startswith("DELETE FROM logs_default")]
+        self.assertEqual(trims, [{"cutoff": datetime(2024, 5, 3, 15, 30, tzinfo=timezone.utc)}])
+
+    def test_partition_ending_at_the_cutoff_is_dropped(self):
+        conn = FakeConn(partitions=["logs_p20240502", "logs_p20240503"])
+        with on_postgres(conn):
+            dropped = partitions.drop_expired_partitions(retention_days=7, now=datetime(2024, 5, 10, tzinfo=timezone.utc))
+        self.assertEqual(dropped, ["logs_p20240502"])
+
+    def test_weekly_partitions(self):
+        conn = FakeConn(partitions=["logs_default", "logs_w20240422", "logs_w20240429", "logs_w20240506"])
+        with on_postgres(conn), patch.object(partitions, "PARTITION_INTERVAL", "week"):
+            self.assertEqual(partitions.partition_start(NOW), datetime(2024, 5, 6, tzinfo=timezone.utc))
+            dropped = partitions.drop_expired_partitions(retention_days=7, now=NOW)
+        # The week of 29 April ends on 6 May, after the 3 May cutoff
+        self.assertEqual(dropped, ["logs_w20240422"])
+
+    def test_retention_is_opt_in(self):
+        conn = FakeConn(partitions=["logs_p20200101"])
+        with on_postgres(conn):
+            self.assertEqual(partitions.drop_expired_partitions(retention_days=0, now=NOW), [])
+        self.assertEqual(conn.statements, [])
+
+class TestDropArchivedPartition(unittest.TestCase):
+
+    DAY = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+    def drop(self, conn, archived_rows):
+        with on_postgres(conn):
+            return partitions.drop_partition_if_within(self.DAY, self.DAY + timedelta(days=1), archived_rows)
+
+    def test_dropped_when_every_row_is_archived(self):
+        conn = FakeConn(partitions=["logs_p20240501"], rows=4)
+        self.assertTrue(self.drop(conn, 4))
+        self.assertEqual(conn.sql("DROP TABLE"), ["DROP TABLE logs_p20240501"])
+
+    def test_kept_when_rows_arrived_after_the_export(self):
+        # A row with a lower id than the archived ones committed late
+        conn = FakeConn(partitions=["logs_p20240501"], rows=5)
+        self.assertFalse(self.drop(conn, 4))
+        self.assertEqual(conn.sql("DROP TABLE"), [])
+        self.assertEqual(conn.sql("ALTER TABLE logs DETACH"), [])
+
+    def test_kept_when_counts_do_not_line_up(self):
+        conn = FakeConn(partitions=["logs_p20240501"], rows=3)
+        self.assertFalse(self.drop(conn, 4))
+        self.assertEqual(conn.sql("DROP TABLE"), [])
+
+if __name__ == '__main__':
+    unittest.main()
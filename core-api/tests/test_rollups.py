@@ -0,0 +1,145 @@
+import unittest
+import sys
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import rollups
+from rollups import bucket_start, count_rows
+from database import engine, SessionLocal, AsyncSessionLocal
+from models import Base, Log, LogRollup
+from log_store import insert_logs
+from ingest import get_threat_stats, get_traffic_stats, get_summary_stats
+
+class TestRollups(unittest.TestCase):
+
+    def test_bucket_start(self):
+        moment = datetime(2024, 5, 1, 13, 47, 12, tzinfo=timezone.utc)
+        self.assertEqual(bucket_start(moment, "minute"), datetime(2024, 5, 1, 13, 47, tzinfo=timezone.utc))
+        self.assertEqual(bucket_start(moment, "hour"), datetime(2024, 5, 1, 13, 0, tzinfo=timezone.utc))
+
+    def test_count_rows_groups_by_bucket_and_key(self):
+        base = datetime(2024, 5, 1, 13, 47, tzinfo=timezone.utc)
+        rows = [
+            {"source": "web", "type": "AUTH", "timestamp": base, "is_threat": True},
+            {"source": "web", "type": "AUTH", "timestamp": base.replace(second=30), "is_threat": True},
+            {"source": "web", "type": "AUTH", "timestamp": base.replace(minute=5), "is_threat": False},
+            {"source": None, "type": None, "timestamp": base, "is_threat": None}
+        ]
+        counts = count_rows(rows)
+
+        hour = base.replace(minute=0)
+        self.assertEqual(counts[("minute", base, "web", "AUTH", True)], 2)
+        self.assertEqual(counts[("hour", hour, "web", "AUTH", True)], 2)
+        self.assertEqual(counts[("hour", hour, "web", "AUTH", False)], 1)
+        self.assertEqual(counts[("hour", hour, "unknown", "INFO", False)], 1)
+        self.assertEqual(sum(n for key, n in counts.items() if key[0] == "hour"), len(rows))
+
+HOUR = datetime(2024, 5, 1, 13, 0, tzinfo=timezone.utc)
+
+def log(source, minutes, is_threat, log_type="AUTH", occurrences=1):
+    return {"source": source, "type": log_type, "message": f"{source} event", "is_threat": is_threat,
+            "timestamp": HOUR + timedelta(minutes=minutes), "occurrences": occurrences}
+
+def utc(moment):
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+class TestRollupStore(unittest.IsolatedAsyncioTestCase):
+    """
+    insert_logs -> log_rollups -> stats queries, checked against the raw rows.
+    """
+
+    FIRST = [
+        log("web", 5, True), log("web", 5.5, True), log("web", 50, False),
+        log("db", -50, True, log_type="INFO", occurrences=3) # a folded row
+    ]
+    SECOND = [log("web", 5.75, True), log("cron", 55, False, log_type="INFO"), log("db", 52, True, log_type="INFO")]
+
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+        self.db.query(Log).delete()
+        self.db.query(LogRollup).delete()
+        self.db.commit()
+        insert_logs(self.db, [dict(r) for r in self.FIRST])
+        insert_logs(self.db, [dict(r) for r in self.SECOND])
+        self.start, self.end = HOUR - timedelta(hours=1), HOUR + timedelta(hours=1)
+
+    def tearDown(self):
+        self.db.query(Log).delete()
+        self.db.query(LogRollup).delete()
+        self.db.commit()
+        self.db.close()
+
+    def raw_rows(self):
+        rows = self.db.query(Log.source, Log.type, Log.is_threat, Log.occurrences, Log.timestamp).all()
+        return [{"source": r[0], "type": r[1], "is_threat": r[2], "occurrences": r[3], "timestamp": utc(r[4])}
+                for r in rows]
+
+    def rollup_rows(self):
+        self.db.expire_all()
+        return {(r.granularity, utc(r.bucket), r.source, r.type, r.is_threat): r.count
+                for r in self.db.query(LogRollup)}
+
+    def test_rollups_match_the_raw_rows(self):
+        rollup = self.rollup_rows()
+        self.assertEqual(rollup, dict(count_rows(self.raw_rows())))
+        # Both batches hit the 13:05 minute; the second upsert added to it
+        self.assertEqual(rollup[("minute", HOUR + timedelta(minutes=5), "web", "AUTH", True)], 3)
+        self.assertEqual(rollup[("hour", HOUR, "web", "AUTH", True)], 3)
+        self.assertEqual(rollup[("hour", HOUR - timedelta(hours=1), "db", "INFO", True)], 3)
+
+    async def test_queries_and_endpoints_match_the_raw_rows(self):
+        raw = self.raw_rows()
+        per_hour = Counter()
+        blocked_per_hour = Counter()
+        threat_sources = Counter()
+        for r in raw:
+            bucket = bucket_start(r["timestamp"], "hour")
+            per_hour[bucket] += r["occurrences"]
+            if r["is_threat"]:
+                blocked_per_hour[bucket] += r["occurrences"]
+                threat_sources[r["source"]] += r["occurrences"]
+        self.assertEqual(dict(per_hour), {HOUR - timedelta(hours=1): 3, HOUR: 6})
+
+        async with AsyncSessionLocal() as db:
+            traffic = await rollups.traffic(db, self.start, self.end)
+            self.assertEqual([(utc(b["bucket"]), b["total"], b["blocked"]) for b in traffic],
+                             [(h, per_hour[h], blocked_per_hour[h]) for h in sorted(per_hour)])
+
+            top = await rollups.top_threat_sources(db, self.start, self.end)
+            self.assertEqual(top, [{"source": "db", "count": 4}, {"source": "web", "count": 3}])
+            self.assertEqual({t["source"]: t["count"] for t in top}, dict(threat_sources))
+
+            totals = await rollups.totals(db, self.start, self.end)
+            self.assertEqual(totals, {"sources": 3, "total": sum(r["occurrences"] for r in raw),
+                                      "threats": sum(threat_sources.values())})
+
+            # The /ingest/stats endpoints are thin wrappers over the same rollups
+            self.assertEqual(await get_threat_stats(self.start, self.end, db=db), top)
+            response = await get_traffic_stats(self.start, self.end, granularity="hour", db=db)
+            self.assertEqual([(r["time"], r["inbound"], r["blocked"]) for r in response],
+                             [("12:00", 3, 3), ("13:00", 6, 4)])
+            summary = await get_summary_stats(self.start, HOUR + timedelta(hours=1), db=db)
+            self.assertEqual((summary["collectors"], summary["blocked"]), (3, 7))
+            # Last 15 minutes (13:45-14:00, minute rollups): 1 threat out of 3 lines
+            self.assertEqual(summary["health"], 66)
+
+    def test_rebuild_reproduces_the_incremental_rollups(self):
+        expected = self.rollup_rows()
+        self.db.query(LogRollup).delete()
+        self.db.add(LogRollup(granularity="hour", bucket=HOUR, source="stale", type="INFO", is_threat=False, count=99))
+        self.db.commit()
+
+        hours = int((datetime.now(timezone.utc) - HOUR).total_seconds() // 3600) + 24
+        rollups.rebuild_rollups(self.db, hours)
+        self.assertEqual(self.rollup_rows(), expected)
+
+        # Upserts after a rebuild land on the rebuilt buckets
+        insert_logs(self.db, [log("web", 5, True)])
+        self.assertEqual(self.rollup_rows()[("minute", HOUR + timedelta(minutes=5), "web", "AUTH", True)], 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from search import parse_query, to_fts5_query, _pg_tsquery, ensure_search_schema
+from archive import LogArchive
+from database import engine, SessionLocal, AsyncSessionLocal
+from models import Base, Log, LogRollup
+from log_store import insert_logs
+from ingest import search
+
+class TestSearchQuery(unittest.TestCase):
+
+    def test_parse_terms_phrases_and_prefixes(self):
+        terms = parse_query('failed "invalid  user admin" auth* 10.0.0.5')
+        self.assertEqual(terms, [
+            ("term", "failed"),
+            ("phrase", "invalid user admin"),
+            ("prefix", "auth"),
+            ("term", "10.0.0.5")
+        ])
+
+    def test_empty_and_degenerate_input(self):
+        self.assertEqual(parse_query(""), [])
+        self.assertEqual(parse_query('"" *'), [])
+        # A '*' inside punctuation-heavy text is not treated as a prefix
+        self.assertEqual(parse_query("sshd[42]*"), [("term", "sshd[42]")])
+
+    def test_fts5_rendering_quotes_everything(self):
+        query = to_fts5_query(parse_query('AND "a b" pre* x"y'))
+        self.assertEqual(query, '"AND" AND "a b" AND "pre"* AND "x""y"')
+
+    def test_pg_tsquery(self):
+        compiled = _pg_tsquery(parse_query('failed "invalid  user" auth*')).compile(dialect=postgresql.dialect())
+        self.assertEqual(
+            " ".join(str(compiled).split()),
+            "(phraseto_tsquery(%(phraseto_tsquery_1)s::REGCONFIG, %(phraseto_tsquery_2)s::VARCHAR)"
+            " && phraseto_tsquery(%(phraseto_tsquery_3)s::REGCONFIG, %(phraseto_tsquery_4)s::VARCHAR))"
+            " && to_tsquery(%(to_tsquery_1)s::REGCONFIG, quote_literal(%(quote_literal_1)s::VARCHAR)"
+            " || %(quote_literal_2)s::VARCHAR)"
+        )
+        # User input only ever travels as bound values
+        self.assertEqual(compiled.params, {
+            "phraseto_tsquery_1": "simple", "phraseto_tsquery_2": "failed",
+            "phraseto_tsquery_3": "simple", "phraseto_tsquery_4": "invalid user",
+            "to_tsquery_1": "simple", "quote_literal_1": "auth", "quote_literal_2": ":*"
+        })
+
+BASE = datetime(2024, 5, 2, 12, 0, tzinfo=timezone.utc)
+
+def log(log_id, message, source="sshd", minutes=0):
+    return {"id": log_id, "source": source, "type": "AUTH", "message": message,
+            "timestamp": BASE + timedelta(minutes=minutes), "is_threat": False, "occurrences": 1}
+
+def row_id(row):
+    return row["id"] if isinstance(row, dict) else row.id
+
+class TestSearchEndpoint(unittest.IsolatedAsyncioTestCase):
+    """
+    GET /ingest/search against SQLite FTS5, kept in sync by the triggers
+    from ensure_search_schema.
+    """
+
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        ensure_search_schema(engine)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.archive = LogArchive(self.tmp.name)
+        self.patch = patch("search.log_archive", self.archive)
+        self.patch.start()
+        self.db = SessionLocal()
+        self.clear()
+        insert_logs(self.db, [
+            log(1, "Failed password for root from 10.0.0.5 port 22", minutes=1),
+            log(2, "Failed password for invalid user admin from 10.0.0.6", minutes=2),
+            log(3, "Accepted publickey for deploy from 10.0.0.7", minutes=3),
+            log(4, "GET /login 200 authentication ok", source="nginx", minutes=4),
+            log(5, "Failed password for deploy from 10.0.0.8", source="bastion", minutes=5)
+        ])
+
+    def tearDown(self):
+        self.patch.stop()
+        self.clear()
+        self.db.close()
+        self.tmp.cleanup()
+
+    def clear(self):
+        self.db.query(Log).delete()
+        self.db.query(LogRollup).delete()
+        self.db.commit()
+
+    async def ids(self, q, **params):
+        async with AsyncSessionLocal() as db:
+            body = await search(q, limit=params.pop("limit", 50), offset=params.pop("offset", 0),
+                                sort=params.pop("sort", "rank"), source=params.pop("source", None),
+                                since=None, until=None, db=db)
+        return [row_id(r["log"]) for r in body["results"]], body["next_offset"]
+
+    async def test_words_phrases_prefixes_and_filters(self):
+        self.assertEqual(await self.ids("failed password", sort="recent"), ([5, 2, 1], None))
+        self.assertEqual(await self.ids('"invalid user admin"'), ([2], None))
+        self.assertEqual(await self.ids("auth*"), ([4], None))
+        self.assertEqual(await self.ids("10.0.0.7"), ([3], None))
+        self.assertEqual(await self.ids("failed", source="bastion"), ([5], None))
+        self.assertEqual(await self.ids("nothing-like-this"), ([], None))
+
+        page, next_offset = await self.ids("failed", sort="recent", limit=2)
+        self.assertEqual((page, next_offset), ([5, 2], 2))
+        self.assertEqual(await self.ids("failed", sort="recent", limit=2, offset=2), ([1], None))
+
+    async def test_updates_and_deletes_reach_the_index(self):
+        self.db.query(Log).filter(Log.id == 3).update({"message": "Failed publickey for deploy"})
+        self.db.query(Log).filter(Log.id == 1).delete()
+        self.db.commit()
+
+        self.assertEqual(await self.ids("accepted"), ([], None))
+        self.assertEqual(await self.ids("failed", sort="recent"), ([5, 3, 2], None))
+        self.assertEqual(await self.ids("root"), ([], None))
+
+    async def test_continues_into_the_archive(self):
+        day = BASE - timedelta(days=1)
+        self.archive.write_segment(day, [[
+            {**log(i, f"Failed password for user{i}"), "timestamp": day + timedelta(hours=i)} for i in (90, 91, 92)
+        ] + [{**log(93, "Accepted publickey"), "timestamp": day + timedelta(hours=4)}]])
+
+        pages, offset = [], 0
+        while offset is not None:
+            page, offset = await self.ids("failed password", sort="recent", limit=2, offset=offset)
+            pages.append(page)
+        self.assertEqual(pages, [[5, 2], [1, 92], [91, 90]])
+
+        # Jumping straight past the database matches counts them first
+        self.assertEqual(await self.ids("failed password", sort="recent", limit=2, offset=4), ([91, 90], None))
+
+    async def test_empty_query_is_rejected(self):
+        with self.assertRaises(HTTPException) as raised:
+            await self.ids('""')
+        self.assertEqual(raised.exception.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
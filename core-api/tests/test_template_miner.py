@@ -0,0 +1,103 @@
+import unittest
+import asyncio
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from ai_engine.template_miner import TemplateMiner
+from ai_engine.executor import AsyncAIEngine
+
+OPENED = "sshd[{}]: session opened for user root from 10.0.0.{}"
+FAILED = "sshd[{}]: session failed for user root from 10.0.0.{}"
+
+class FakeEngine:
+    def __init__(self):
+        self.analyzed = []
+
+    def analyze_logs(self, texts):
+        self.analyzed.extend(texts)
+        return ["threat" if "failed" in text else "safe" for text in texts]
+
+class TestTemplateMiner(unittest.TestCase):
+
+    def test_variable_fields_share_a_template(self):
+        miner = TemplateMiner()
+        a = miner.add("sshd[1201]: Failed password for root from 10.0.0.5 port 51122 ssh2")
+        b = miner.add("sshd[998]: Failed password for root from 185.2.3.4 port 22 ssh2")
+
+        self.assertEqual(a.template_id, b.template_id)
+        self.assertEqual(b.template.template, "sshd[<NUM>]: Failed password for root from <IP> port <NUM> ssh2")
+        self.assertEqual(b.params, ["sshd[998]:", "185.2.3.4", "22"])
+        self.assertEqual(miner.get(a.template_id)["count"], 2)
+
+    def test_verdict_reused_for_variants(self):
+        miner = TemplateMiner()
+        first = miner.add("Invalid user admin from 10.0.0.5")
+        self.assertEqual(miner.get_verdict(first), (False, None))
+        miner.set_verdict(first, {"distance": 0.1})
+
+        second = miner.add("Invalid user admin from 10.9.9.9")
+        self.assertEqual(miner.get_verdict(second), (True, {"distance": 0.1}))
+
+    def test_generalized_template_does_not_leak_verdicts(self):
+        """
+        'Failed' and 'Accepted' lines may merge into one template, but each
+        keeps the verdict computed for its own template version.
+        """
+        miner = TemplateMiner()
+        # Full syslog header: the parse-tree prefix is identical for both lines
+        failed = miner.add("Oct 16 10:00:01 web1 sshd[77]: Failed password for root from 10.0.0.5 port 22 ssh2")
+        miner.set_verdict(failed, "threat")
+
+        accepted = miner.add("Oct 16 10:00:02 web1 sshd[78]: Accepted password for root from 10.0.0.6 port 22 ssh2")
+        self.assertEqual(accepted.template_id, failed.template_id)
+        self.assertEqual(miner.get_verdict(accepted), (False, None))
+        miner.set_verdict(accepted, "benign")
+
+        again = miner.add("Oct 16 10:05:09 web1 sshd[91]: Failed password for root from 10.1.1.1 port 2222 ssh2")
+        self.assertEqual(miner.get_verdict(again), (True, "threat"))
+
+    def test_verdict_keeps_the_version_it_matched(self):
+        miner = TemplateMiner()
+        opened = miner.add(OPENED.format(1, 1))
+        # Generalizes the template before the first verdict is stored
+        miner.add(FAILED.format(2, 2))
+        miner.set_verdict(opened, "safe")
+
+        self.assertEqual(miner.get_verdict(miner.add(FAILED.format(3, 3))), (False, None))
+        self.assertEqual(miner.get_verdict(miner.add(OPENED.format(4, 4))), (True, "safe"))
+
+    def test_mixed_batch_through_analyze_logs(self):
+        fake = FakeEngine()
+        engine = AsyncAIEngine(fake, max_workers=1, miner=TemplateMiner())
+        try:
+            first = asyncio.run(engine.analyze_logs([OPENED.format(1, 1), FAILED.format(2, 2)]))
+            second = asyncio.run(engine.analyze_logs([FAILED.format(3, 3), OPENED.format(4, 4)]))
+        finally:
+            engine.shutdown()
+
+        self.assertEqual(first, ["safe", "threat"])
+        self.assertEqual(second, ["threat", "safe"])
+        # The second batch was served from the cached verdicts
+        self.assertEqual(len(fake.analyzed), 2)
+
+    def test_clear_verdicts(self):
+        miner = TemplateMiner()
+        match = miner.add("disk usage 91%")
+        miner.set_verdict(match, "warn")
+        miner.clear_verdicts()
+        self.assertEqual(miner.get_verdict(miner.add("disk usage 92%")), (False, None))
+
+    def test_template_limit_evicts_least_recent(self):
+        miner = TemplateMiner(max_templates=2)
+        old = miner.add("alpha event happened")
+        miner.add("beta thing done now please")
+        miner.add("gamma")
+
+        stats = miner.stats()
+        self.assertEqual(stats["templates"], 2)
+        self.assertIsNone(miner.get(old.template_id))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import sys
+import os
+from unittest.mock import MagicMock
+
+import numpy as np
+
+# Only the in-memory index is exercised; block the Chroma client
+sys.modules['chromadb'] = MagicMock()
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from ai_engine.database import InMemoryIndex
+
+def unit(v):
+    v = np.asarray(v, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+class TestInMemoryIndex(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.vectors = rng.normal(size=(50, 16)).astype(np.float32)
+        self.index = InMemoryIndex()
+        self.index.load(
+            [str(i) for i in range(50)],
+            self.vectors.tolist(),
+            [f"sig {i}" for i in range(50)],
+            [{"n": i} for i in range(50)]
+        )
+
+    def test_matches_brute_force_squared_l2(self):
+        query = self.vectors[13] + 0.01
+        match = self.index.query([query.tolist()], n_results=1)[0][0]
+
+        expected = min(range(50), key=lambda i: np.sum((unit(query) - unit(self.vectors[i])) ** 2))
+        self.assertEqual(match["document"], f"sig {expected}")
+        self.assertAlmostEqual(match["distance"], float(np.sum((unit(query) - unit(self.vectors[expected])) ** 2)), places=4)
+
+    def test_batched_top_k_sorted(self):
+        results = self.index.query(self.vectors[:5].tolist(), n_results=3)
+        self.assertEqual(len(results), 5)
+        for i, matches in enumerate(results):
+            self.assertEqual(matches[0]["metadata"], {"n": i})
+            distances = [m["distance"] for m in matches]
+            self.assertEqual(distances, sorted(distances))
+
+    def test_incremental_upsert(self):
+        new_vector = [1.0] + [0.0] * 15
+        self.index.upsert(["new"], [new_vector], ["brand new"], [{"n": -1}])
+        self.assertEqual(len(self.index), 51)
+        self.assertEqual(self.index.query([new_vector])[0][0]["document"], "brand new")
+
+        self.index.upsert(["new"], [new_vector], ["replaced"], [{"n": -2}])
+        self.assertEqual(len(self.index), 51)
+        self.assertEqual(self.index.query([new_vector])[0][0]["document"], "replaced")
+
+    def test_empty_index(self):
+        index = InMemoryIndex()
+        self.assertEqual(index.query([[0.1, 0.2]]), [[]])
+        index.upsert(["a"], [[0.0, 1.0]], ["first"], [{}])
+        self.assertEqual(index.query([[0.0, 2.0]])[0][0]["document"], "first")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,7 +12,7 @@ def test_ingest_safe():
         "timestamp": "2023-10-27T10:00:00Z"
     }
     try:
-        res = requests.post(f"{BASE_URL}/ingest/logs", json=payload)
+        res = requests.post(f"{BASE_URL}/ingest/logs?wait=true", json=payload)
         if res.status_code == 200:
             data = res.json()
             if not data.get("is_threat"):
@@ -34,7 +34,7 @@ def test_ingest_threat():
         "timestamp": "2023-10-27T10:00:00Z"
     }
     try:
-        res = requests.post(f"{BASE_URL}/ingest/logs", json=payload)
+        res = requests.post(f"{BASE_URL}/ingest/logs?wait=true", json=payload)
         if res.status_code == 200:
             data = res.json()
             if data.get("is_threat"):